@@ -0,0 +1,568 @@
+"""
+Rate limiting and admission control
+Per-session and per-IP token buckets (in memory or in Redis), a concurrency
+cap per endpoint class and a bounded wait queue that sheds requests with
+429 and Retry-After once they cannot be admitted before their deadline
+"""
+
+import os
+import math
+import time
+import random
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from metrics import ADMISSION_REJECTED
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Path prefix -> endpoint class; anything else (health, metrics, chat, screenshots) passes through
+ENDPOINT_CLASSES = (
+    ("/api/ai-agent", "ai_agent"),
+    ("/api/execute", "execute"),
+    ("/api/sandbox", "sandbox"),
+)
+
+# Request bodies up to this size are parsed for a session_id; longer ones are not buffered in full
+MAX_PEEK_BYTES = 65536
+
+
+class Rejected(Exception):
+    """A request that was not admitted, with the reason and seconds until a retry may succeed"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class MemoryBuckets:
+    """Token buckets in this process; beyond ``max_keys`` the least recently used are dropped"""
+
+    backend = "memory"
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (tokens, last refill)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """Take one token; returns 0 when allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+# Refill and take in one round trip; the wait is returned as a string because Lua
+# numbers come back as integers
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker, refilled atomically by a Lua script
+
+    If Redis is unreachable requests are let through rather than failing
+    the API; the concurrency caps still apply per worker.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client: Any, prefix: str = "adx:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(TAKE_SCRIPT)
+        self.errors = 0
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        try:
+            return float(await self._take(keys=[self.prefix + key], args=[rate, burst]))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            return 0.0
+
+    def size(self) -> int:
+        return -1
+
+
+class ConcurrencyGate:
+    """At most ``limit`` requests of one endpoint class at a time, with a bounded FIFO of waiters
+
+    A request that would wait is shed straight away when the queue is
+    full, or when the expected wait (from the recent service time) is
+    longer than its deadline; otherwise it waits until a slot is handed
+    to it or its deadline passes.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int = 100, queue_timeout: float = 5.0):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long an admitted request holds its slot
+        self.service_time = 0.0
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.max_wait_ms = 0.0
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the waiter at ``position`` in the queue gets a slot"""
+        return (position // self.limit + 1) * self.service_time
+
+    def retry_after(self) -> float:
+        return max(1.0, self.expected_wait(len(self._waiters)))
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        if len(self._waiters) >= self.queue_size:
+            self.shed += 1
+            raise Rejected("queue_full", self.retry_after())
+        if timeout <= 0 or self.expected_wait(len(self._waiters)) > timeout:
+            self.shed += 1
+            raise Rejected("deadline", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as the wait ended: give it back
+                self.release()
+            try:
+                self._waiters.remove(future)
+            except ValueError:
+                pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.shed += 1
+            raise Rejected("deadline", self.retry_after())
+        self.admitted += 1
+        self.max_wait_ms = max(self.max_wait_ms, (time.perf_counter() - start) * 1000)
+
+    def release(self, held: Optional[float] = None) -> None:
+        """Free a slot, handing it to the oldest waiter still waiting"""
+        if held is not None:
+            if self.service_time:
+                held = 0.8 * self.service_time + 0.2 * held
+            self.service_time = held
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "queue_size": self.queue_size,
+            "service_ms": round(self.service_time * 1000, 3),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+class AdmissionController:
+    """Decides whether a request to a limited endpoint class runs, waits or is turned away"""
+
+    def __init__(
+        self,
+        buckets: Any,
+        gates: Dict[str, ConcurrencyGate],
+        session_rate: float = 100 / 60,
+        session_burst: float = 20,
+        ip_rate: float = 300 / 60,
+        ip_burst: float = 60,
+    ):
+        self.buckets = buckets
+        self.gates = gates
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.rejected: Dict[str, int] = {}
+
+    async def admit(self, endpoint: str, session_id: Optional[str], client_ip: Optional[str],
+                    timeout: Optional[float] = None) -> ConcurrencyGate:
+        """Check the buckets and take a slot; raises Rejected otherwise"""
+        try:
+            if session_id and self.session_rate > 0:
+                wait = await self.buckets.take(
+                    f"session:{session_id}", self.session_rate, self.session_burst
+                )
+                if wait:
+                    raise Rejected("session_rate", wait)
+            if client_ip and self.ip_rate > 0:
+                wait = await self.buckets.take(f"ip:{client_ip}", self.ip_rate, self.ip_burst)
+                if wait:
+                    raise Rejected("ip_rate", wait)
+            gate = self.gates[endpoint]
+            await gate.acquire(timeout)
+            return gate
+        except Rejected as e:
+            self.rejected[e.reason] = self.rejected.get(e.reason, 0) + 1
+            ADMISSION_REJECTED.labels(endpoint, e.reason).inc()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buckets": self.buckets.backend,
+            "tracked_keys": self.buckets.size(),
+            "session_rate_per_minute": round(self.session_rate * 60, 3),
+            "session_burst": self.session_burst,
+            "ip_rate_per_minute": round(self.ip_rate * 60, 3),
+            "ip_burst": self.ip_burst,
+            "rejected": dict(self.rejected),
+            "endpoints": {name: gate.stats() for name, gate in self.gates.items()},
+        }
+
+
+def endpoint_class(path: str) -> Optional[str]:
+    for prefix, name in ENDPOINT_CLASSES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return name
+    return None
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to the limited endpoint classes
+
+    The session comes from the X-Session-ID header, a ``session_id``
+    query parameter, the resume path or the JSON body (which is read
+    here and replayed to the app). A slot is held until the response is
+    finished, except for event streams, which give it back as soon as
+    the response starts: a stream lasts as long as its client stays
+    connected, so holding the slot would cap connected clients rather
+    than work in progress. Clients may shorten how long they are willing
+    to queue with an X-Request-Timeout header (seconds).
+    """
+
+    def __init__(self, app: Any, controller: AdmissionController, trust_forwarded: bool = False):
+        self.app = app
+        self.controller = controller
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        endpoint = endpoint_class(scope.get("path", "")) if scope["type"] == "http" else None
+        if endpoint is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        session_id = (
+            headers.get("x-session-id")
+            or session_from_query(scope)
+            or session_from_path(scope["path"])
+        )
+        if session_id is None and scope["method"] in ("POST", "PUT", "PATCH"):
+            body, receive = await buffer_body(receive)
+            session_id = session_from_body(body)
+
+        try:
+            gate = await self.controller.admit(
+                endpoint, session_id, self.client_ip(scope, headers), request_timeout(headers)
+            )
+        except Rejected as e:
+            await reject(send, e)
+            return
+
+        start = time.perf_counter()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                gate.release(time.perf_counter() - start)
+
+        async def send_releasing(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and is_event_stream(message):
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_releasing)
+        finally:
+            release()
+
+    def client_ip(self, scope: Dict[str, Any], headers: Dict[str, str]) -> Optional[str]:
+        if self.trust_forwarded and headers.get("x-forwarded-for"):
+            return headers["x-forwarded-for"].split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else None
+
+
+def session_from_query(scope: Dict[str, Any]) -> Optional[str]:
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("session_id")
+    return values[0] if values else None
+
+
+def session_from_path(path: str) -> Optional[str]:
+    prefix = "/api/ai-agent/stream/"
+    if path.startswith(prefix):
+        return path[len(prefix):] or None
+    return None
+
+
+def session_from_body(body: bytes) -> Optional[str]:
+    if not body or len(body) > MAX_PEEK_BYTES:
+        return None
+    try:
+        payload = loads(body)
+    except ValueError:
+        return None
+    session_id = payload.get("session_id") if isinstance(payload, dict) else None
+    return session_id if isinstance(session_id, str) and session_id else None
+
+
+def is_event_stream(start: Dict[str, Any]) -> bool:
+    for name, value in start.get("headers", []):
+        if name.lower() == b"content-type":
+            return value.split(b";")[0].strip().lower() == b"text/event-stream"
+    return False
+
+
+def request_timeout(headers: Dict[str, str]) -> Optional[float]:
+    try:
+        return float(headers["x-request-timeout"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def buffer_body(receive: Any, limit: int = MAX_PEEK_BYTES) -> Tuple[bytes, Any]:
+    """Read the request body, stopping once past ``limit`` bytes, and a receive that replays it
+
+    A longer body is not read to the end here: the replay hands on what
+    was read and then the rest straight from ``receive``.
+    """
+    chunks: List[bytes] = []
+    size = 0
+    more_body = True
+    pending: List[Dict[str, Any]] = []
+    while more_body and size <= limit:
+        message = await receive()
+        if message["type"] != "http.request":
+            # Client went away before sending the body: hand the disconnect on
+            pending.append(message)
+            more_body = False
+            break
+        chunk = message.get("body", b"")
+        chunks.append(chunk)
+        size += len(chunk)
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay() -> Dict[str, Any]:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": more_body}
+        if pending:
+            return pending.pop()
+        return await receive()
+
+    return body, replay
+
+
+async def reject(send: Any, rejection: Rejected) -> None:
+    retry_after = str(max(1, math.ceil(rejection.retry_after)))
+    body = dumps({
+        "detail": "Too many requests", "reason": rejection.reason, "retry_after": int(retry_after)
+    })
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", retry_after.encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_admission_controller() -> AdmissionController:
+    """Build the controller from RATE_LIMIT_* and ADMISSION_* settings
+
+    RATE_LIMIT_BACKEND picks memory or redis buckets.
+    """
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        buckets: Any = RedisBuckets(client)
+        logger.info("Using Redis rate limit buckets")
+    elif backend == "memory":
+        buckets = MemoryBuckets()
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+    queue_size = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+    queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+    limits = {"ai_agent": "32", "execute": "64", "sandbox": "16"}
+    gates = {
+        name: ConcurrencyGate(
+            name,
+            int(os.getenv(f"ADMISSION_{name.upper()}_CONCURRENCY", default)),
+            queue_size,
+            queue_timeout,
+        )
+        for name, default in limits.items()
+    }
+    return AdmissionController(
+        buckets,
+        gates,
+        session_rate=float(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "100")) / 60,
+        session_burst=float(os.getenv("RATE_LIMIT_BURST_SIZE", "20")),
+        ip_rate=float(os.getenv("RATE_LIMIT_IP_REQUESTS_PER_MINUTE", "300")) / 60,
+        ip_burst=float(os.getenv("RATE_LIMIT_IP_BURST_SIZE", "60")),
+    )
+
+
+async def load_test(
+    admission: bool = True,
+    capacity: int = 8,
+    service: float = 0.05,
+    overload: float = 3.0,
+    duration: float = 5.0,
+    queue_size: int = 32,
+    queue_timeout: float = 0.5,
+) -> Dict[str, Any]:
+    """Offer ``overload`` times what an upstream with ``capacity`` slots serves; report latency
+
+    The toy app queues on the upstream like model and sandbox calls do.
+    Without admission its queue, and so every request's latency, keeps
+    growing; with it, excess requests get a fast 429 instead.
+    """
+    upstream = asyncio.Semaphore(capacity)
+
+    async def app(scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        async with upstream:
+            await asyncio.sleep(service)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    controller = AdmissionController(
+        MemoryBuckets(),
+        {"execute": ConcurrencyGate("execute", capacity, queue_size, queue_timeout)},
+        session_rate=1000.0,
+        session_burst=1000,
+        ip_rate=1000.0,
+        ip_burst=1000,
+    )
+    handler = AdmissionMiddleware(app, controller) if admission else app
+    latencies: Dict[int, List[float]] = {}
+
+    async def request(i: int) -> None:
+        scope = {
+            "type": "http", "method": "GET", "path": "/api/execute/job", "query_string": b"",
+            "headers": [(b"x-session-id", f"s{i % 200}".encode())],
+            "client": (f"10.0.0.{i % 50}", 0),
+        }
+        status = {}
+
+        async def receive() -> Dict[str, Any]:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        start = time.perf_counter()
+        await handler(scope, receive, send)
+        latencies.setdefault(status["code"], []).append(time.perf_counter() - start)
+
+    rate = overload * capacity / service
+    tasks = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(request(i)))
+        i += 1
+        await asyncio.sleep(random.expovariate(rate))
+    await asyncio.gather(*tasks)
+
+    def summary(samples: List[float]) -> Dict[str, Any]:
+        ordered = sorted(samples)
+
+        def pick(q: float) -> float:
+            return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 1)
+
+        return {
+            "count": len(ordered), "p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": pick(1.0)
+        }
+
+    return {
+        "admission": admission,
+        "offered_rps": round(rate, 1),
+        "capacity_rps": round(capacity / service, 1),
+        "statuses": {str(code): summary(samples) for code, samples in sorted(latencies.items())},
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Load test admission control against an overloaded upstream"
+    )
+    parser.add_argument("--overload", type=float, default=3.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+    for enabled in (False, True):
+        result = asyncio.run(load_test(enabled, overload=args.overload, duration=args.duration))
+        print(json.dumps(result, indent=2))
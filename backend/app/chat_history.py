@@ -0,0 +1,217 @@
+"""
+Per-session chat history
+Keeps a fixed-size context window plus cached counters; older messages spill
+into a HistoryArchive instead of accumulating in the session
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from serialization import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+# (role, content, timestamp)
+Message = Tuple[str, str, str]
+
+
+class ChatHistory:
+    """Ring buffer of the most recent messages with O(1) session counters"""
+
+    __slots__ = ("window", "message_count", "created_at", "last_activity")
+
+    def __init__(self, capacity: int = 10):
+        self.window: Deque[Message] = deque(maxlen=capacity)
+        self.message_count = 0
+        self.created_at: Optional[str] = None
+        self.last_activity: Optional[str] = None
+
+    def append(self, role: str, content: str, timestamp: str) -> Optional[Message]:
+        """Add a message; returns the message pushed out of the window, if any"""
+        spilled = self.window[0] if len(self.window) == self.window.maxlen else None
+        self.window.append((role, content, timestamp))
+        self.message_count += 1
+        if self.created_at is None:
+            self.created_at = timestamp
+        self.last_activity = timestamp
+        return spilled
+
+    def context(self) -> List[Dict[str, str]]:
+        """Messages in the context window, oldest first"""
+        return [message_dict(m) for m in self.window]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "message_count": self.message_count,
+            "created_at": self.created_at,
+            "last_activity": self.last_activity
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.window.maxlen,
+            "window": [list(m) for m in self.window],
+            **self.summary()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChatHistory":
+        history = cls(data.get("capacity", 10))
+        history.window.extend(tuple(m) for m in data.get("window", []))
+        history.message_count = data.get("message_count", len(history.window))
+        history.created_at = data.get("created_at")
+        history.last_activity = data.get("last_activity")
+        return history
+
+
+def message_dict(message: Message) -> Dict[str, str]:
+    role, content, timestamp = message
+    return {"role": role, "content": content, "timestamp": timestamp}
+
+
+class HistoryArchive:
+    """Destination for messages that fall out of the context window"""
+
+    backend = "none"
+
+    def __init__(self):
+        self.spilled = 0
+
+    async def append(self, session_id: str, message: Message) -> None:
+        self.spilled += 1
+
+    async def read(self, session_id: str, limit: int = 100) -> List[Dict[str, str]]:
+        return []
+
+    async def delete(self, session_id: str) -> None:
+        pass
+
+    def discard(self, session_id: str) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "spilled": self.spilled}
+
+
+class MemoryHistoryArchive(HistoryArchive):
+    """In-process archive capped per session"""
+
+    backend = "memory"
+
+    def __init__(self, max_messages: int = 1000):
+        super().__init__()
+        self.max_messages = max_messages
+        self._data: Dict[str, Deque[Message]] = {}
+
+    async def append(self, session_id: str, message: Message) -> None:
+        self.spilled += 1
+        archive = self._data.get(session_id)
+        if archive is None:
+            archive = self._data[session_id] = deque(maxlen=self.max_messages)
+        archive.append(message)
+
+    async def read(self, session_id: str, limit: int = 100) -> List[Dict[str, str]]:
+        archive = self._data.get(session_id, ())
+        return [message_dict(m) for m in list(archive)[-limit:]]
+
+    async def delete(self, session_id: str) -> None:
+        self.discard(session_id)
+
+    def discard(self, session_id: str) -> None:
+        """Drop a session's archive (called when the session store evicts it)"""
+        self._data.pop(session_id, None)
+
+
+class RedisHistoryArchive(HistoryArchive):
+    """Redis list per session under ``adx:chat_archive:<session_id>``"""
+
+    backend = "redis"
+
+    def __init__(self, client: Any, max_messages: int = 1000, ttl: float = 0):
+        super().__init__()
+        self.client = client
+        self.max_messages = max_messages
+        self.ttl = ttl
+
+    def _key(self, session_id: str) -> str:
+        return f"adx:chat_archive:{session_id}"
+
+    async def append(self, session_id: str, message: Message) -> None:
+        self.spilled += 1
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, dumps_str(message))
+        pipe.ltrim(key, -self.max_messages, -1)
+        if self.ttl:
+            pipe.pexpire(key, int(self.ttl * 1000))
+        await pipe.execute()
+
+    async def read(self, session_id: str, limit: int = 100) -> List[Dict[str, str]]:
+        raws = await self.client.lrange(self._key(session_id), -limit, -1)
+        return [message_dict(loads(raw)) for raw in raws]
+
+    async def delete(self, session_id: str) -> None:
+        await self.client.delete(self._key(session_id))
+
+
+def create_history_archive(ttl: float = 0) -> HistoryArchive:
+    """Build an archive from CHAT_ARCHIVE_BACKEND (none, memory or redis)"""
+    shared = os.getenv("SESSION_STORE_BACKEND", "memory").lower() == "redis"
+    default = "redis" if shared else "memory"
+    backend = os.getenv("CHAT_ARCHIVE_BACKEND", default).lower()
+    max_messages = int(os.getenv("CHAT_ARCHIVE_MAX_MESSAGES", "1000"))
+
+    if backend == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisHistoryArchive(client, max_messages=max_messages, ttl=ttl)
+    if backend == "memory":
+        return MemoryHistoryArchive(max_messages=max_messages)
+    if backend != "none":
+        raise ValueError(f"Unknown CHAT_ARCHIVE_BACKEND: {backend}")
+
+    return HistoryArchive()
+
+
+def benchmark_memory(
+    sessions: int = 100000, messages: int = 25, capacity: int = 10
+) -> Dict[str, Any]:
+    """Memory held by ``sessions`` histories after ``messages`` turns each (spills not archived)"""
+    import tracemalloc
+
+    text = "x" * 80
+    tracemalloc.start()
+    start = time.perf_counter()
+    histories = []
+    for i in range(sessions):
+        history = ChatHistory(capacity)
+        for n in range(messages):
+            role = "user" if n % 2 == 0 else "assistant"
+            history.append(role, f"{text} {i}:{n}", "2024-01-01T00:00:00")
+        histories.append(history)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "sessions": sessions,
+        "messages_per_session": messages,
+        "window": capacity,
+        "total_mb": round(current / 1e6, 1),
+        "bytes_per_session": round(current / sessions),
+        "appends_per_s": round(sessions * messages / elapsed),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure chat history memory for many sessions")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=25)
+    args = parser.parse_args()
+    print(json.dumps(benchmark_memory(args.sessions, args.messages), indent=2))
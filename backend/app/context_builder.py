@@ -0,0 +1,410 @@
+"""
+Conversation context compaction
+Builds the message list sent to the model within a token budget: token
+counts are cached per message, large tool outputs are truncated, repeated
+screenshots and command results are deduplicated, and turns that no longer
+fit are folded into a running summary made by a pluggable local summarizer
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ChatMessage = Dict[str, str]
+
+# Inline images (screenshots) and long base64 runs that models cannot read as text
+_IMAGE_RE = re.compile(r"data:image/[a-zA-Z+.-]+;base64,[A-Za-z0-9+/=]+")
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/]{512,}={0,2}")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+TOOL_ROLES = ("tool", "function", "system_tool")
+
+
+def estimate_tokens(text: str) -> int:
+    """About four characters per token; close enough for budgeting without a tokenizer"""
+    return (len(text) + 3) // 4 + 4
+
+
+def content_digest(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=12).hexdigest()
+
+
+def shorten(text: str, tokens: int) -> str:
+    """Head and tail of ``text`` in about ``tokens`` tokens"""
+    keep = max(tokens * 4 // 2 - 24, 0)
+    if len(text) <= 2 * keep + 48:
+        return text
+    return f"{text[:keep]}\n[... {len(text) - 2 * keep} characters omitted ...]\n{text[-keep:]}"
+
+
+class TokenCounter:
+    """Token counts cached by a digest of the message, so each message is counted once
+
+    Keys are digests rather than the text itself: tool output and
+    screenshots can run to megabytes, and the cache must not keep them alive.
+    """
+
+    def __init__(self, count: Callable[[str], int] = estimate_tokens, max_entries: int = 50000):
+        self._count = count
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, text: str) -> int:
+        key = content_digest(text)
+        tokens = self._cache.get(key)
+        if tokens is not None:
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = self._cache[key] = self._count(text)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        hit_ratio = round(self.hits / lookups, 3) if lookups else 0.0
+        return {"entries": len(self._cache), "hit_ratio": hit_ratio}
+
+
+class Summarizer:
+    """Folds messages into a running summary; subclasses may call a local model"""
+
+    name = "none"
+
+    def summarize(self, previous: str, messages: List[ChatMessage], max_tokens: int) -> str:
+        return previous
+
+
+class ExtractiveSummarizer(Summarizer):
+    """No model: keeps the first sentence of each turn, newest turns first when space runs out"""
+
+    name = "extractive"
+
+    def __init__(self, line_chars: int = 160):
+        self.line_chars = line_chars
+
+    def summarize(self, previous: str, messages: List[ChatMessage], max_tokens: int) -> str:
+        lines = previous.splitlines() if previous else []
+        for message in messages:
+            text = " ".join(_IMAGE_RE.sub("[image]", message["content"]).split())
+            if not text:
+                continue
+            first = _SENTENCE_RE.split(text, 1)[0][:self.line_chars]
+            lines.append(f"- {message['role']}: {first}")
+        # Budget in characters; the oldest lines go first
+        budget = max_tokens * 4
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            if used + len(line) + 1 > budget:
+                break
+            kept.append(line)
+            used += len(line) + 1
+        return "\n".join(reversed(kept))
+
+
+SUMMARIZERS: Dict[str, Callable[[], Summarizer]] = {
+    "none": Summarizer,
+    "extractive": ExtractiveSummarizer,
+}
+
+
+class SessionContext:
+    """Per-session summary of messages that have left the chat window"""
+
+    __slots__ = ("summary", "summarized", "pending", "bootstrapped")
+
+    def __init__(self):
+        self.summary = ""
+        self.summarized = 0
+        self.pending: List[ChatMessage] = []
+        self.bootstrapped = False
+
+
+class ContextBuilder:
+    """Token-budgeted context assembly with truncation, dedup and running summaries
+
+    ``observe`` is fed each message that spills out of a session's chat
+    window; those are folded into the session's summary on the next
+    ``build``, so archived history is read at most once per process.
+    Recent messages are kept newest-first until ``budget`` runs out; the
+    rest are summarized for this turn only.
+    """
+
+    def __init__(
+        self,
+        budget: int = 4000,
+        summary_budget: int = 600,
+        max_tool_tokens: int = 800,
+        summarizer: Optional[Summarizer] = None,
+        counter: Optional[TokenCounter] = None,
+        max_sessions: int = 10000,
+    ):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.max_tool_tokens = max_tool_tokens
+        self.summarizer = summarizer or ExtractiveSummarizer()
+        self.count = counter or TokenCounter()
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionContext]" = OrderedDict()
+        # Digest of the original content -> (digest of the compacted content, compacted
+        # content or None when compaction left it unchanged), so repeated builds reuse the work
+        self._compacted: "OrderedDict[str, Tuple[str, Optional[str]]]" = OrderedDict()
+
+        self.builds = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.truncated = 0
+        self.deduplicated = 0
+        self.summarized = 0
+        self.build_ms_total = 0.0
+
+    def _session(self, session_id: str) -> SessionContext:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = SessionContext()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def observe(self, session_id: str, message: ChatMessage) -> None:
+        """A message fell out of the session's window (and went to the archive)"""
+        self._session(session_id).pending.append(message)
+
+    def drop_session(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def needs_bootstrap(self, session_id: str, message_count: int, window: int) -> bool:
+        """True when older messages exist that this process has never summarized"""
+        state = self._sessions.get(session_id)
+        return message_count > window and (state is None or not state.bootstrapped)
+
+    def bootstrap(self, session_id: str, archived: List[ChatMessage]) -> None:
+        """Seed the summary from the archive, e.g. after a restart or on another worker"""
+        state = self._session(session_id)
+        # The archive also holds every message observed so far, so it replaces them
+        state.pending = list(archived)
+        state.bootstrapped = True
+
+    def compact(self, message: ChatMessage) -> Tuple[str, ChatMessage]:
+        """Digest and compacted form of a message: images stripped, long output cut to head and tail
+
+        The digest is of the compacted text, so screenshots that differ only
+        in their image bytes count as duplicates.
+        """
+        content = message["content"]
+        key = content_digest(content)
+        cached = self._compacted.get(key)
+        if cached is None:
+            compacted = _IMAGE_RE.sub("[screenshot omitted]", content)
+            compacted = _BASE64_RE.sub("[binary data omitted]", compacted)
+            limit = self.max_tool_tokens
+            if message.get("role") not in TOOL_ROLES:
+                limit *= 4
+            if self.count(compacted) > limit:
+                compacted = shorten(compacted, limit)
+            if compacted == content:
+                cached = (key, None)
+            else:
+                cached = (content_digest(compacted), compacted)
+            self._compacted[key] = cached
+            if len(self._compacted) > self.count.max_entries:
+                self._compacted.popitem(last=False)
+        digest, shortened = cached
+        if shortened is None:
+            return digest, message
+        self.truncated += 1
+        return digest, {**message, "content": shortened}
+
+    def build(
+        self, session_id: Optional[str], messages: List[ChatMessage]
+    ) -> Tuple[List[ChatMessage], Dict[str, Any]]:
+        """Messages to send to the model, oldest first, and a report of what was done"""
+        start = time.perf_counter()
+        tokens_in = sum(self.count(m["content"]) for m in messages)
+        state = self._session(session_id) if session_id else SessionContext()
+        if state.pending:
+            state.summary = self.summarizer.summarize(
+                state.summary, state.pending, self.summary_budget
+            )
+            state.summarized += len(state.pending)
+            self.summarized += len(state.pending)
+            state.pending = []
+
+        # Room for the summary whenever there is, or may be, one
+        budget = self.budget
+        if state.summary or tokens_in > self.budget:
+            budget -= self.summary_budget
+        # The latest user turn is always sent; reserve its space up front
+        last_user = next(
+            (i for i in range(len(messages) - 1, -1, -1) if messages[i].get("role") == "user"), None
+        )
+        if last_user is not None:
+            budget -= self.count(self.compact(messages[last_user])[1]["content"])
+        kept: List[ChatMessage] = []
+        seen = set()
+        dropped: List[ChatMessage] = []
+        used = 0
+        deduplicated = 0
+        # Newest first: the latest copy of a repeated output is the one kept
+        for index in range(len(messages) - 1, -1, -1):
+            digest, message = self.compact(messages[index])
+            if message.get("role") != "user" and digest in seen:
+                deduplicated += 1
+                continue
+            seen.add(digest)
+            tokens = self.count(message["content"])
+            if index == last_user:
+                kept.append(message)
+                continue
+            if kept and used + tokens > budget:
+                if last_user is None or index < last_user:
+                    dropped = messages[:index + 1]
+                    break
+                # Output of the current turn: shrink it to what is left rather than lose the turn
+                content = shorten(message["content"], max(budget - used, 16))
+                message = {**message, "content": content}
+                self.truncated += 1
+                tokens = self.count(message["content"])
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+
+        summary = state.summary
+        if dropped:
+            # Turns still in the window but over budget: summarized for this turn only
+            summary = self.summarizer.summarize(summary, dropped, self.summary_budget)
+        result = kept
+        if summary:
+            preamble = {"role": "system", "content": f"Summary of earlier conversation:\n{summary}"}
+            result = [preamble] + kept
+        tokens_out = sum(self.count(m["content"]) for m in result)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.builds += 1
+        self.tokens_in += tokens_in
+        self.tokens_out += tokens_out
+        self.deduplicated += deduplicated
+        self.build_ms_total += elapsed
+        return result, {
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "messages_kept": len(kept),
+            "messages_summarized": state.summarized + len(dropped),
+            "deduplicated": deduplicated,
+            "build_ms": round(elapsed, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "summarizer": self.summarizer.name,
+            "sessions": len(self._sessions),
+            "builds": self.builds,
+            "compression_ratio": (
+                round(self.tokens_in / self.tokens_out, 3) if self.tokens_out else 0.0
+            ),
+            "truncated": self.truncated,
+            "deduplicated": self.deduplicated,
+            "summarized": self.summarized,
+            "avg_build_ms": round(self.build_ms_total / self.builds, 3) if self.builds else 0.0,
+            "token_cache": self.count.stats(),
+        }
+
+
+def create_context_builder() -> ContextBuilder:
+    name = os.getenv("CONTEXT_SUMMARIZER", "extractive").lower()
+    if name not in SUMMARIZERS:
+        raise ValueError(f"Unknown CONTEXT_SUMMARIZER: {name}. Use: {', '.join(SUMMARIZERS)}")
+    return ContextBuilder(
+        budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000")),
+        summary_budget=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "600")),
+        max_tool_tokens=int(os.getenv("CONTEXT_MAX_TOOL_TOKENS", "800")),
+        summarizer=SUMMARIZERS[name](),
+    )
+
+
+def synthetic_session(turns: int, seed: int = 7) -> List[ChatMessage]:
+    """A long agent session: requests, output of varying size, repeated screenshots and results"""
+    import random
+
+    rng = random.Random(seed)
+    screenshot = "data:image/webp;base64," + "A" * 60000
+    messages = []
+    for turn in range(turns):
+        messages.append({
+            "role": "user",
+            "content": f"Step {turn}: run the next check on the build. Report failures.",
+        })
+        kind = rng.random()
+        if kind < 0.3:
+            content = f"Screenshot captured. {screenshot[:-8]}{turn:08d}"
+        elif kind < 0.5:
+            content = "exit_code=0\nAll 214 tests passed."
+        else:
+            lines = rng.randint(20, 2000)
+            content = "\n".join(
+                f"[{turn}:{i}] compiling module_{i}.py ... ok" for i in range(lines)
+            )
+        messages.append({"role": "tool", "content": content})
+        messages.append({
+            "role": "assistant",
+            "content": f"Turn {turn} done. The output looks as expected, moving on.",
+        })
+    return messages
+
+
+def benchmark(turns: int = 300, window: int = 10, budget: int = 4000) -> Dict[str, Any]:
+    """Prompt tokens and build time per turn: all history, the old last-N window, and the builder"""
+    session = synthetic_session(turns)
+    builder = ContextBuilder(budget=budget)
+    naive_tokens = window_tokens = built_tokens = 0
+    build_ms: List[float] = []
+    per_turn = 3
+    for turn in range(1, turns + 1):
+        history = session[:turn * per_turn]
+        recent = history[-window:]
+        for message in history[-window - per_turn:-window] if len(history) > window else []:
+            builder.observe("bench", message)
+        naive_tokens += sum(estimate_tokens(m["content"]) for m in history)
+        window_tokens += sum(estimate_tokens(m["content"]) for m in recent)
+        start = time.perf_counter()
+        messages, _ = builder.build("bench", recent)
+        build_ms.append((time.perf_counter() - start) * 1000)
+        built_tokens += sum(estimate_tokens(m["content"]) for m in messages)
+    build_ms.sort()
+    return {
+        "turns": turns,
+        "avg_prompt_tokens": {
+            "full_history": round(naive_tokens / turns),
+            f"last_{window}": round(window_tokens / turns),
+            "builder": round(built_tokens / turns),
+        },
+        "build_ms_p50": round(build_ms[len(build_ms) // 2], 3),
+        "build_ms_p99": round(build_ms[int(len(build_ms) * 0.99)], 3),
+        **builder.stats(),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark context compaction on a synthetic long session"
+    )
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--window", type=int, default=10)
+    parser.add_argument("--budget", type=int, default=4000)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.turns, args.window, args.budget), indent=2))
@@ -0,0 +1,527 @@
+"""
+Command execution engine
+Commands are submitted as jobs and run on a bounded pool with per-sandbox
+concurrency limits; output is buffered per job so it can be polled or streamed
+"""
+
+import os
+import time
+import uuid
+import codecs
+import signal
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Called by backends with (stream, data) for every chunk of output
+EmitFn = Callable[[str, str], None]
+
+FINAL_STATES = ("completed", "failed", "timeout", "cancelled")
+
+
+class EngineSaturated(Exception):
+    """Raised when the pending job limit is reached"""
+
+
+class ExecutionJob:
+    """One submitted command, its buffered output and its result"""
+
+    def __init__(
+        self,
+        command: str,
+        sandbox_id: str,
+        timeout: float,
+        environment: Optional[Dict[str, str]] = None,
+        max_output: int = 1024 * 1024,
+    ):
+        self.id = str(uuid.uuid4())
+        self.command = command
+        self.sandbox_id = sandbox_id
+        self.timeout = timeout
+        self.environment = environment or {}
+        self.status = "queued"
+        self.exit_code: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+        self.max_output = max_output
+        self.output_bytes = 0
+        self.truncated = False
+        # (stream, data) in arrival order
+        self.events: List[Tuple[str, str]] = []
+        self._changed: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATES
+
+    def emit(self, stream: str, data: str) -> None:
+        """Buffer a chunk of output and wake streaming readers
+
+        ``max_output`` caps the UTF-8 encoded size, not the character count.
+        """
+        if self.truncated:
+            return
+        size = len(data.encode())
+        self.output_bytes += size
+        if self.output_bytes > self.max_output:
+            keep = max(size - (self.output_bytes - self.max_output), 0)
+            # Cut on a character boundary so the kept output stays valid UTF-8
+            data = data.encode()[:keep].decode(errors="ignore")
+            self.output_bytes = self.max_output
+            self.truncated = True
+        if data:
+            self.events.append((stream, data))
+        self._notify()
+
+    def finish(
+        self, status: str, exit_code: Optional[int] = None, error: Optional[str] = None
+    ) -> None:
+        self.status = status
+        self.exit_code = exit_code
+        self.error = error
+        self.finished = time.monotonic()
+        self._notify()
+
+    def _notify(self) -> None:
+        if not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = asyncio.get_running_loop().create_future()
+
+    def output(self, stream: str) -> str:
+        return "".join(data for s, data in self.events if s == stream)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Result in the shape /api/execute has always returned"""
+        execution_time = None
+        if self.started is not None:
+            execution_time = round((self.finished or time.monotonic()) - self.started, 4)
+        return {
+            "execution_id": self.id,
+            "command": self.command,
+            "status": self.status,
+            "stdout": self.output("stdout"),
+            "stderr": self.output("stderr"),
+            "exit_code": self.exit_code,
+            "error": self.error,
+            "truncated": self.truncated,
+            "execution_time": execution_time,
+            "timestamp": self.created_at,
+            "sandbox_id": self.sandbox_id
+        }
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield output events as they arrive, ending with the final result"""
+        seq = 0
+        while True:
+            changed = self._changed
+            while seq < len(self.events):
+                stream, data = self.events[seq]
+                yield {"type": "output", "seq": seq, "stream": stream, "data": data}
+                seq += 1
+            if self.done:
+                break
+            await changed
+        yield {"type": "result", "seq": seq, "result": self.snapshot()}
+
+    async def wait(self) -> None:
+        while not self.done:
+            await self._changed
+
+
+def job_succeeded(job: ExecutionJob) -> bool:
+    return job.status == "completed" and job.exit_code == 0
+
+
+def skipped_result(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Result for a batch command that never ran because an earlier one failed"""
+    return {
+        "execution_id": None,
+        "command": spec["command"],
+        "status": "skipped",
+        "stdout": "",
+        "stderr": "",
+        "exit_code": None,
+        "error": "Skipped after an earlier command failed",
+        "truncated": False,
+        "execution_time": None,
+        "timestamp": datetime.now().isoformat(),
+        "sandbox_id": spec.get("sandbox_id", "default")
+    }
+
+
+class ExecutionBackend:
+    """Runs a job's command; returns the exit code"""
+
+    name = "base"
+
+    async def run(self, job: ExecutionJob, emit: EmitFn) -> int:
+        raise NotImplementedError
+
+
+class DemoExecutionBackend(ExecutionBackend):
+    """Simulated execution (stand-in until commands run inside E2B Desktop sessions)"""
+
+    name = "demo"
+
+    async def run(self, job: ExecutionJob, emit: EmitFn) -> int:
+        # In real implementation, this would:
+        # 1. Connect to E2B Desktop session
+        # 2. Execute command in sandbox environment
+        # 3. Stream output back as it is produced
+        await asyncio.sleep(0.1)
+        emit("stdout", f"Demo: Executed '{job.command}' in sandbox")
+        return 0
+
+
+class LocalSubprocessBackend(ExecutionBackend):
+    """Runs commands as local shell subprocesses (development and testing only)
+
+    Each command gets its own session, and the whole process group is
+    killed when the job ends, so nothing the shell started outlives it.
+    """
+
+    name = "local"
+
+    async def run(self, job: ExecutionJob, emit: EmitFn) -> int:
+        env = {**os.environ, **job.environment} if job.environment else None
+        process = await asyncio.create_subprocess_shell(
+            job.command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+        )
+
+        async def pump(reader: Optional[asyncio.StreamReader], stream: str) -> None:
+            # Incremental, so a multi-byte character split across reads is not mangled
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while reader is not None:
+                chunk = await reader.read(4096)
+                data = decoder.decode(chunk, final=not chunk)
+                if data:
+                    emit(stream, data)
+                if not chunk:
+                    break
+
+        try:
+            await asyncio.gather(pump(process.stdout, "stdout"), pump(process.stderr, "stderr"))
+            return await process.wait()
+        finally:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            if process.returncode is None:
+                await process.wait()
+
+
+class ExecutionEngine:
+    """Bounded job runner with per-sandbox concurrency limits
+
+    Jobs live in this process only; with several workers, poll the worker
+    that accepted the job.
+    """
+
+    def __init__(
+        self,
+        backend: ExecutionBackend,
+        max_workers: int = 8,
+        per_sandbox: int = 2,
+        max_pending: int = 1000,
+        max_jobs: int = 10000,
+        max_output: int = 1024 * 1024,
+    ):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.per_sandbox = per_sandbox
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.max_output = max_output
+
+        self._workers = asyncio.Semaphore(max_workers)
+        self._sandbox_slots: Dict[str, asyncio.Semaphore] = {}
+        self._sandbox_jobs: Dict[str, int] = {}
+        self._jobs: "OrderedDict[str, ExecutionJob]" = OrderedDict()
+        self.pending = 0
+        self.running = 0
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    def submit(
+        self,
+        command: str,
+        sandbox_id: str = "default",
+        timeout: float = 30,
+        environment: Optional[Dict[str, str]] = None,
+    ) -> ExecutionJob:
+        """Queue a command and return its job immediately"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise EngineSaturated("Execution queue is full")
+
+        job = ExecutionJob(command, sandbox_id, timeout, environment, self.max_output)
+        self._jobs[job.id] = job
+        self._prune()
+
+        self.pending += 1
+        self.submitted += 1
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def run_batch(
+        self,
+        commands: List[Dict[str, Any]],
+        parallel: bool = True,
+        fail_fast: bool = False,
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Run several commands, yielding (index, result) as each one finishes
+
+        Each command is a dict of submit() keyword arguments. With fail_fast,
+        the first failed or non-zero exit cancels (parallel) or skips
+        (sequential) the remaining commands. Capacity is checked here, before
+        anything is iterated, so EngineSaturated surfaces while the caller
+        can still answer 503 instead of inside a streamed response.
+        """
+        if self.pending + (len(commands) if parallel else 1) > self.max_pending:
+            self.rejected += 1
+            raise EngineSaturated("Execution queue is full")
+        return self._batch(commands, parallel, fail_fast)
+
+    async def _batch(
+        self,
+        commands: List[Dict[str, Any]],
+        parallel: bool,
+        fail_fast: bool,
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        if not parallel:
+            failed = False
+            for index, spec in enumerate(commands):
+                if failed:
+                    yield index, skipped_result(spec)
+                    continue
+                job = self.submit(**spec)
+                await job.wait()
+                failed = fail_fast and not job_succeeded(job)
+                yield index, job.snapshot()
+            return
+
+        jobs = [self.submit(**spec) for spec in commands]
+        index_of = {job.task: index for index, job in enumerate(jobs) if job.task is not None}
+        remaining = set(index_of)
+        try:
+            while remaining:
+                done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+                failed = False
+                for task in done:
+                    job = jobs[index_of[task]]
+                    failed = failed or not job_succeeded(job)
+                    yield index_of[task], job.snapshot()
+                if fail_fast and failed:
+                    for task in remaining:
+                        task.cancel()
+        finally:
+            # Client went away mid-stream: don't leave orphaned jobs running
+            for task in remaining:
+                task.cancel()
+
+    def get(self, execution_id: str) -> Optional[ExecutionJob]:
+        return self._jobs.get(execution_id)
+
+    def cancel(self, execution_id: str) -> bool:
+        job = self._jobs.get(execution_id)
+        if not job or job.done or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    def active_jobs(self, sandbox_id: str) -> int:
+        """Jobs queued or running in a sandbox"""
+        return self._sandbox_jobs.get(sandbox_id, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "max_workers": self.max_workers,
+            "per_sandbox": self.per_sandbox,
+            "pending": self.pending,
+            "running": self.running,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "retained_jobs": len(self._jobs),
+        }
+
+    async def _run(self, job: ExecutionJob) -> None:
+        slots = self._sandbox_slots.get(job.sandbox_id)
+        if slots is None:
+            slots = self._sandbox_slots[job.sandbox_id] = asyncio.Semaphore(self.per_sandbox)
+        self._sandbox_jobs[job.sandbox_id] = self._sandbox_jobs.get(job.sandbox_id, 0) + 1
+
+        queued = True
+        try:
+            async with slots, self._workers:
+                self.pending -= 1
+                queued = False
+                self.running += 1
+                job.status = "running"
+                job.started = time.monotonic()
+                try:
+                    exit_code = await asyncio.wait_for(
+                        self.backend.run(job, job.emit), timeout=job.timeout
+                    )
+                    job.finish("completed", exit_code)
+                    self.completed += 1
+                except asyncio.TimeoutError:
+                    job.finish("timeout", error=f"Command timed out after {job.timeout}s")
+                    self.timed_out += 1
+                finally:
+                    self.running -= 1
+        except asyncio.CancelledError:
+            job.finish("cancelled", error="Execution cancelled")
+        except Exception as e:
+            logger.error(f"Execution {job.id} failed: {e}")
+            job.finish("failed", error=str(e))
+            self.failed += 1
+        finally:
+            if queued:
+                self.pending -= 1
+            # Drop the sandbox's semaphore once it has no queued or running jobs
+            self._sandbox_jobs[job.sandbox_id] -= 1
+            if not self._sandbox_jobs[job.sandbox_id]:
+                del self._sandbox_jobs[job.sandbox_id]
+                self._sandbox_slots.pop(job.sandbox_id, None)
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond max_jobs"""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for execution_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[execution_id].done:
+                del self._jobs[execution_id]
+
+
+def create_execution_engine() -> ExecutionEngine:
+    """Build the engine from EXECUTION_BACKEND (demo or local) and pool limits"""
+    backend_name = os.getenv("EXECUTION_BACKEND", "demo").lower()
+    if backend_name == "local":
+        backend: ExecutionBackend = LocalSubprocessBackend()
+    elif backend_name == "demo":
+        backend = DemoExecutionBackend()
+    else:
+        raise ValueError(f"Unknown EXECUTION_BACKEND: {backend_name}")
+
+    return ExecutionEngine(
+        backend,
+        max_workers=int(os.getenv("EXECUTION_MAX_WORKERS", "8")),
+        per_sandbox=int(os.getenv("EXECUTION_PER_SANDBOX", "2")),
+        max_pending=int(os.getenv("EXECUTION_MAX_PENDING", "1000")),
+        max_jobs=int(os.getenv("EXECUTION_MAX_JOBS", "10000")),
+        max_output=int(os.getenv("EXECUTION_MAX_OUTPUT_BYTES", str(1024 * 1024))),
+    )
+
+
+async def benchmark(
+    count: int = 20, backend: str = "demo", port: int = 0, timeout: float = 60.0
+) -> Dict[str, Any]:
+    """Wall-clock time of ``count`` single /api/execute round trips versus one batch
+
+    Starts the backend in a separate process with EXECUTION_BACKEND=``backend``.
+    Single calls submit, then read the stream to the result, one after
+    another; the batch sends every command in one request.
+    """
+    import sys
+    import socket
+    import subprocess
+
+    import httpx
+
+    if not port:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+    env = {
+        **os.environ,
+        "EXECUTION_BACKEND": backend,
+        "E2B_API_KEY": os.getenv("E2B_API_KEY", "benchmark"),
+        "SANDBOX_POOL_SIZE": "0",
+        "RATE_LIMIT_IP_BURST_SIZE": str(max(60, 4 * count)),
+        "RATE_LIMIT_BURST_SIZE": str(max(20, 4 * count)),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            deadline = time.perf_counter() + timeout
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("Server exited before answering /health")
+                    if time.perf_counter() > deadline:
+                        raise TimeoutError(f"No /health response within {timeout}s")
+                    await asyncio.sleep(0.05)
+
+            start = time.perf_counter()
+            for i in range(count):
+                response = await client.post("/api/execute", json={"command": f"echo {i}"})
+                execution_id = response.json()["execution_id"]
+                await client.get(f"/api/execute/{execution_id}/stream")
+            individual = time.perf_counter() - start
+
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/execute/batch",
+                json={"commands": [{"command": f"echo {i}"} for i in range(count)]},
+            )
+            batched = time.perf_counter() - start
+            succeeded = response.json()["succeeded"]
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "backend": backend,
+        "commands": count,
+        "individual_ms": round(individual * 1000, 1),
+        "individual_requests": 2 * count,
+        "batch_ms": round(batched * 1000, 1),
+        "batch_requests": 1,
+        "batch_succeeded": succeeded,
+        "speedup": round(individual / batched, 2),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark one /api/execute/batch request against N single calls"
+    )
+    parser.add_argument("--commands", type=int, default=20)
+    parser.add_argument("--backend", default="demo", choices=["demo", "local"])
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(benchmark(args.commands, args.backend)), indent=2))
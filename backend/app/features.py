@@ -0,0 +1,180 @@
+"""
+Lazily loaded feature modules
+Features that pull in heavy dependencies (NumPy, Pillow, OpenCV, Tesseract,
+model runtimes) are imported on first use instead of at startup, so the
+service answers /health as soon as FastAPI is up
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import importlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Modules that must never be imported while main.py loads
+HEAVY_MODULES = ("numpy", "PIL", "cv2", "pytesseract", "torch", "transformers", "scipy", "skimage",
+                 "selenium", "playwright", "google.generativeai", "openai")
+
+
+class Feature:
+    """A module-level singleton built by ``module.factory()`` on first ``get()``"""
+
+    def __init__(self, name: str, module: str, factory: str, on_close: Optional[str] = None):
+        self.name = name
+        self.module = module
+        self.factory = factory
+        self.on_close = on_close
+        self.load_ms: Optional[float] = None
+        self._instance: Any = None
+        # Warmup runs in a worker thread while requests may arrive on the loop
+        self._lock = threading.Lock()
+        FEATURES[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.module)
+                    factory: Callable[[], Any] = getattr(module, self.factory)
+                    self._instance = factory()
+                    self.load_ms = round((time.perf_counter() - start) * 1000, 1)
+                    logger.info(f"Loaded feature {self.name} in {self.load_ms}ms")
+        return self._instance
+
+    async def aget(self) -> Any:
+        """get() without blocking the event loop on the first import"""
+        if self._instance is not None:
+            return self._instance
+        return await asyncio.to_thread(self.get)
+
+    def close(self) -> None:
+        if self._instance is not None and self.on_close:
+            getattr(self._instance, self.on_close)()
+
+    def stats(self) -> Dict[str, Any]:
+        """The feature's own stats once loaded; never triggers the import"""
+        if self._instance is None:
+            return {"loaded": False}
+        stats = self._instance.stats() if hasattr(self._instance, "stats") else {}
+        return {"loaded": True, "load_ms": self.load_ms, **stats}
+
+
+FEATURES: Dict[str, Feature] = {}
+
+
+def warmup_targets(spec: Optional[str] = None) -> List[Feature]:
+    """Features named in BACKEND_WARMUP ("all", "none" or a comma-separated list)"""
+    spec = (os.getenv("BACKEND_WARMUP", "none") if spec is None else spec).strip().lower()
+    if spec in ("", "none", "0", "false"):
+        return []
+    if spec == "all":
+        return list(FEATURES.values())
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in FEATURES]
+    if unknown:
+        logger.warning(f"Unknown warmup features: {', '.join(unknown)}")
+    return [FEATURES[name] for name in names if name in FEATURES]
+
+
+async def warmup(features: List[Feature]) -> None:
+    """Load features one by one in a worker thread, after startup has finished"""
+    for feature in features:
+        try:
+            await feature.aget()
+        except Exception as e:
+            logger.error(f"Warmup of {feature.name} failed: {e}")
+
+
+def eager_heavy_modules() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def benchmark_startup(
+    app_module: str = "main", port: int = 0, timeout: float = 60.0
+) -> Dict[str, Any]:
+    """Import time, heavy modules loaded at import, and time to first /health from a cold process"""
+    import socket
+    import subprocess
+    import urllib.request
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = (
+        "import sys, time, json; t = time.perf_counter(); "
+        f"import {app_module}; import features; "
+        "print(json.dumps({'import_ms': (time.perf_counter() - t) * 1000, "
+        "'heavy': features.eager_heavy_modules()}))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe], cwd=here, capture_output=True, text=True, check=True
+    )
+    report = __import__("json").loads(result.stdout.strip().splitlines()[-1])
+
+    if not port:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{app_module}:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                health = f"http://127.0.0.1:{port}/health"
+                with urllib.request.urlopen(health, timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("Server exited before answering /health")
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError(f"No /health response within {timeout}s")
+                time.sleep(0.02)
+        report["first_health_ms"] = (time.perf_counter() - start) * 1000
+    finally:
+        server.terminate()
+        server.wait()
+
+    report["import_ms"] = round(report["import_ms"], 1)
+    report["first_health_ms"] = round(report["first_health_ms"], 1)
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure backend cold start against a budget")
+    parser.add_argument("--import-budget-ms", type=float,
+                        default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "3000")))
+    parser.add_argument("--health-budget-ms", type=float,
+                        default=float(os.getenv("STARTUP_HEALTH_BUDGET_MS", "8000")))
+    args = parser.parse_args()
+
+    startup = benchmark_startup()
+    failures = []
+    if startup["heavy"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(startup['heavy'])}")
+    if startup["import_ms"] > args.import_budget_ms:
+        failures.append(
+            f"import took {startup['import_ms']}ms (budget {args.import_budget_ms:g}ms)"
+        )
+    if startup["first_health_ms"] > args.health_budget_ms:
+        failures.append(
+            f"first /health took {startup['first_health_ms']}ms "
+            f"(budget {args.health_budget_ms:g}ms)"
+        )
+    print(json.dumps({**startup, "failures": failures}, indent=2))
+    sys.exit(1 if failures else 0)
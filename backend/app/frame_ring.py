@@ -0,0 +1,361 @@
+"""
+Shared-memory ring buffer of desktop frames
+One capture process writes frames into a multiprocessing.shared_memory ring;
+any number of consumer processes read them as NumPy views without copying
+"""
+
+import os
+import sys
+import time
+import struct
+import asyncio
+import logging
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from screen_capture import FrameSource
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0xADF0
+# magic, slots, height, width, channels, (padding), latest sequence
+HEADER = struct.Struct("<IIIII4xQ")
+# sequence, capture timestamp; each slot's frame data follows its header
+SLOT_HEADER = struct.Struct("<Qd")
+ALIGN = 64
+
+
+def _aligned(size: int) -> int:
+    return -(-size // ALIGN) * ALIGN
+
+
+def _buffer(shm: shared_memory.SharedMemory) -> memoryview:
+    if shm.buf is None:
+        raise ValueError(f"Shared memory {shm.name} is closed")
+    return shm.buf
+
+
+class FrameGone(Exception):
+    """The requested frame was overwritten by the writer"""
+
+
+class SharedFrameRing:
+    """Fixed-size ring of frames in one shared memory segment
+
+    Each slot carries the sequence number of the frame in it. The writer
+    zeroes that number before touching the pixels and sets it afterwards,
+    so a reader that sees the same non-zero sequence before and after
+    using a view knows the frame was not torn (a seqlock). Views stay
+    valid for about ``slots - 1`` frame intervals; ``check`` tells a
+    reader whether it was too slow.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        header = HEADER.unpack_from(_buffer(shm), 0)
+        magic, self.slots, self.height, self.width, self.channels, _ = header
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory {shm.name} is not a frame ring")
+        self.frame_bytes = self.height * self.width * self.channels
+        self.slot_size = _aligned(SLOT_HEADER.size) + _aligned(self.frame_bytes)
+        self._base = _aligned(HEADER.size)
+        self._headers = [self._base + i * self.slot_size for i in range(self.slots)]
+        buf = _buffer(shm)
+        self._frames = [
+            np.ndarray((self.height, self.width, self.channels), dtype=np.uint8, buffer=buf,
+                       offset=offset + _aligned(SLOT_HEADER.size))
+            for offset in self._headers
+        ]
+        # The latest-sequence field, as a view so the writer's update is a single store
+        self._latest = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=HEADER.size - 8)
+
+    @classmethod
+    def create(cls, name: Optional[str], width: int, height: int, channels: int = 3,
+               slots: int = 4) -> "SharedFrameRing":
+        frame_bytes = width * height * channels
+        size = _aligned(HEADER.size) + slots * (_aligned(SLOT_HEADER.size) + _aligned(frame_bytes))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        HEADER.pack_into(_buffer(shm), 0, MAGIC, slots, height, width, channels, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedFrameRing":
+        shm = shared_memory.SharedMemory(name=name)
+        if sys.version_info < (3, 13):
+            # Before 3.13 attaching registers the segment with this process's resource
+            # tracker, which would unlink it under the writer when this process exits
+            resource_tracker.unregister(getattr(shm, "_name", shm.name), "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def latest_sequence(self) -> int:
+        return int(self._latest[0])
+
+    def slot_sequence(self, slot: int) -> int:
+        return SLOT_HEADER.unpack_from(_buffer(self.shm), self._headers[slot])[0]
+
+    # Writer side
+
+    def begin_write(self) -> Tuple[int, np.ndarray]:
+        """Next sequence number and the slot view to fill (capture straight into it)"""
+        sequence = self.latest_sequence + 1
+        slot = sequence % self.slots
+        # Invalidate the slot before its pixels change
+        SLOT_HEADER.pack_into(_buffer(self.shm), self._headers[slot], 0, 0.0)
+        return sequence, self._frames[slot]
+
+    def commit(self, sequence: int, timestamp: Optional[float] = None) -> None:
+        slot = sequence % self.slots
+        SLOT_HEADER.pack_into(
+            _buffer(self.shm), self._headers[slot], sequence, timestamp or time.time()
+        )
+        self._latest[0] = sequence
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """Copy one frame in; returns its sequence number"""
+        sequence, view = self.begin_write()
+        np.copyto(view, frame)
+        self.commit(sequence, timestamp)
+        return sequence
+
+    # Reader side
+
+    def read(self, sequence: int) -> Tuple[np.ndarray, float]:
+        """Zero-copy view of frame ``sequence`` and its capture time"""
+        slot = sequence % self.slots
+        stored, timestamp = SLOT_HEADER.unpack_from(_buffer(self.shm), self._headers[slot])
+        if stored != sequence:
+            raise FrameGone(f"Frame {sequence} is no longer in the ring (slot holds {stored})")
+        view = self._frames[slot].view()
+        view.flags.writeable = False
+        return view, timestamp
+
+    def latest(self) -> Tuple[int, np.ndarray, float]:
+        """Newest complete frame as (sequence, view, timestamp)"""
+        while True:
+            sequence = self.latest_sequence
+            if sequence == 0:
+                raise FrameGone("No frame written yet")
+            try:
+                view, timestamp = self.read(sequence)
+                return sequence, view, timestamp
+            except FrameGone:
+                # Lapped between reading the counter and the slot; try the newer one
+                continue
+
+    def check(self, sequence: int) -> bool:
+        """True while frame ``sequence`` is still intact; call after using a view"""
+        return self.slot_sequence(sequence % self.slots) == sequence
+
+    def snapshot(self, sequence: Optional[int] = None) -> Tuple[int, np.ndarray]:
+        """A private copy, verified not to have been overwritten while copying"""
+        if sequence is None:
+            sequence, view, _ = self.latest()
+        else:
+            view, _ = self.read(sequence)
+        frame = view.copy()
+        if not self.check(sequence):
+            raise FrameGone(f"Frame {sequence} was overwritten while copying")
+        return sequence, frame
+
+    async def wait_for(self, after: int, timeout: float = 1.0, poll: float = 0.002) -> int:
+        """Sequence of the first frame newer than ``after``"""
+        deadline = time.monotonic() + timeout
+        while self.latest_sequence <= after:
+            if time.monotonic() >= deadline:
+                raise asyncio.TimeoutError(f"No frame after {after} within {timeout}s")
+            await asyncio.sleep(poll)
+        return self.latest_sequence
+
+    def close(self) -> None:
+        # Views hold exported buffers; drop them before closing the mapping
+        self._frames = []
+        self._latest = np.zeros(1, dtype=np.uint64)
+        try:
+            self.shm.close()
+        except BufferError:
+            # A consumer still holds a view; the mapping goes away with the process
+            logger.warning(f"Frame ring {self.name} closed while views were still referenced")
+        if self.owner:
+            self.shm.unlink()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "shape": [self.height, self.width, self.channels],
+            "latest_sequence": self.latest_sequence,
+            "bytes": self.shm.size,
+        }
+
+
+class FrameCaptureService:
+    """Captures from a FrameSource into a ring at a fixed rate on a thread"""
+
+    def __init__(self, source: FrameSource, ring: SharedFrameRing, fps: float = 10.0):
+        self.source = source
+        self.ring = ring
+        self.fps = fps
+        self.frames = 0
+        self.capture_ms_total = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name="frame-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run(self) -> None:
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                self.ring.write(self.source.capture())
+                self.frames += 1
+            except Exception as e:
+                logger.error(f"Frame capture failed: {e}")
+            self.capture_ms_total += (time.perf_counter() - start) * 1000
+            if interval:
+                next_at += interval
+                # Fall behind rather than burst if a capture overran
+                next_at = max(next_at, time.monotonic())
+                self._stop.wait(next_at - time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.ring.stats(),
+            "fps": self.fps,
+            "frames": self.frames,
+            "avg_capture_ms": round(self.capture_ms_total / self.frames, 3) if self.frames else 0.0,
+        }
+
+
+class SharedRingFrameSource(FrameSource):
+    """FrameSource reading the newest frame of a ring written by another process
+
+    Returns a verified private copy rather than a view: the pipeline diffs
+    and encodes a frame in worker threads, which can outlast the few frame
+    intervals a slot survives. A copy torn by the writer is retried with
+    the newer frame. Attaches on first capture so the capture service may
+    start later.
+    """
+
+    name = "shm"
+
+    def __init__(self, ring_name: str):
+        self.ring_name = ring_name
+        self.ring: Optional[SharedFrameRing] = None
+
+    def capture(self) -> np.ndarray:
+        if self.ring is None:
+            self.ring = SharedFrameRing.attach(self.ring_name)
+        attempts = self.ring.slots
+        while True:
+            try:
+                return self.ring.snapshot()[1]
+            except FrameGone:
+                attempts -= 1
+                if not attempts or self.ring.latest_sequence == 0:
+                    raise
+
+
+def benchmark(
+    width: int = 1920, height: int = 1080, frames: int = 300, slots: int = 4
+) -> Dict[str, Any]:
+    """Write and read throughput of the ring versus copying every frame"""
+    from screen_capture import SyntheticFrameSource
+
+    source = SyntheticFrameSource(width, height)
+    corpus = [source.capture() for _ in range(8)]
+    ring = SharedFrameRing.create(None, width, height, slots=slots)
+    reader = SharedFrameRing.attach(ring.name)
+    try:
+        start = time.perf_counter()
+        for i in range(frames):
+            ring.write(corpus[i % len(corpus)])
+        write_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            sequence, view, _ = reader.latest()
+            view[0, 0, 0]
+            reader.check(sequence)
+        view_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            reader.snapshot()
+        copy_s = time.perf_counter() - start
+
+        frame_mb = width * height * 3 / 1e6
+        return {
+            "frame_mb": round(frame_mb, 2),
+            "write_fps": round(frames / write_s, 1),
+            "write_gb_s": round(frames * frame_mb / 1000 / write_s, 2),
+            "view_reads_per_s": round(frames / view_s, 1),
+            "copy_reads_per_s": round(frames / copy_s, 1),
+        }
+    finally:
+        reader.close()
+        ring.close()
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(
+        description="Shared-memory frame ring: capture service and benchmark"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Capture frames into a shared-memory ring")
+    serve.add_argument("--name", default=os.getenv("SCREENSHOT_SHM_NAME", "adx-frames"))
+    serve.add_argument("--source", default="x11", choices=["x11", "synthetic"])
+    serve.add_argument("--display", default=os.getenv("DISPLAY", ":0"))
+    serve.add_argument("--fps", type=float, default=10.0)
+    serve.add_argument("--slots", type=int, default=4)
+    bench = sub.add_parser("bench", help="Measure ring throughput")
+    bench.add_argument("--frames", type=int, default=300)
+    bench.add_argument("--width", type=int, default=1920)
+    bench.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        print(json.dumps(benchmark(args.width, args.height, args.frames), indent=2))
+    else:
+        from screen_capture import SyntheticFrameSource, X11FrameSource
+
+        logging.basicConfig(level=logging.INFO)
+        if args.source == "x11":
+            frame_source: FrameSource = X11FrameSource(args.display)
+        else:
+            frame_source = SyntheticFrameSource()
+        first = frame_source.capture()
+        height, width, channels = first.shape
+        frame_ring = SharedFrameRing.create(args.name, width, height, channels, args.slots)
+        service = FrameCaptureService(frame_source, frame_ring, args.fps)
+        signal.signal(signal.SIGTERM, lambda *_: service.stop())
+        logger.info(f"Capturing {width}x{height} at {args.fps:g} fps into shared memory "
+                    f"{args.name}")
+        try:
+            service.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            frame_ring.close()
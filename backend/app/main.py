@@ -7,16 +7,49 @@ Provides AI-powered desktop automation and chat services
 import os
 import logging
 import asyncio
-import json
-from typing import Dict, List, Optional, Any
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
+from fastapi import FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 import uuid
+import time
+import argparse
 from datetime import datetime
 
+from admission import AdmissionMiddleware, create_admission_controller
+from chat_history import ChatHistory, create_history_archive, message_dict
+from context_builder import create_context_builder
+from execution_engine import EngineSaturated, create_execution_engine
+from features import Feature, warmup, warmup_targets
+from metrics import (
+    MetricsMiddleware,
+    SANDBOX_CREATE_DURATION,
+    SANDBOX_RECLAIMED,
+    SESSION_STORE_ENTRIES,
+    WS_BROADCAST_FANOUT,
+    WS_CONNECTIONS,
+    latency_reservoir,
+    timed_sse,
+    uptime_seconds,
+)
+from model_backends import get_model_backend
+from pubsub import create_broadcaster
+from response_cache import create_response_cache, response_key
+from sandbox_lifecycle import create_lifecycle_manager
+from sandbox_pool import SandboxPool
+from sandbox_scheduler import (
+    SandboxNeverFits,
+    SchedulerSaturated,
+    create_sandbox_scheduler,
+)
+from serialization import DefaultResponse, dumps_str, loads, sse_frame
+from session_store import create_session_store
+from sse_streams import create_stream_registry, parse_event_id
+from ws_broadcast import ConnectionManager
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,7 +57,17 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="ADX Agent Backend",
     description="AI-powered desktop automation backend with E2B Desktop SDK integration",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
+)
+
+# Token buckets and concurrency caps for /api/ai-agent, /api/execute and /api/sandbox
+# (429 with Retry-After); added first so CORS headers and metrics also cover rejected requests
+admission = create_admission_controller()
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    trust_forwarded=os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true",
 )
 
 # CORS middleware
@@ -36,12 +79,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms and in-flight gauges, served on /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Pydantic models
 class ChatMessage(BaseModel):
     content: str
     role: str = "user"
     session_id: str | None = None
     stream: bool = False
+    # False keeps this session's responses out of the response cache, True opts back in
+    cache: bool | None = None
 
 class SandboxConfig(BaseModel):
     environment: str = "ubuntu-desktop"
@@ -54,22 +102,177 @@ class SandboxRequest(BaseModel):
     action: str  # create, destroy, status
     config: Optional[SandboxConfig] = None
     sandbox_id: Optional[str] = None
+    session_id: Optional[str] = None  # Pin the sandbox to a chat session
 
 class ExecutionRequest(BaseModel):
     command: str
     timeout: int = 30
     sandbox_id: Optional[str] = None
+    # Run in the session's sandbox (placed on first use) when no sandbox_id is given
+    session_id: Optional[str] = None
     environment: Optional[Dict[str, str]] = None
+    wait: bool = False  # Block until the command finishes instead of returning the execution_id
+
+
+class BatchExecutionRequest(BaseModel):
+    commands: List[ExecutionRequest]
+    mode: str = "parallel"  # parallel or sequential
+    fail_fast: bool = False
+    stream: bool = False  # Stream each result as it completes instead of returning them in order
 
 class AIRequest(BaseModel):
     messages: List[Dict[str, str]]
     stream: bool = True
     session_id: Optional[str] = None
+    # False keeps this session's responses out of the response cache, True opts back in
+    cache: Optional[bool] = None
+
+
+# Session storage (SESSION_STORE_BACKEND=memory|redis)
+CHAT_CONTEXT_WINDOW = int(os.getenv("CHAT_CONTEXT_WINDOW", "10"))
+SESSION_TTL = float(os.getenv("SESSION_TIMEOUT_MINUTES", "30")) * 60
+
+# Messages that fall out of a session's context window spill here
+chat_archive = create_history_archive(ttl=SESSION_TTL)
+# Fits each turn's prompt to CONTEXT_TOKEN_BUDGET; spilled messages fold into a running summary
+context_builder = create_context_builder()
+CONTEXT_ARCHIVE_READ = int(os.getenv("CONTEXT_ARCHIVE_READ", "200"))
+chat_sessions = create_session_store(
+    "chat",
+    max_entries=int(os.getenv("CHAT_SESSION_MAX_ENTRIES", "10000")),
+    ttl=SESSION_TTL,
+    on_evict=chat_archive.discard,
+    encode=ChatHistory.to_dict,
+    decode=ChatHistory.from_dict,
+)
+active_connections = ConnectionManager(
+    queue_size=int(os.getenv("WS_SEND_QUEUE_SIZE", "256")),
+    overflow_policy=os.getenv("WS_OVERFLOW_POLICY", "drop_oldest"),
+)
+
+# Bounded pool that runs /api/execute jobs (EXECUTION_BACKEND=demo|local)
+execution_engine = create_execution_engine()
+EXECUTION_MAX_BATCH = int(os.getenv("EXECUTION_MAX_BATCH", "100"))
+
+# Fans broadcasts out to the clients of every worker (BROADCAST_BACKEND=local|redis)
+broadcaster = create_broadcaster()
+# Bin-packs sandboxes onto hosts by CPU and memory and pins chat sessions to them (SANDBOX_HOSTS);
+# shared by every worker through Redis when SESSION_STORE_BACKEND=redis
+sandbox_scheduler = create_sandbox_scheduler()
+
+# Capacity releases for evicted sandboxes, referenced until done so they are not garbage-collected
+eviction_releases: set = set()
+
+
+def sandbox_evicted(sandbox_id: str) -> None:
+    sandbox_lifecycle.forget(sandbox_id)
+    # on_evict is synchronous; the capacity goes back in the background
+    task = asyncio.get_running_loop().create_task(sandbox_scheduler.release(sandbox_id))
+    eviction_releases.add(task)
+    task.add_done_callback(eviction_releases.discard)
+
+
+sandbox_sessions = create_session_store(
+    "sandbox",
+    max_entries=int(os.getenv("SANDBOX_SESSION_MAX_ENTRIES", "1000")),
+    on_evict=sandbox_evicted,
+)
+
+# Hibernates idle sandboxes and destroys long-idle or expired ones
+# (SANDBOX_IDLE_TTL, SANDBOX_MAX_LIFETIME)
+sandbox_lifecycle = create_lifecycle_manager(
+    sandbox_sessions,
+    sandbox_scheduler,
+    busy=lambda sandbox_id: execution_engine.active_jobs(sandbox_id) > 0,
+)
+
+# Streaming model backend (AI_MODEL_BACKEND=demo|fake)
+model_backend = get_model_backend()
+
+# Identical prompts are served from memory and concurrent identical calls share one model call;
+# the key leaves out the per-session context, so sessions that need it opt out ("cache": false)
+response_cache = create_response_cache()
+
+# /api/ai-agent streams run in the background into a replay ring, so clients resume
+# with Last-Event-ID
+sse_streams = create_stream_registry()
+
+# Warm pool of pre-booted sandboxes, keyed by SandboxConfig shape; warm sandboxes hold
+# scheduler capacity like any other
+sandbox_pool = SandboxPool(
+    size=int(os.getenv("SANDBOX_POOL_SIZE", "2")),
+    max_idle=float(os.getenv("SANDBOX_POOL_MAX_IDLE", "600")),
+    refill_interval=float(os.getenv("SANDBOX_POOL_REFILL_INTERVAL", "5")),
+    max_shapes=int(os.getenv("SANDBOX_POOL_MAX_SHAPES", "4")),
+    scheduler=sandbox_scheduler,
+)
+
+# Features with heavy dependencies (NumPy, Pillow, OpenCV) are imported on first use;
+# BACKEND_WARMUP=all (or a comma-separated list of names) loads them after startup instead
+# Screenshot deltas per session (SCREENSHOT_SOURCE=synthetic|x11|recorded|shm)
+screenshots = Feature("screenshots", "screen_capture", "create_screenshot_pipeline")
+
+# OCR and widget detection on changed screen regions (process pool started on first use)
+element_detector = Feature(
+    "element_detection", "element_detection", "create_element_detector", on_close="close"
+)
+
+
+@app.on_event("startup")
+async def warm_up_features():
+    """Load heavy features in the background so startup itself stays fast"""
+    targets = warmup_targets()
+    if targets:
+        app.state.warmup = asyncio.create_task(warmup(targets))
+
+
+@app.on_event("startup")
+async def start_sandbox_pool():
+    """Pre-warm sandboxes for the default config shape"""
+    if os.getenv("E2B_API_KEY"):
+        sandbox_pool.register_shape(SandboxConfig().dict())
+        await sandbox_pool.start()
+
+
+@app.on_event("shutdown")
+async def stop_sandbox_pool():
+    await sandbox_pool.stop()
+
+
+@app.on_event("startup")
+async def start_sandbox_reaper():
+    await sandbox_lifecycle.start()
+
+
+@app.on_event("shutdown")
+async def stop_sandbox_reaper():
+    await sandbox_lifecycle.stop()
+
+
+@app.on_event("startup")
+async def start_broadcaster():
+    """Deliver frames published by any worker to this worker's clients"""
+    def deliver(frame: str) -> None:
+        start = time.perf_counter()
+        active_connections.broadcast_frame(frame)
+        WS_BROADCAST_FANOUT.observe(time.perf_counter() - start)
 
-# In-memory storage (use Redis/DB in production)
-chat_sessions: Dict[str, List[Dict[str, str]]] = {}
-active_connections: List[WebSocket] = []
-sandbox_sessions: Dict[str, Dict[str, Any]] = {}
+    await broadcaster.start(deliver)
+
+
+@app.on_event("shutdown")
+async def stop_broadcaster():
+    await broadcaster.stop()
+
+
+@app.on_event("shutdown")
+async def stop_element_detector():
+    element_detector.close()
+
+
+@app.on_event("shutdown")
+async def stop_response_cache():
+    await response_cache.close()
 
 @app.get("/")
 async def root():
@@ -81,26 +284,62 @@ async def root():
         "timestamp": datetime.now().isoformat()
     }
 
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    SESSION_STORE_ENTRIES.labels("chat").set(await chat_sessions.size())
+    SESSION_STORE_ENTRIES.labels("sandbox").set(await sandbox_sessions.size())
+    WS_CONNECTIONS.set(len(active_connections))
+    SANDBOX_RECLAIMED.labels("cpu").set(sandbox_lifecycle.reclaimed_cpu)
+    SANDBOX_RECLAIMED.labels("memory_gb").set(sandbox_lifecycle.reclaimed_memory)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy",
-        "uptime": "running",
+        "uptime": uptime_seconds(),
+        "latency": latency_reservoir.percentiles(),
         "api_keys_available": {
             "gemini": bool(os.getenv("GOOGLE_GENERATIVE_AI_API_KEY")),
             "e2b": bool(os.getenv("E2B_API_KEY")),
             "huggingface": bool(os.getenv("HF_TOKEN"))
         },
-        "active_sessions": len(chat_sessions),
+        "active_sessions": await chat_sessions.size(),
         "active_connections": len(active_connections),
-        "active_sandboxes": len(sandbox_sessions),
+        "websocket": active_connections.stats(),
+        "broadcast": broadcaster.stats(),
+        "worker_pid": os.getpid(),
+        "active_sandboxes": await sandbox_sessions.size(),
+        "session_store": {
+            "chat": chat_sessions.stats(),
+            "sandbox": sandbox_sessions.stats(),
+            "chat_archive": chat_archive.stats()
+        },
+        "sandbox_pool": sandbox_pool.stats(),
+        "sandbox_scheduler": await sandbox_scheduler.stats(),
+        "sandbox_lifecycle": sandbox_lifecycle.stats(),
+        "execution": execution_engine.stats(),
+        "screenshots": screenshots.stats(),
+        "element_detection": element_detector.stats(),
+        "sse": sse_streams.stats(),
+        "context": context_builder.stats(),
+        "response_cache": response_cache.stats(),
+        "admission": admission.stats(),
         "endpoints": {
             "sandbox": "/api/sandbox",
             "ai_agent": "/api/ai-agent", 
+            "ai_agent_resume": "/api/ai-agent/stream/{session_id}",
             "execute": "/api/execute",
+            "execute_batch": "/api/execute/batch",
             "chat": "/api/chat",
-            "websocket": "/ws"
+            "screenshot": "/api/screenshot/{session_id}",
+            "elements": "/api/screenshot/{session_id}/elements",
+            "websocket": "/ws",
+            "metrics": "/metrics"
         }
     }
 
@@ -121,33 +360,18 @@ async def manage_sandbox(request: SandboxRequest):
             )
         
         if request.action == "create":
-            # Generate sandbox ID
-            sandbox_id = str(uuid.uuid4())
-            
-            # Create sandbox session
-            sandbox_config = request.config or SandboxConfig()
-            
-            # In a real implementation, this would call E2B Desktop SDK
-            # For demo purposes, we'll simulate the sandbox creation
-            
-            sandbox_session = {
-                "id": sandbox_id,
-                "status": "creating",
-                "config": sandbox_config.dict(),
-                "created_at": datetime.now().isoformat(),
-                "vnc_url": f"vnc://localhost:5900/{sandbox_id}",
-                "web_interface": f"http://localhost:6080/vnc.html?id={sandbox_id}",
-                "endpoints": {
-                    "execute": f"/api/execute?sandbox_id={sandbox_id}",
-                    "status": f"/api/sandbox/status/{sandbox_id}"
+            # A session keeps its sandbox so caches and files stay warm
+            pinned = await session_sandbox(request.session_id)
+            if pinned:
+                return {
+                    "status": "existing",
+                    "sandbox": pinned,
+                    "message": "Session already has a sandbox"
                 }
-            }
-            
-            # Simulate sandbox startup delay
-            await asyncio.sleep(2)
-            sandbox_session["status"] = "running"
             
-            sandbox_sessions[sandbox_id] = sandbox_session
+            sandbox_session = await provision_sandbox(
+                request.config or SandboxConfig(), request.session_id
+            )
             
             return {
                 "status": "created",
@@ -156,11 +380,11 @@ async def manage_sandbox(request: SandboxRequest):
             }
             
         elif request.action == "destroy":
-            if not request.sandbox_id or request.sandbox_id not in sandbox_sessions:
-                raise HTTPException(status_code=404, detail="Sandbox not found")
-            
             # Destroy sandbox
-            del sandbox_sessions[request.sandbox_id]
+            if not request.sandbox_id or not await sandbox_sessions.delete(request.sandbox_id):
+                raise HTTPException(status_code=404, detail="Sandbox not found")
+            await sandbox_scheduler.release(request.sandbox_id)
+            sandbox_lifecycle.forget(request.sandbox_id)
             
             return {
                 "status": "destroyed",
@@ -169,51 +393,139 @@ async def manage_sandbox(request: SandboxRequest):
             }
             
         elif request.action == "status":
-            if not request.sandbox_id or request.sandbox_id not in sandbox_sessions:
+            sandbox = await sandbox_sessions.get(request.sandbox_id) if request.sandbox_id else None
+            if not sandbox:
                 raise HTTPException(status_code=404, detail="Sandbox not found")
+            await sandbox_lifecycle.touch(sandbox["id"])
             
             return {
                 "status": "success",
-                "sandbox": sandbox_sessions[request.sandbox_id]
+                "sandbox": sandbox
             }
             
         else:
             raise HTTPException(status_code=400, detail="Invalid action. Use: create, destroy, or status")
             
+    except SchedulerSaturated as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))}
+        )
+    except SandboxNeverFits as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error managing sandbox: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+async def reserve_capacity(config: SandboxConfig) -> str:
+    """Reserve capacity for a pool miss, shedding warm sandboxes before queueing behind them"""
+    reservation = await sandbox_scheduler.try_reserve(config.cpu, config.memory)
+    while reservation is None and await sandbox_pool.shed():
+        reservation = await sandbox_scheduler.try_reserve(config.cpu, config.memory)
+    if reservation is None:
+        reservation = await sandbox_scheduler.reserve(config.cpu, config.memory)
+    return reservation
+
+
+async def provision_sandbox(
+    config: SandboxConfig, session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Take a pre-warmed sandbox, or reserve capacity on a host and boot one on a pool miss"""
+    create_start = time.perf_counter()
+    sandbox_session = sandbox_pool.take(config.dict())
+    if sandbox_session is not None:
+        # Its capacity was reserved when the pool booted it
+        sandbox_id = sandbox_session["id"]
+        if session_id:
+            await sandbox_scheduler.pin(session_id, sandbox_id)
+        sandbox_session["host"] = await sandbox_scheduler.host_of(sandbox_id)
+        SANDBOX_CREATE_DURATION.labels("hit").observe(time.perf_counter() - create_start)
+    else:
+        reservation = await reserve_capacity(config)
+        try:
+            sandbox_session = await sandbox_pool.boot(config.dict())
+        except BaseException:
+            await sandbox_scheduler.release(reservation)
+            raise
+        SANDBOX_CREATE_DURATION.labels("miss").observe(time.perf_counter() - create_start)
+        sandbox_id = sandbox_session["id"]
+        sandbox_session["host"] = await sandbox_scheduler.bind(reservation, sandbox_id, session_id)
+    sandbox_session["session_id"] = session_id
+
+    await sandbox_sessions.set(sandbox_id, sandbox_session)
+    await sandbox_lifecycle.touch(sandbox_id)
+    return sandbox_session
+
+
+async def session_sandbox(session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The sandbox pinned to a session, if it still exists"""
+    sandbox_id = await sandbox_scheduler.sandbox_for(session_id) if session_id else None
+    return await sandbox_sessions.get(sandbox_id) if sandbox_id else None
+
+
+async def resolve_sandbox(sandbox_id: Optional[str], session_id: Optional[str]) -> str:
+    """Explicit sandbox, else the session's (placed on first use), else the shared default
+
+    Marks the sandbox active and wakes it if the reaper hibernated it.
+    """
+    if sandbox_id:
+        sandbox = await sandbox_sessions.get(sandbox_id)
+        if sandbox is None:
+            raise HTTPException(status_code=404, detail=f"Sandbox not found: {sandbox_id}")
+        await sandbox_lifecycle.wake(sandbox)
+        return sandbox_id
+    if session_id:
+        pinned = await session_sandbox(session_id)
+        if pinned is None:
+            pinned = await provision_sandbox(SandboxConfig(), session_id)
+        else:
+            await sandbox_lifecycle.wake(pinned)
+        return pinned["id"]
+    return "default"
+
+
 @app.get("/api/sandbox/status/{sandbox_id}")
 async def get_sandbox_status(sandbox_id: str):
     """Get status of specific sandbox"""
-    if sandbox_id not in sandbox_sessions:
+    sandbox = await sandbox_sessions.get(sandbox_id)
+    if not sandbox:
         raise HTTPException(status_code=404, detail="Sandbox not found")
+    await sandbox_lifecycle.touch(sandbox_id)
     
     return {
         "status": "success",
-        "sandbox": sandbox_sessions[sandbox_id]
+        "sandbox": sandbox
     }
 
 # New: AI Agent Streaming API
 @app.post("/api/ai-agent")
-async def ai_agent_chat(request: AIRequest):
+async def ai_agent_chat(request: AIRequest, last_event_id: Optional[str] = Header(None),
+                        cache_control: Optional[str] = Header(None)):
     """Stream AI responses with tool calling for desktop control"""
+    request_start = time.perf_counter()
     try:
         gemini_api_key = os.getenv("GOOGLE_GENERATIVE_AI_API_KEY")
         e2b_api_key = os.getenv("E2B_API_KEY")
         
         session_id = request.session_id or str(uuid.uuid4())
+        if request.cache is not None:
+            response_cache.set_opt_out(session_id, not request.cache)
+        bypass_cache = "no-cache" in (cache_control or "").lower()
         
         if request.stream:
-            return StreamingResponse(
-                ai_agent_stream(request, session_id, gemini_api_key, e2b_api_key),
-                media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Access-Control-Allow-Origin": "*",
-                }
+            resume_from = parse_event_id(last_event_id)
+            stream = sse_streams.get(session_id) if resume_from is not None else None
+            if stream is None or resume_from is None or resume_from < stream.first_id:
+                # A retry without Last-Event-ID, or one from an earlier run, starts a new generation
+                stream = sse_streams.start(
+                    session_id,
+                    ai_agent_stream(request, session_id, gemini_api_key, e2b_api_key, bypass_cache),
+                )
+            return event_stream_response(
+                timed_sse("ai_agent", sse_streams.subscribe(stream, resume_from), request_start),
+                session_id,
             )
         else:
             # Non-streaming response
@@ -228,106 +540,151 @@ async def ai_agent_chat(request: AIRequest):
         logger.error(f"Error in AI agent chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def ai_agent_stream(request: AIRequest, session_id: str, gemini_api_key: str, e2b_api_key: str):
+
+@app.get("/api/ai-agent/stream/{session_id}")
+async def resume_ai_agent_stream(session_id: str, last_event_id: Optional[str] = Header(None)):
+    """Reattach to a session's latest stream (EventSource reconnects send Last-Event-ID)"""
+    stream = sse_streams.get(session_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="No stream for this session")
+    return event_stream_response(
+        timed_sse("ai_agent_resume", sse_streams.subscribe(stream, parse_event_id(last_event_id))),
+        session_id,
+    )
+
+
+def event_stream_response(events: AsyncIterator[bytes], session_id: str) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            # Stop nginx-style proxies from buffering events and heartbeats
+            "X-Accel-Buffering": "no",
+            "X-Session-ID": session_id,
+        }
+    )
+
+
+async def ai_agent_stream(request: AIRequest, session_id: str, gemini_api_key: str,
+                          e2b_api_key: str, bypass_cache: bool = False):
     """Stream AI responses with tool calling"""
     try:
-        # Process messages and generate responses
-        messages = request.messages
-        
+        # Process messages and generate responses; the client sends its whole history, so
+        # fit it to the budget
+        messages, _ = context_builder.build(None, request.messages)
+
         # Initialize conversation context
-        context = f"Session: {session_id}\nAvailable sandboxes: {len(sandbox_sessions)}\n"
-        
-        # Generate AI response (in real implementation, use Gemini API)
-        response_content = await generate_ai_response(messages, context, gemini_api_key, e2b_api_key)
+        context = f"Session: {session_id}\nAvailable sandboxes: {await sandbox_sessions.size()}\n"
+
+        # Stream AI response chunks as they are generated (in real implementation, use Gemini API)
+        seq = 0
+        tokens_used = 0
+        cache_outcome, chunks = cached_ai_response(
+            messages, context, gemini_api_key, e2b_api_key, session_id, bypass_cache
+        )
+        async for chunk in chunks:
+            delta_data = {
+                "type": "ai_response_delta",
+                "seq": seq,
+                "delta": chunk,
+                "role": "assistant",
+                "session_id": session_id,
+                "timestamp": datetime.now()
+            }
+            yield sse_frame(delta_data)
+            seq += 1
+            tokens_used += len(chunk.split())
         
-        # Simulate streaming response
-        response_data = {
-            "type": "ai_response",
-            "content": response_content,
+        response_end_data = {
+            "type": "ai_response_end",
+            "seq": seq,
             "role": "assistant",
             "session_id": session_id,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(),
             "tool_calls": [],  # Would include actual tool calls in real implementation
             "metadata": {
                 "model": "gemini-3-pro",
+                "backend": model_backend.name,
                 "stream": True,
-                "tokens_used": len(response_content.split())
+                "chunks": seq,
+                "tokens_used": tokens_used,
+                "cache": cache_outcome
             }
         }
         
-        # Stream the response
-        yield f"data: {json.dumps(response_data)}\n\n"
+        yield sse_frame(response_end_data)
         
         # Simulate additional tool calls or updates
         await asyncio.sleep(0.5)
         
+        # Only the tiles that changed since this session's last screenshot are sent
+        frame = await (await screenshots.aget()).capture(session_id)
         tool_call_data = {
             "type": "tool_call",
             "tool": "screenshot",
             "parameters": {"region": "full"},
-            "result": "screenshot_captured",
-            "timestamp": datetime.now().isoformat()
+            "result": "screenshot_captured" if frame else "screenshot_unchanged",
+            "frame": frame.to_dict() if frame else None,
+            "timestamp": datetime.now()
         }
         
-        yield f"data: {json.dumps(tool_call_data)}\n\n"
+        yield sse_frame(tool_call_data)
         
         # Final completion signal
         completion_data = {
             "type": "completion",
             "session_id": session_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
         
-        yield f"data: {json.dumps(completion_data)}\n\n"
+        yield sse_frame(completion_data)
         
     except Exception as e:
         error_data = {
             "type": "error",
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
-        yield f"data: {json.dumps(error_data)}\n\n"
+        yield sse_frame(error_data)
 
-async def generate_ai_response(messages: List[Dict[str, str]], context: str, gemini_api_key: str, e2b_api_key: str) -> str:
-    """Generate AI response using Gemini API (simulated for demo)"""
+
+async def generate_ai_response(messages: List[Dict[str, str]], context: str, gemini_api_key: str,
+                               e2b_api_key: str) -> AsyncIterator[str]:
+    """Stream AI response chunks using Gemini API (simulated for demo)"""
     
     # Check for API keys
     has_api_keys = bool(gemini_api_key and e2b_api_key)
     
-    if not has_api_keys:
-        return f"""🤖 **Demo Mode - AI Agent Response**
-
-**Context**: {context}
-
-**Your last message**: "{messages[-1]['content'] if messages else 'None'}"
+    async for chunk in model_backend.stream(messages, context, full_mode=has_api_keys):
+        yield chunk
 
-**Available Capabilities**:
-- 🖥️ Desktop automation via E2B Desktop SDK
-- 🌐 Browser automation with Playwright
-- 📁 File system operations
-- 🖼️ Screenshot capture and analysis
-- 🔧 System monitoring and control
 
-**Demo Actions**:
-To demonstrate capabilities, I would:
-1. Capture current desktop screenshot
-2. Analyze UI elements for interaction
-3. Execute requested actions
-4. Provide real-time feedback
+def cached_ai_response(
+    messages: List[Dict[str, str]],
+    context: str,
+    gemini_api_key: str,
+    e2b_api_key: str,
+    session_id: Optional[str],
+    bypass: bool = False,
+) -> Tuple[str, AsyncIterator[str]]:
+    """Response chunks through the response cache and how they were served
 
-**Full AI Features (with API keys)**:
-- Real-time multimodal reasoning
-- Precise GUI element detection
-- Automated workflow execution
-- Context-aware decision making
+    The outcome is hit, miss, coalesced or bypass.
 
-**Current Status**: Ready to assist with desktop automation tasks!
-
-Try asking: "Open browser and navigate to GitHub" or "Create a new file in the editor"
-"""
-    else:
-        # In real implementation, this would call Gemini API with tool calling
-        return f"Processing your request with full AI capabilities. Session: {context}"
+    ``context`` is per-session and goes to the model but not into the key,
+    so the same prompt from any session shares one entry. A hit can
+    therefore carry the context of the session that produced it; sessions
+    whose answers depend on their own context opt out of the cache.
+    """
+    full_mode = bool(gemini_api_key and e2b_api_key)
+    key = response_key(messages, model_backend.name, full_mode)
+    return response_cache.open(
+        key, lambda: generate_ai_response(messages, context, gemini_api_key, e2b_api_key),
+        session_id, bypass
+    )
 
 async def process_ai_message(messages: List[Dict[str, str]], gemini_api_key: str, e2b_api_key: str) -> Dict[str, Any]:
     """Process single AI message (non-streaming)"""
@@ -341,7 +698,7 @@ async def process_ai_message(messages: List[Dict[str, str]], gemini_api_key: str
 # New: Direct Execution API
 @app.post("/api/execute")
 async def execute_command(request: ExecutionRequest):
-    """Direct execution endpoint for manual commands"""
+    """Submit a command for execution; returns the execution_id without waiting for it to finish"""
     try:
         e2b_api_key = os.getenv("E2B_API_KEY")
         
@@ -355,82 +712,217 @@ async def execute_command(request: ExecutionRequest):
             )
         
         # Determine which sandbox to use
-        sandbox_id = request.sandbox_id
-        if sandbox_id and sandbox_id not in sandbox_sessions:
-            raise HTTPException(status_code=404, detail="Sandbox not found")
+        sandbox_id = await resolve_sandbox(request.sandbox_id, request.session_id)
         
-        # Simulate command execution
-        execution_id = str(uuid.uuid4())
+        job = execution_engine.submit(
+            request.command,
+            sandbox_id=sandbox_id,
+            timeout=request.timeout,
+            environment=request.environment
+        )
         
-        # In real implementation, this would:
-        # 1. Connect to E2B Desktop session
-        # 2. Execute command in sandbox environment
-        # 3. Capture output and return results
+        if request.wait:
+            await job.wait()
+            return {
+                "status": "success",
+                "result": job.snapshot()
+            }
+
+        return JSONResponse(
+            status_code=202,
+            content={
+                "status": "accepted",
+                "execution_id": job.id,
+                "result": job.snapshot(),
+                "endpoints": {
+                    "result": f"/api/execute/{job.id}",
+                    "stream": f"/api/execute/{job.id}/stream"
+                }
+            }
+        )
         
-        execution_result = {
-            "execution_id": execution_id,
-            "command": request.command,
-            "status": "completed",
-            "stdout": f"Demo: Executed '{request.command}' in sandbox",
-            "stderr": "",
-            "exit_code": 0,
-            "execution_time": 0.1,
-            "timestamp": datetime.now().isoformat(),
-            "sandbox_id": sandbox_id or "default"
+    except EngineSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SchedulerSaturated as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing command: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/execute/batch")
+async def execute_batch(request: BatchExecutionRequest):
+    """Run many commands in one round trip, sequentially or in parallel"""
+    if not os.getenv("E2B_API_KEY"):
+        return JSONResponse(
+            status_code=400,
+            content={
+                "error": "E2B API key not configured",
+                "message": "Command execution requires E2B API key"
+            }
+        )
+
+    if request.mode not in ("parallel", "sequential"):
+        raise HTTPException(status_code=400, detail="Invalid mode. Use: parallel or sequential")
+    if not request.commands:
+        raise HTTPException(status_code=400, detail="No commands given")
+    if len(request.commands) > EXECUTION_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {EXECUTION_MAX_BATCH} commands")
+
+    # Resolve each distinct sandbox or session once for the whole batch
+    targets: Dict[tuple, str] = {}
+    try:
+        keys = {(c.sandbox_id, None if c.sandbox_id else c.session_id) for c in request.commands}
+        for key in keys:
+            targets[key] = await resolve_sandbox(*key)
+    except SchedulerSaturated as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))}
+        )
+
+    commands = [
+        {
+            "command": c.command,
+            "sandbox_id": targets[(c.sandbox_id, None if c.sandbox_id else c.session_id)],
+            "timeout": c.timeout,
+            "environment": c.environment
         }
-        
-        # Simulate execution delay
-        await asyncio.sleep(0.1)
-        
+        for c in request.commands
+    ]
+    parallel = request.mode == "parallel"
+
+    try:
+        batch = execution_engine.run_batch(commands, parallel=parallel, fail_fast=request.fail_fast)
+
+        if request.stream:
+            async def event_stream():
+                async for index, result in batch:
+                    yield sse_frame({"type": "result", "index": index, "result": result})
+                yield sse_frame({"type": "completion", "count": len(commands)})
+
+            return StreamingResponse(
+                timed_sse("execute_batch", event_stream()),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "Connection": "keep-alive",
+                }
+            )
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(commands)
+        async for index, result in batch:
+            results[index] = result
+
         return {
             "status": "success",
-            "result": execution_result
+            "mode": request.mode,
+            "results": results,
+            "succeeded": sum(
+                1 for r in results if r and r["status"] == "completed" and r["exit_code"] == 0
+            ),
+            "count": len(results)
         }
-        
-    except Exception as e:
-        logger.error(f"Error executing command: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    except EngineSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/api/execute/{execution_id}")
+async def get_execution(execution_id: str):
+    """Get the status and output of a submitted command"""
+    job = execution_engine.get(execution_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Execution not found")
+
+    return {
+        "status": "success",
+        "result": job.snapshot()
+    }
+
+
+@app.get("/api/execute/{execution_id}/stream")
+async def stream_execution(execution_id: str):
+    """Stream stdout/stderr of a submitted command as server-sent events"""
+    job = execution_engine.get(execution_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Execution not found")
+
+    async def event_stream():
+        async for event in job.stream():
+            yield sse_frame(event)
+
+    return StreamingResponse(
+        timed_sse("execute", event_stream()),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
+
+@app.delete("/api/execute/{execution_id}")
+async def cancel_execution(execution_id: str):
+    """Cancel a queued or running command"""
+    if not execution_engine.get(execution_id):
+        raise HTTPException(status_code=404, detail="Execution not found")
+
+    return {
+        "status": "cancelled" if execution_engine.cancel(execution_id) else "finished",
+        "execution_id": execution_id
+    }
 
 # Existing chat endpoint (enhanced)
 @app.post("/api/chat")
-async def chat_endpoint(message: ChatMessage):
+async def chat_endpoint(message: ChatMessage, cache_control: Optional[str] = Header(None)):
     """Enhanced chat endpoint with AI integration"""
     try:
         session_id = message.session_id or str(uuid.uuid4())
+        if message.cache is not None:
+            response_cache.set_opt_out(session_id, not message.cache)
         
         # Store message in session
-        if session_id not in chat_sessions:
-            chat_sessions[session_id] = []
+        history = await chat_sessions.get(session_id) or ChatHistory(CHAT_CONTEXT_WINDOW)
         
-        chat_sessions[session_id].append({
-            "role": "user",
-            "content": message.content,
-            "timestamp": datetime.now().isoformat()
-        })
+        spilled = history.append("user", message.content, datetime.now().isoformat())
+        if spilled:
+            await chat_archive.append(session_id, spilled)
+            context_builder.observe(session_id, message_dict(spilled))
         
-        # Generate response using AI agent
-        messages = chat_sessions[session_id][-10:]  # Last 10 messages for context
+        # Recent messages within the token budget, plus a summary of the archived ones
+        if context_builder.needs_bootstrap(session_id, history.message_count, CHAT_CONTEXT_WINDOW):
+            archived = await chat_archive.read(session_id, CONTEXT_ARCHIVE_READ)
+            context_builder.bootstrap(session_id, archived)
+        messages, context_report = context_builder.build(session_id, history.context())
         
         # Process with AI
-        response_content = await generate_ai_response(
-            messages, 
-            f"Session: {session_id}", 
+        cache_outcome, chunks = cached_ai_response(
+            messages,
+            f"Session: {session_id}",
             os.getenv("GOOGLE_GENERATIVE_AI_API_KEY"),
-            os.getenv("E2B_API_KEY")
+            os.getenv("E2B_API_KEY"),
+            session_id,
+            bypass="no-cache" in (cache_control or "").lower()
         )
+        response_content = "".join([chunk async for chunk in chunks])
         
         # Store assistant response
-        chat_sessions[session_id].append({
-            "role": "assistant",
-            "content": response_content,
-            "timestamp": datetime.now().isoformat()
-        })
+        spilled = history.append("assistant", response_content, datetime.now().isoformat())
+        if spilled:
+            await chat_archive.append(session_id, spilled)
+            context_builder.observe(session_id, message_dict(spilled))
+        await chat_sessions.set(session_id, history)
         
         response = {
             "content": response_content,
             "role": "assistant",
             "session_id": session_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "context": context_report,
+            "cache": cache_outcome
         }
         
         # Broadcast to WebSocket connections
@@ -448,103 +940,124 @@ async def chat_endpoint(message: ChatMessage):
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Enhanced WebSocket endpoint for real-time communication"""
-    await websocket.accept()
-    active_connections.append(websocket)
+    client = await active_connections.connect(websocket)
     
     try:
         # Send welcome message
-        await websocket.send_text(json.dumps({
+        active_connections.send(client, {
             "type": "connection_established",
             "message": "Connected to ADX Agent WebSocket",
-            "timestamp": datetime.now().isoformat()
-        }))
+            "timestamp": datetime.now()
+        })
         
         while True:
             # Receive message from client
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = loads(data)
             
             # Process different message types
             message_type = message_data.get("type", "chat")
             
             if message_type == "ping":
-                await websocket.send_text(json.dumps({
+                active_connections.send(client, {
                     "type": "pong",
-                    "timestamp": datetime.now().isoformat()
-                }))
+                    "timestamp": datetime.now()
+                })
             else:
                 # Process chat message
                 response = {
                     "type": "chat_response",
                     "data": message_data,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": datetime.now()
                 }
                 await broadcast_message(response)
             
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
         logger.info("WebSocket client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+    finally:
+        await active_connections.disconnect(client)
 
 async def broadcast_message(message: dict):
-    """Broadcast message to all connected WebSocket clients"""
-    if active_connections:
-        disconnected = []
-        for connection in active_connections:
-            try:
-                await connection.send_text(json.dumps(message))
-            except:
-                disconnected.append(connection)
-        
-        # Remove disconnected clients
-        for conn in disconnected:
-            if conn in active_connections:
-                active_connections.remove(conn)
+    """Broadcast message to WebSocket clients on every worker without waiting on any socket"""
+    await broadcaster.publish(dumps_str(message))
+
+
+@app.get("/api/screenshot/{session_id}")
+async def get_screenshot(session_id: str, keyframe: bool = False):
+    """Changed regions since this session's last screenshot; keyframe=true sends the whole screen"""
+    frame = await (await screenshots.aget()).capture(session_id, force_keyframe=keyframe)
+    if frame is None:
+        return {"status": "unchanged", "session_id": session_id, "frame": None}
+    return {"status": "success", "session_id": session_id, "frame": frame.to_dict()}
+
+
+@app.get("/api/screenshot/{session_id}/elements")
+async def get_screen_elements(session_id: str):
+    """Text and widget bounding boxes on the current screen"""
+    # A diff reference of its own, so screenshots sent to viewers don't hide changes from
+    # the detector
+    frame, regions = await (await screenshots.aget()).capture_changes(f"{session_id}:elements")
+    result = await (await element_detector.aget()).detect(session_id, frame, regions)
+    return {"status": "success", "session_id": session_id, **result}
 
 @app.get("/api/sessions")
 async def list_sessions():
     """List active chat sessions"""
+    sessions = await chat_sessions.items()
     return {
         "status": "success",
         "sessions": [
             {
                 "session_id": session_id,
-                "message_count": len(messages),
-                "created_at": messages[0]["timestamp"] if messages else None,
-                "last_activity": messages[-1]["timestamp"] if messages else None
+                **history.summary()
             }
-            for session_id, messages in chat_sessions.items()
+            for session_id, history in sessions
         ],
-        "count": len(chat_sessions)
+        "count": len(sessions)
     }
 
 @app.get("/api/sandboxes")
 async def list_sandboxes():
     """List active sandbox sessions"""
+    sandboxes = await sandbox_sessions.values()
     return {
         "status": "success",
-        "sandboxes": list(sandbox_sessions.values()),
-        "count": len(sandbox_sessions)
+        "sandboxes": sandboxes,
+        "count": len(sandboxes)
     }
 
 @app.delete("/api/sessions/{session_id}")
 async def delete_session(session_id: str):
     """Delete a chat session"""
-    if session_id in chat_sessions:
-        del chat_sessions[session_id]
+    if await chat_sessions.delete(session_id):
+        await chat_archive.delete(session_id)
+        sse_streams.drop_session(session_id)
+        context_builder.drop_session(session_id)
+        response_cache.set_opt_out(session_id, False)
+        # Features that were never loaded hold no per-session state
+        if screenshots.loaded:
+            screenshots.get().drop_session(session_id)
+            screenshots.get().drop_session(f"{session_id}:elements")
+        if element_detector.loaded:
+            element_detector.get().drop_session(session_id)
         return {"status": "deleted", "session_id": session_id}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ADX Agent Backend")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 1)),
+                        help="Number of uvicorn worker processes (default: WEB_CONCURRENCY or 1)")
+    args = parser.parse_args()
+
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
+        workers=args.workers,
         reload=False,
         log_level="info"
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,160 @@
+"""
+Prometheus metrics and in-process latency percentiles
+Served on /metrics; /health reads uptime and p50/p95/p99 from the same data
+"""
+
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+STARTED_AT = time.time()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "adx_http_request_duration_seconds",
+    "HTTP request latency by route (full response, including streamed bodies)",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "adx_http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["method"],
+)
+SSE_TIME_TO_FIRST_EVENT = Histogram(
+    "adx_sse_time_to_first_event_seconds",
+    "Time from request start to the first server-sent event",
+    ["stream"],
+    buckets=LATENCY_BUCKETS,
+)
+SSE_EVENTS = Counter(
+    "adx_sse_events_total",
+    "Server-sent events emitted",
+    ["stream"],
+)
+WS_BROADCAST_FANOUT = Histogram(
+    "adx_ws_broadcast_fanout_seconds",
+    "Time to fan one broadcast frame out to this worker's client queues",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1),
+)
+SANDBOX_CREATE_DURATION = Histogram(
+    "adx_sandbox_create_seconds",
+    "Sandbox create latency by warm pool outcome",
+    ["pool"],
+    buckets=LATENCY_BUCKETS,
+)
+SESSION_STORE_ENTRIES = Gauge(
+    "adx_session_store_entries",
+    "Entries held in each session store",
+    ["store"],
+)
+WS_CONNECTIONS = Gauge(
+    "adx_ws_connections",
+    "Connected WebSocket clients on this worker",
+)
+SANDBOX_RECLAIMED = Gauge(
+    "adx_sandbox_reclaimed",
+    "CPU cores and GB of memory returned by hibernating or destroying idle sandboxes",
+    ["resource"],
+)
+
+ADMISSION_REJECTED = Counter(
+    "adx_admission_rejected_total",
+    "Requests turned away with 429 by endpoint class and reason",
+    ["endpoint", "reason"],
+)
+
+
+class LatencyReservoir:
+    """Most recent samples per route, for percentiles without a Prometheus server"""
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, route: str, seconds: float) -> None:
+        samples = self._samples.get(route)
+        if samples is None:
+            samples = self._samples[route] = deque(maxlen=self.size)
+        samples.append(seconds)
+
+    def percentiles(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for route, samples in self._samples.items():
+            ordered = sorted(samples)
+            report[route] = {
+                "count": len(ordered),
+                "p50_ms": round(_quantile(ordered, 0.50) * 1000, 3),
+                "p95_ms": round(_quantile(ordered, 0.95) * 1000, 3),
+                "p99_ms": round(_quantile(ordered, 0.99) * 1000, 3),
+            }
+        return report
+
+
+def _quantile(ordered, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+latency_reservoir = LatencyReservoir()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests
+
+    Pure ASGI rather than BaseHTTPMiddleware so streamed responses pass
+    through untouched; latency covers the whole body.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            # FastAPI stores the matched route in the scope; its template bounds label cardinality
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(method, route_path, str(status["code"])).observe(elapsed)
+            latency_reservoir.observe(f"{method} {route_path}", elapsed)
+
+
+async def timed_sse(
+    stream: str, events: AsyncIterator[bytes], started: Optional[float] = None
+) -> AsyncIterator[bytes]:
+    """Pass SSE frames through, recording time to first event and event counts"""
+    start = started if started is not None else time.perf_counter()
+    first = True
+    counter = SSE_EVENTS.labels(stream)
+    async for frame in events:
+        if first:
+            SSE_TIME_TO_FIRST_EVENT.labels(stream).observe(time.perf_counter() - start)
+            first = False
+        counter.inc()
+        yield frame
+
+
+def uptime_seconds() -> float:
+    return round(time.time() - STARTED_AT, 3)
@@ -0,0 +1,248 @@
+"""
+Model backends for AI response generation
+Every backend streams the response as an async iterator of text chunks
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, List
+
+_TOKEN_RE = re.compile(r"\s*\S+")
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into word-sized chunks, keeping the leading whitespace"""
+    return _TOKEN_RE.findall(text)
+
+
+class ModelBackend:
+    """Base class for streaming model backends"""
+
+    name = "base"
+
+    def stream(
+        self, messages: List[Dict[str, str]], context: str, full_mode: bool
+    ) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class DemoModelBackend(ModelBackend):
+    """Canned demo response (stand-in until the Gemini API is wired in)"""
+
+    name = "demo"
+
+    def __init__(self, token_delay: float = 0.0):
+        self.token_delay = token_delay
+
+    async def stream(
+        self, messages: List[Dict[str, str]], context: str, full_mode: bool
+    ) -> AsyncIterator[str]:
+        if full_mode:
+            # In real implementation, this would call Gemini API with tool calling
+            text = f"Processing your request with full AI capabilities. Session: {context}"
+        else:
+            text = demo_response(messages, context)
+
+        for token in split_tokens(text):
+            yield token
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+
+
+class FakeModelBackend(ModelBackend):
+    """Synthetic model with fixed time to first token and inter-token latency, for benchmarks"""
+
+    name = "fake"
+
+    def __init__(self, ttfb: float = 0.2, token_delay: float = 0.02, tokens: int = 200):
+        self.ttfb = ttfb
+        self.token_delay = token_delay
+        self.tokens = tokens
+
+    async def stream(
+        self, messages: List[Dict[str, str]], context: str, full_mode: bool
+    ) -> AsyncIterator[str]:
+        await asyncio.sleep(self.ttfb)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield f"tok{i} "
+
+
+def demo_response(messages: List[Dict[str, str]], context: str) -> str:
+    return f"""🤖 **Demo Mode - AI Agent Response**
+
+**Context**: {context}
+
+**Your last message**: "{messages[-1]['content'] if messages else 'None'}"
+
+**Available Capabilities**:
+- 🖥️ Desktop automation via E2B Desktop SDK
+- 🌐 Browser automation with Playwright
+- 📁 File system operations
+- 🖼️ Screenshot capture and analysis
+- 🔧 System monitoring and control
+
+**Demo Actions**:
+To demonstrate capabilities, I would:
+1. Capture current desktop screenshot
+2. Analyze UI elements for interaction
+3. Execute requested actions
+4. Provide real-time feedback
+
+**Full AI Features (with API keys)**:
+- Real-time multimodal reasoning
+- Precise GUI element detection
+- Automated workflow execution
+- Context-aware decision making
+
+**Current Status**: Ready to assist with desktop automation tasks!
+
+Try asking: "Open browser and navigate to GitHub" or "Create a new file in the editor"
+"""
+
+
+def get_model_backend() -> ModelBackend:
+    """Select the model backend from AI_MODEL_BACKEND (demo or fake)"""
+    backend = os.getenv("AI_MODEL_BACKEND", "demo").lower()
+
+    if backend == "fake":
+        return FakeModelBackend(
+            ttfb=float(os.getenv("FAKE_MODEL_TTFB_MS", "200")) / 1000,
+            token_delay=float(os.getenv("FAKE_MODEL_TOKEN_MS", "20")) / 1000,
+            tokens=int(os.getenv("FAKE_MODEL_TOKENS", "200")),
+        )
+    if backend != "demo":
+        raise ValueError(f"Unknown AI_MODEL_BACKEND: {backend}")
+
+    return DemoModelBackend(token_delay=float(os.getenv("DEMO_MODEL_TOKEN_MS", "0")) / 1000)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+    if not ordered:
+        return {"count": 0}
+    return {"count": len(ordered), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+async def benchmark(
+    ttfb: float = 0.2,
+    token_delay: float = 0.02,
+    tokens: int = 100,
+    requests: int = 40,
+    concurrency: int = 8,
+    port: int = 0,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    """TTFB and inter-token latency of /api/ai-agent streams over a FakeModelBackend
+
+    Starts the backend in a separate process with AI_MODEL_BACKEND=fake,
+    sends ``requests`` distinct prompts ``concurrency`` at a time and times
+    the ai_response_delta events as the client receives them. With the
+    model's own latencies known, what is left over is the server's
+    streaming overhead.
+    """
+    import json
+    import socket
+    import subprocess
+
+    import httpx
+
+    if not port:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+    env = {
+        **os.environ,
+        "AI_MODEL_BACKEND": "fake",
+        "FAKE_MODEL_TTFB_MS": str(ttfb * 1000),
+        "FAKE_MODEL_TOKEN_MS": str(token_delay * 1000),
+        "FAKE_MODEL_TOKENS": str(tokens),
+        "SANDBOX_POOL_SIZE": "0",
+        "RATE_LIMIT_IP_BURST_SIZE": str(max(60, requests)),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    first_token: List[float] = []
+    between_tokens: List[float] = []
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            deadline = time.perf_counter() + timeout
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("Server exited before answering /health")
+                    if time.perf_counter() > deadline:
+                        raise TimeoutError(f"No /health response within {timeout}s")
+                    await asyncio.sleep(0.05)
+
+            limit = asyncio.Semaphore(concurrency)
+
+            async def one(i: int) -> None:
+                body = {"messages": [{"role": "user", "content": f"benchmark prompt {i}"}],
+                        "session_id": f"bench-{i}"}
+                async with limit:
+                    start = time.perf_counter()
+                    last = None
+                    async with client.stream("POST", "/api/ai-agent", json=body,
+                                             headers={"Cache-Control": "no-cache"}) as response:
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data: "):
+                                continue
+                            kind = json.loads(line[6:]).get("type")
+                            if kind == "ai_response_delta":
+                                now = time.perf_counter()
+                                if last is None:
+                                    first_token.append(now - start)
+                                else:
+                                    between_tokens.append(now - last)
+                                last = now
+                            elif kind in ("ai_response_end", "error"):
+                                break
+
+            await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "model_ttfb_ms": ttfb * 1000,
+        "model_token_ms": token_delay * 1000,
+        "requests": requests,
+        "concurrency": concurrency,
+        "ttfb": _percentiles(first_token),
+        "itl": _percentiles(between_tokens),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark /api/ai-agent TTFB and inter-token latency"
+    )
+    parser.add_argument("--ttfb-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    result = asyncio.run(benchmark(args.ttfb_ms / 1000, args.token_ms / 1000, args.tokens,
+                                   args.requests, args.concurrency))
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,283 @@
+"""
+Cross-process broadcast fan-out
+Every worker publishes WebSocket frames to a shared channel and delivers what
+it receives to its own connected clients
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FrameHandler = Callable[[str], Any]
+
+
+class Broadcaster:
+    """Publishes pre-serialized frames to every subscribed worker"""
+
+    backend = "base"
+
+    def __init__(self, channel: str = "adx:broadcast"):
+        self.channel = channel
+        self.published = 0
+        self.received = 0
+        self._handler: Optional[FrameHandler] = None
+
+    async def start(self, handler: FrameHandler) -> None:
+        """Subscribe; handler is called with each frame received on the channel"""
+        self._handler = handler
+
+    async def stop(self) -> None:
+        self._handler = None
+
+    async def publish(self, frame: str) -> None:
+        raise NotImplementedError
+
+    def _deliver(self, frame: str) -> None:
+        self.received += 1
+        if self._handler:
+            try:
+                self._handler(frame)
+            except Exception as e:
+                logger.error(f"Broadcast delivery failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "channel": self.channel,
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+class LocalBroadcaster(Broadcaster):
+    """In-process stand-in: instances sharing a channel act like separate workers"""
+
+    backend = "local"
+
+    _channels: Dict[str, List["LocalBroadcaster"]] = {}
+
+    async def start(self, handler: FrameHandler) -> None:
+        await super().start(handler)
+        self._channels.setdefault(self.channel, []).append(self)
+
+    async def stop(self) -> None:
+        subscribers = self._channels.get(self.channel, [])
+        if self in subscribers:
+            subscribers.remove(self)
+        await super().stop()
+
+    async def publish(self, frame: str) -> None:
+        self.published += 1
+        for subscriber in list(self._channels.get(self.channel, ())):
+            subscriber._deliver(frame)
+
+
+class RedisBroadcaster(Broadcaster):
+    """Redis pub/sub channel shared by every worker and node"""
+
+    backend = "redis"
+
+    def __init__(self, client: Any, channel: str = "adx:broadcast"):
+        super().__init__(channel)
+        self.client = client
+        self._pubsub: Any = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: FrameHandler) -> None:
+        await super().start(handler)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await super().stop()
+
+    async def publish(self, frame: str) -> None:
+        self.published += 1
+        await self.client.publish(self.channel, frame)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = message["data"]
+                    self._deliver(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast subscriber error, resubscribing: {e}")
+                await asyncio.sleep(1)
+                try:
+                    await self._pubsub.subscribe(self.channel)
+                except Exception:
+                    pass
+
+
+def create_broadcaster() -> Broadcaster:
+    """Build a broadcaster from BROADCAST_BACKEND (local or redis)"""
+    backend = os.getenv("BROADCAST_BACKEND", "local").lower()
+    channel = os.getenv("BROADCAST_CHANNEL", "adx:broadcast")
+
+    if backend == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisBroadcaster(client, channel)
+    if backend != "local":
+        raise ValueError(f"Unknown BROADCAST_BACKEND: {backend}")
+
+    return LocalBroadcaster(channel)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+    if not ordered:
+        return {"count": 0}
+    return {"count": len(ordered), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+async def _bench_worker_main(
+    redis_url: str, channel: str, index: int, workers: int, clients: int, messages: int,
+    barrier: Any, timeout: float,
+) -> Dict[str, Any]:
+    import redis.asyncio as redis
+    from serialization import loads
+    from ws_broadcast import ConnectionManager
+
+    latencies: List[float] = []
+    delivered = [0]
+
+    class TimingSocket:
+        """Stands in for a WebSocket: counts frames and how long each took to arrive"""
+
+        async def accept(self) -> None:
+            pass
+
+        async def send_text(self, frame: str) -> None:
+            latencies.append(time.time() - loads(frame)["t"])
+            delivered[0] += 1
+
+    client = redis.from_url(redis_url)
+    broadcaster = RedisBroadcaster(client, channel)
+    manager = ConnectionManager(queue_size=messages + 1)
+    sockets: List[Any] = [TimingSocket() for _ in range(clients)]
+    for socket in sockets:
+        await manager.connect(socket)
+    await broadcaster.start(manager.broadcast_frame)
+
+    # Every worker is subscribed before anyone publishes
+    await asyncio.to_thread(barrier.wait)
+    start = time.perf_counter()
+    for n in range(index, messages, workers):
+        await broadcaster.publish(f'{{"t":{time.time()},"n":{n},"type":"broadcast"}}')
+    deadline = start + timeout
+    while delivered[0] < messages * clients and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    await broadcaster.stop()
+    for connection in list(manager.clients):
+        await manager.disconnect(connection)
+    await client.aclose()
+    return {"delivered": delivered[0], "elapsed": elapsed, "latencies": latencies}
+
+
+def _bench_worker(*args: Any) -> None:
+    results = args[-1]
+    try:
+        results.put(asyncio.run(_bench_worker_main(*args[:-1])))
+    except Exception as e:
+        results.put({"error": repr(e)})
+
+
+def benchmark(
+    workers: int = 4,
+    clients_per_worker: int = 100,
+    messages: int = 2000,
+    redis_url: Optional[str] = None,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    """Fan-out across ``workers`` real processes sharing a Redis channel
+
+    Each process runs a RedisBroadcaster feeding a ConnectionManager with
+    ``clients_per_worker`` clients and publishes its share of ``messages``.
+    Reports frames delivered per second across all processes and the
+    publish-to-client latency of every delivered frame.
+    """
+    import multiprocessing
+
+    redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    channel = f"adx:bench:{os.getpid()}:{workers}"
+    processes = [
+        context.Process(
+            target=_bench_worker,
+            args=(redis_url, channel, index, workers, clients_per_worker, messages,
+                  barrier, timeout, results),
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        reports = [results.get(timeout=timeout + 30) for _ in processes]
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+
+    errors = [report["error"] for report in reports if "error" in report]
+    if errors:
+        raise RuntimeError(f"Benchmark worker failed: {errors[0]}")
+    delivered = sum(report["delivered"] for report in reports)
+    elapsed = max(report["elapsed"] for report in reports)
+    return {
+        "workers": workers,
+        "clients": workers * clients_per_worker,
+        "messages": messages,
+        "delivered": delivered,
+        "expected": messages * workers * clients_per_worker,
+        "delivered_per_s": round(delivered / elapsed),
+        "messages_per_s": round(messages / elapsed),
+        "fanout_latency": _percentiles([t for r in reports for t in r["latencies"]]),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark Redis broadcast fan-out as the worker process count grows"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients-per-worker", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    for count in args.workers:
+        print(json.dumps(benchmark(count, args.clients_per_worker, args.messages, args.redis_url)))
@@ -0,0 +1,216 @@
+"""
+Model response cache with request coalescing
+Identical prompts are answered from memory, replaying the cached chunks at
+full speed, and identical requests in flight at the same time share one
+upstream model call whose chunks are fanned out as they arrive
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def response_key(messages: List[Dict[str, str]], model: str, full_mode: bool) -> str:
+    """Digest of the conversation (roles and whitespace-normalized content) and model
+
+    Per-session context sent alongside is left out so sessions share entries.
+    """
+    normalized = [
+        [message.get("role", "user"), " ".join(message.get("content", "").split())]
+        for message in messages
+    ]
+    payload = json.dumps([model, full_mode, normalized], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class InFlight:
+    """Chunks of a response still being generated, readable by any number of callers"""
+
+    __slots__ = ("chunks", "done", "error", "_changed")
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def push(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def read(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class ResponseCache:
+    """LRU of complete responses with a TTL, single-flight generation and per-session opt-out
+
+    The upstream call runs in a task of its own, so a caller that
+    disconnects does not cut off others sharing the call, and the result
+    is still cached. Only responses that finished without error and are
+    at most ``max_chars`` long are stored.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1000, max_chars: int = 200000,
+                 max_opt_outs: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.max_opt_outs = max_opt_outs
+        # key -> (expires_at, chunks)
+        self._entries: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self._in_flight: Dict[str, InFlight] = {}
+        self._tasks: set = set()
+        self._opted_out: "OrderedDict[str, None]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def set_opt_out(self, session_id: str, opted_out: bool) -> None:
+        """Keep a session's responses out of the cache (and never serve it cached ones)"""
+        if opted_out:
+            self._opted_out[session_id] = None
+            self._opted_out.move_to_end(session_id)
+            while len(self._opted_out) > self.max_opt_outs:
+                self._opted_out.popitem(last=False)
+        else:
+            self._opted_out.pop(session_id, None)
+
+    def opted_out(self, session_id: Optional[str]) -> bool:
+        return session_id is not None and session_id in self._opted_out
+
+    def open(
+        self,
+        key: str,
+        generate: Callable[[], AsyncIterator[str]],
+        session_id: Optional[str] = None,
+        bypass: bool = False,
+    ) -> Tuple[str, AsyncIterator[str]]:
+        """Chunks for the request and how they are served: hit, miss, coalesced or bypass"""
+        if bypass or not self.enabled or self.opted_out(session_id):
+            self.bypassed += 1
+            return "bypass", generate()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return "hit", _replay(entry[1])
+            del self._entries[key]
+            self.expirations += 1
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return "coalesced", pending.read()
+
+        self.misses += 1
+        pending = self._in_flight[key] = InFlight()
+        task = asyncio.get_running_loop().create_task(self._generate(key, pending, generate))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return "miss", pending.read()
+
+    async def _generate(
+        self, key: str, pending: InFlight, generate: Callable[[], AsyncIterator[str]]
+    ) -> None:
+        size = 0
+        try:
+            async for chunk in generate():
+                pending.push(chunk)
+                size += len(chunk)
+        except asyncio.CancelledError:
+            pending.finish(RuntimeError("Upstream model call was cancelled"))
+            raise
+        except Exception as e:
+            logger.error(f"Upstream model call failed: {e}")
+            pending.finish(e)
+        else:
+            pending.finish()
+            if size <= self.max_chars:
+                self._store(key, pending.chunks)
+        finally:
+            if self._in_flight.get(key) is pending:
+                del self._in_flight[key]
+
+    def _store(self, key: str, chunks: List[str]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, chunks)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> int:
+        removed = len(self._entries)
+        self._entries.clear()
+        return removed
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._in_flight),
+            "opted_out_sessions": len(self._opted_out),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            # Coalesced requests were served without their own model call
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+
+async def _replay(chunks: List[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+def create_response_cache() -> ResponseCache:
+    return ResponseCache(
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+        max_chars=int(os.getenv("RESPONSE_CACHE_MAX_CHARS", "200000")),
+    )
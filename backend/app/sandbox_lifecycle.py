@@ -0,0 +1,306 @@
+"""
+Sandbox lifecycle manager
+Tracks when each sandbox was last used and, in the background, hibernates
+idle sandboxes, destroys long-idle or expired ones, and returns their CPU
+and memory to the scheduler
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sandbox_scheduler import SandboxScheduler
+from session_store import MemorySessionStore, SessionStore, create_session_store
+
+logger = logging.getLogger(__name__)
+
+# (sandbox record, action) where action is hibernate, resume or destroy
+ControlFn = Callable[[Dict[str, Any], str], Awaitable[None]]
+
+IDLE_ACTIONS = ("hibernate", "destroy")
+
+
+async def control_sandbox(sandbox: Dict[str, Any], action: str) -> None:
+    """Pause, resume or kill a sandbox (simulated until the E2B Desktop SDK is wired in)"""
+    await asyncio.sleep(0)
+
+
+def created_timestamp(sandbox: Dict[str, Any]) -> float:
+    try:
+        return datetime.fromisoformat(sandbox["created_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class SandboxLifecycleManager:
+    """Idle and absolute TTLs for sandboxes, enforced by a batched reaper loop
+
+    A sandbox idle for ``idle_ttl`` seconds is hibernated: its capacity goes
+    back to the scheduler but its session pin is kept, and the next
+    ``wake`` places it again. A sandbox hibernated for ``hibernated_ttl``,
+    or older than ``max_lifetime``, is destroyed. Sandboxes with jobs still
+    running are never touched.
+
+    Activity goes to its own ``activity`` store (sandbox id -> last use, at
+    most one write per ``touch_interval``) rather than into the sandbox's
+    record, so the reaper sees it whichever process served the request and
+    a touch is a single write that can never clobber a concurrent
+    hibernate or wake of the record.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        scheduler: SandboxScheduler,
+        idle_ttl: float = 900.0,
+        hibernated_ttl: float = 3600.0,
+        max_lifetime: float = 14400.0,
+        idle_action: str = "hibernate",
+        interval: float = 30.0,
+        batch_size: int = 20,
+        touch_interval: Optional[float] = None,
+        control: ControlFn = control_sandbox,
+        busy: Optional[Callable[[str], bool]] = None,
+        activity: Optional[SessionStore] = None,
+    ):
+        if idle_action not in IDLE_ACTIONS:
+            raise ValueError(f"Unknown idle action: {idle_action}. Use: {', '.join(IDLE_ACTIONS)}")
+        self.store = store
+        self.scheduler = scheduler
+        # Outlives any sandbox, so an entry that expires belonged to one already destroyed
+        self.activity = activity or MemorySessionStore("sandbox_activity", ttl=max_lifetime)
+        self.idle_ttl = idle_ttl
+        self.hibernated_ttl = hibernated_ttl
+        self.max_lifetime = max_lifetime
+        self.idle_action = idle_action
+        self.interval = interval
+        self.batch_size = batch_size
+        # Coarse enough to spare the store a write per request, fine enough next to idle_ttl
+        self.touch_interval = min(60.0, idle_ttl / 10) if touch_interval is None else touch_interval
+        self._control = control
+        self._busy = busy or (lambda sandbox_id: False)
+        # sandbox id -> when this process last recorded activity; only throttles writes
+        self._touched: Dict[str, float] = {}
+        self._waking: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.sweeps = 0
+        self.hibernated = 0
+        self.destroyed = 0
+        self.expired = 0
+        self.woken = 0
+        self.failures = 0
+        self.reclaimed_cpu = 0.0
+        self.reclaimed_memory = 0.0
+        self.last_sweep_ms = 0.0
+
+    async def touch(self, sandbox_id: str) -> None:
+        """Record activity in the shared activity store; the sandbox's record is not read"""
+        now = time.time()
+        if now - self._touched.get(sandbox_id, 0.0) < self.touch_interval:
+            return
+        self._touched[sandbox_id] = now
+        await self.activity.set(sandbox_id, now)
+
+    def forget(self, sandbox_id: str) -> None:
+        self._touched.pop(sandbox_id, None)
+
+    @staticmethod
+    def with_activity(sandbox: Dict[str, Any], last_active: Optional[float]) -> Dict[str, Any]:
+        """The record with the newer of its own and the recorded last activity"""
+        if last_active is None or last_active <= sandbox.get("last_active", 0.0):
+            return sandbox
+        return {**sandbox, "last_active": last_active}
+
+    def idle_for(self, sandbox: Dict[str, Any], now: Optional[float] = None) -> float:
+        last = sandbox.get("last_active")
+        if last is None:
+            # Never used: count from creation
+            last = created_timestamp(sandbox)
+        return (now or time.time()) - last
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Sandbox reaper started (idle_ttl={self.idle_ttl}s, "
+                f"max_lifetime={self.max_lifetime}s)"
+            )
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Sandbox reaper sweep failed: {e}")
+
+    def due(self, sandbox: Dict[str, Any], now: float) -> Optional[Tuple[str, str]]:
+        """(action, reason) the sandbox is due for, if any"""
+        if sandbox.get("status") == "destroyed" or self._busy(sandbox["id"]):
+            return None
+        if now - created_timestamp(sandbox) > self.max_lifetime:
+            return "destroy", "max_lifetime"
+        idle = self.idle_for(sandbox, now)
+        if sandbox.get("status") == "hibernated":
+            if idle > self.idle_ttl + self.hibernated_ttl:
+                return "destroy", "hibernated_ttl"
+            return None
+        if idle > self.idle_ttl:
+            return self.idle_action, "idle_ttl"
+        return None
+
+    async def sweep(self) -> Dict[str, int]:
+        """One reaper pass, ``batch_size`` sandboxes at a time, yielding between batches"""
+        start = time.perf_counter()
+        now = time.time()
+        due: List[Tuple[Dict[str, Any], str, str]] = []
+        activity = dict(await self.activity.items())
+        for sandbox_id, sandbox in await self.store.items():
+            sandbox = self.with_activity(sandbox, activity.get(sandbox_id))
+            decision = self.due(sandbox, now)
+            if decision:
+                due.append((sandbox, *decision))
+
+        actions = {"hibernate": 0, "destroy": 0}
+        for i in range(0, len(due), self.batch_size):
+            batch = due[i:i + self.batch_size]
+            results = await asyncio.gather(
+                *(self._apply(sandbox, action, reason) for sandbox, action, reason in batch),
+                return_exceptions=True,
+            )
+            for (sandbox, action, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self.failures += 1
+                    logger.error(f"Failed to {action} sandbox {sandbox['id']}: {result}")
+                elif result:
+                    actions[action] += 1
+            # Let request handlers run between batches
+            await asyncio.sleep(0)
+
+        self.sweeps += 1
+        self.last_sweep_ms = round((time.perf_counter() - start) * 1000, 3)
+        return actions
+
+    async def _apply(self, sandbox: Dict[str, Any], action: str, reason: str) -> bool:
+        sandbox_id = sandbox["id"]
+        if sandbox_id in self._waking:
+            return False
+        # Used, woken or removed since the scan started: leave it alone
+        current = await self.store.get(sandbox_id)
+        if current is not None:
+            current = self.with_activity(current, await self.activity.get(sandbox_id))
+        if current is None or self.due(current, time.time()) != (action, reason):
+            return False
+        sandbox = current
+        config = sandbox.get("config") or {}
+        running = sandbox.get("status") != "hibernated"
+
+        await self._control(sandbox, action)
+        if action == "hibernate":
+            await self.scheduler.release(sandbox_id, unpin=False)
+            await self.store.set(sandbox_id, {**sandbox, "status": "hibernated", "host": None,
+                                              "hibernated_at": datetime.now().isoformat()})
+            self.hibernated += 1
+        else:
+            await self.scheduler.release(sandbox_id)
+            await self.store.delete(sandbox_id)
+            await self.activity.delete(sandbox_id)
+            self.forget(sandbox_id)
+            self.destroyed += 1
+            if reason == "max_lifetime":
+                self.expired += 1
+        if running:
+            # A hibernated sandbox's capacity was already counted when it went to sleep
+            self.reclaimed_cpu += float(config.get("cpu", 0))
+            self.reclaimed_memory += float(config.get("memory", 0))
+        logger.info(f"Sandbox {sandbox_id}: {action} ({reason})")
+        return True
+
+    async def wake(self, sandbox: Dict[str, Any]) -> Dict[str, Any]:
+        """Place a hibernated sandbox again and resume it; concurrent callers share one wake"""
+        sandbox_id = sandbox["id"]
+        if sandbox.get("status") != "hibernated":
+            await self.touch(sandbox_id)
+            return sandbox
+        pending = self._waking.get(sandbox_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waking[sandbox_id] = future
+        try:
+            config = sandbox.get("config") or {}
+            reservation = await self.scheduler.reserve(
+                float(config.get("cpu", 0)), float(config.get("memory", 0))
+            )
+            try:
+                await self._control(sandbox, "resume")
+            except BaseException:
+                await self.scheduler.release(reservation)
+                raise
+            host = await self.scheduler.bind(reservation, sandbox_id)
+            now = time.time()
+            sandbox = {**sandbox, "status": "running", "host": host, "last_active": now}
+            sandbox.pop("hibernated_at", None)
+            await self.store.set(sandbox_id, sandbox)
+            await self.activity.set(sandbox_id, now)
+            self._touched[sandbox_id] = now
+            self.woken += 1
+            future.set_result(sandbox)
+            return sandbox
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._waking[sandbox_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "idle_ttl": self.idle_ttl,
+            "hibernated_ttl": self.hibernated_ttl,
+            "max_lifetime": self.max_lifetime,
+            "idle_action": self.idle_action,
+            "touch_interval": self.touch_interval,
+            "sweeps": self.sweeps,
+            "last_sweep_ms": self.last_sweep_ms,
+            "hibernated": self.hibernated,
+            "destroyed": self.destroyed,
+            "expired": self.expired,
+            "woken": self.woken,
+            "failures": self.failures,
+            "reclaimed_cpu": self.reclaimed_cpu,
+            "reclaimed_memory_gb": self.reclaimed_memory,
+        }
+
+
+def create_lifecycle_manager(
+    store: SessionStore, scheduler: SandboxScheduler, busy: Optional[Callable[[str], bool]] = None
+) -> SandboxLifecycleManager:
+    max_lifetime = float(os.getenv("SANDBOX_MAX_LIFETIME", "14400"))
+    return SandboxLifecycleManager(
+        store,
+        scheduler,
+        idle_ttl=float(os.getenv("SANDBOX_IDLE_TTL", "900")),
+        hibernated_ttl=float(os.getenv("SANDBOX_HIBERNATED_TTL", "3600")),
+        max_lifetime=max_lifetime,
+        idle_action=os.getenv("SANDBOX_IDLE_ACTION", "hibernate"),
+        interval=float(os.getenv("SANDBOX_REAP_INTERVAL", "30")),
+        batch_size=int(os.getenv("SANDBOX_REAP_BATCH_SIZE", "20")),
+        busy=busy,
+        activity=create_session_store("sandbox_activity", ttl=max_lifetime),
+    )
@@ -0,0 +1,330 @@
+"""
+Pre-warmed sandbox pool
+Boots sandboxes in the background so /api/sandbox create can hand one out instantly
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from sandbox_scheduler import SandboxScheduler
+
+logger = logging.getLogger(__name__)
+
+BootFn = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+TeardownFn = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def shape_key(config: Dict[str, Any]) -> str:
+    """Stable key for a sandbox config shape"""
+    return json.dumps(config, sort_keys=True, separators=(",", ":"))
+
+
+async def boot_sandbox(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Boot a single sandbox (simulated until the E2B Desktop SDK is wired in)"""
+    sandbox_id = str(uuid.uuid4())
+
+    sandbox_session = {
+        "id": sandbox_id,
+        "status": "creating",
+        "config": config,
+        "created_at": datetime.now().isoformat(),
+        "vnc_url": f"vnc://localhost:5900/{sandbox_id}",
+        "web_interface": f"http://localhost:6080/vnc.html?id={sandbox_id}",
+        "endpoints": {
+            "execute": f"/api/execute?sandbox_id={sandbox_id}",
+            "status": f"/api/sandbox/status/{sandbox_id}"
+        }
+    }
+
+    # Simulate sandbox startup delay
+    await asyncio.sleep(float(os.getenv("SANDBOX_BOOT_DELAY", "2")))
+    sandbox_session["status"] = "running"
+
+    return sandbox_session
+
+
+async def kill_sandbox(sandbox: Dict[str, Any]) -> None:
+    """Tear down a warm sandbox nobody will use (simulated until the E2B Desktop SDK is wired in)"""
+    await asyncio.sleep(0)
+
+
+class SandboxPool:
+    """Keeps N booted sandboxes ready per config shape
+
+    Shapes registered at startup are always kept warm. Shapes first seen
+    in a create request are kept warm too, but at most ``max_shapes`` of
+    them, least recently requested dropped first. Sandboxes that leave the
+    pool without being handed out are torn down.
+
+    With a ``scheduler``, warm sandboxes hold real capacity: each is
+    reserved before it boots (skipped when nothing is free or requests
+    are queued) and released when torn down, so a pool hit needs no new
+    reservation and ``shed`` can give capacity back to a pool miss. While
+    requests in any worker are queued for capacity, each maintenance pass
+    sheds this pool's warm sandboxes.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_idle: float = 600.0,
+        refill_interval: float = 5.0,
+        max_shapes: int = 4,
+        boot: BootFn = boot_sandbox,
+        teardown: TeardownFn = kill_sandbox,
+        scheduler: Optional[SandboxScheduler] = None,
+    ):
+        self.size = size
+        self.max_idle = max_idle
+        self.refill_interval = refill_interval
+        self.max_shapes = max_shapes
+        self._boot = boot
+        self._teardown = teardown
+        self.scheduler = scheduler
+
+        # shape key -> deque of (booted_at, sandbox_session)
+        self._warm: Dict[str, Deque[Tuple[float, Dict[str, Any]]]] = {}
+        self._configs: Dict[str, Dict[str, Any]] = {}
+        self._last_requested: Dict[str, float] = {}
+        self._pinned: set = set()
+        self._booting: Dict[str, int] = {}
+
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._boot_tasks: set = set()
+        self._teardown_tasks: set = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.boots = 0
+        self.boot_failures = 0
+        self.teardowns = 0
+        self.capacity_skips = 0
+        self.shed_count = 0
+
+    def register_shape(self, config: Dict[str, Any], pinned: bool = True) -> str:
+        """Start keeping warm sandboxes for a config shape"""
+        key = shape_key(config)
+        self._configs[key] = config
+        self._warm.setdefault(key, deque())
+        self._last_requested.setdefault(key, time.monotonic())
+        if pinned:
+            self._pinned.add(key)
+        else:
+            self._limit_shapes(keep=key)
+        self._wakeup.set()
+        return key
+
+    def _limit_shapes(self, keep: str) -> None:
+        """Drop the least recently requested auto-registered shapes beyond ``max_shapes``"""
+        unpinned = sorted(
+            (key for key in self._configs if key not in self._pinned and key != keep),
+            key=lambda key: self._last_requested.get(key, 0),
+        )
+        for key in unpinned[:max(len(unpinned) + 1 - self.max_shapes, 0)]:
+            self._drop_shape(key)
+
+    def _drop_shape(self, key: str) -> None:
+        for _, sandbox in self._warm.pop(key, ()):
+            self.evictions += 1
+            self._discard(sandbox)
+        self._configs.pop(key, None)
+        self._last_requested.pop(key, None)
+
+    def _discard(self, sandbox: Dict[str, Any]) -> None:
+        """Tear a sandbox down in the background"""
+        task = asyncio.get_running_loop().create_task(self._teardown_one(sandbox))
+        self._teardown_tasks.add(task)
+        task.add_done_callback(self._teardown_tasks.discard)
+
+    async def _teardown_one(self, sandbox: Dict[str, Any]) -> None:
+        try:
+            if self.scheduler is not None:
+                await self.scheduler.release(sandbox["id"])
+            await self._teardown(sandbox)
+            self.teardowns += 1
+        except Exception as e:
+            logger.error(f"Failed to tear down warm sandbox {sandbox.get('id')}: {e}")
+
+    async def start(self) -> None:
+        """Start the background refill and eviction loop"""
+        if self.size <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Sandbox pool started (size={self.size}, max_idle={self.max_idle}s)")
+
+    async def stop(self) -> None:
+        """Stop background work and tear down warm sandboxes"""
+        if self._task:
+            # wait_for can swallow a cancel that lands as the wakeup fires, so the
+            # loop also checks this flag rather than relying on the cancel alone
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._stopping = False
+        for task in list(self._boot_tasks):
+            task.cancel()
+        for warm in self._warm.values():
+            for _, sandbox in warm:
+                self._discard(sandbox)
+        self._warm.clear()
+        if self._teardown_tasks:
+            await asyncio.gather(*self._teardown_tasks, return_exceptions=True)
+
+    async def acquire(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Hand out a warm sandbox, booting one inline on a pool miss"""
+        sandbox = self.take(config)
+        if sandbox is None:
+            sandbox = await self.boot(config)
+        return sandbox
+
+    def take(self, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Hand out a warm sandbox of this shape, or None on a pool miss"""
+        key = shape_key(config)
+        now = time.monotonic()
+        self._last_requested[key] = now
+
+        if key not in self._configs and self.size > 0 and self.max_shapes > 0:
+            # Unseen shape: keep a warm pool for it until it goes idle or busier shapes push it out
+            self.register_shape(config, pinned=False)
+
+        warm = self._warm.get(key)
+        while warm:
+            booted_at, sandbox = warm.popleft()
+            if now - booted_at > self.max_idle:
+                self.evictions += 1
+                self._discard(sandbox)
+                continue
+            self.hits += 1
+            self._wakeup.set()
+            sandbox["assigned_at"] = datetime.now().isoformat()
+            return sandbox
+
+        self.misses += 1
+        self._wakeup.set()
+        return None
+
+    async def boot(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Boot a sandbox inline for a pool miss; the caller owns its capacity"""
+        sandbox = await self._boot(config)
+        self.boots += 1
+        sandbox["assigned_at"] = datetime.now().isoformat()
+        return sandbox
+
+    async def shed(self) -> bool:
+        """Tear down the longest-idle warm sandbox so its capacity goes to a pool miss"""
+        oldest = min(
+            ((warm[0][0], key) for key, warm in self._warm.items() if warm), default=None
+        )
+        if oldest is None:
+            return False
+        _, sandbox = self._warm[oldest[1]].popleft()
+        self.shed_count += 1
+        await self._teardown_one(sandbox)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool hit/miss counters for /health"""
+        total = self.hits + self.misses
+        return {
+            "enabled": self.size > 0,
+            "target_size": self.size,
+            "warm": sum(len(q) for q in self._warm.values()),
+            "booting": sum(self._booting.values()),
+            "shapes": len(self._configs),
+            "max_shapes": self.max_shapes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "evictions": self.evictions,
+            "boots": self.boots,
+            "boot_failures": self.boot_failures,
+            "teardowns": self.teardowns,
+            "capacity_skips": self.capacity_skips,
+            "shed": self.shed_count,
+        }
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                self._evict_idle()
+                if self.scheduler is not None and await self.scheduler.contended():
+                    while await self.shed():
+                        pass
+                self._refill()
+            except Exception as e:
+                logger.error(f"Sandbox pool maintenance failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+
+        for key, warm in self._warm.items():
+            while warm and now - warm[0][0] > self.max_idle:
+                self._discard(warm.popleft()[1])
+                self.evictions += 1
+
+        # Forget shapes nobody has asked for within max_idle
+        stale: List[str] = [
+            key for key in self._configs
+            if key not in self._pinned and now - self._last_requested.get(key, 0) > self.max_idle
+        ]
+        for key in stale:
+            self._drop_shape(key)
+
+    def _refill(self) -> None:
+        for key, config in self._configs.items():
+            missing = self.size - len(self._warm.get(key, ())) - self._booting.get(key, 0)
+            for _ in range(max(missing, 0)):
+                self._booting[key] = self._booting.get(key, 0) + 1
+                task = asyncio.create_task(self._boot_into(key, config))
+                self._boot_tasks.add(task)
+                task.add_done_callback(self._boot_tasks.discard)
+
+    async def _boot_into(self, key: str, config: Dict[str, Any]) -> None:
+        reservation = None
+        try:
+            if self.scheduler is not None:
+                reservation = await self.scheduler.try_reserve(
+                    float(config.get("cpu", 0)), float(config.get("memory", 0))
+                )
+                if reservation is None:
+                    # Capacity goes to real requests first; the next refill tries again
+                    self.capacity_skips += 1
+                    return
+            sandbox = await self._boot(config)
+            self.boots += 1
+            if reservation is not None and self.scheduler is not None:
+                await self.scheduler.bind(reservation, sandbox["id"])
+                reservation = None
+            if key in self._configs:
+                self._warm.setdefault(key, deque()).append((time.monotonic(), sandbox))
+            else:
+                # The shape was dropped while this sandbox booted
+                self._discard(sandbox)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.boot_failures += 1
+            logger.error(f"Failed to pre-warm sandbox: {e}")
+        finally:
+            if reservation is not None and self.scheduler is not None:
+                await self.scheduler.release(reservation)
+            self._booting[key] = max(self._booting.get(key, 1) - 1, 0)
@@ -0,0 +1,672 @@
+"""
+Sandbox placement scheduler
+Tracks CPU and memory budgets per host, bin-packs new sandboxes onto the
+host they fit most tightly, pins chat sessions to their sandbox, and
+queues or rejects requests once every host is full; with Redis, every
+worker places against the same budgets
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from serialization import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("best_fit", "worst_fit", "first_fit")
+
+
+class SandboxNeverFits(Exception):
+    """The request is larger than any host's total budget, so waiting cannot help"""
+
+
+class SchedulerSaturated(Exception):
+    """No host has room and the wait queue is full or the wait timed out"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Host:
+    """A node's sandbox budget (CPU cores, memory in GB) and what is placed on it
+
+    Usage is the placement store's: authoritative for the memory store,
+    a snapshot re-read before every decision for the Redis store.
+    """
+
+    __slots__ = ("name", "cpu", "memory", "cpu_used", "memory_used", "sandboxes")
+
+    def __init__(self, name: str, cpu: float, memory: float):
+        self.name = name
+        self.cpu = cpu
+        self.memory = memory
+        self.cpu_used = 0.0
+        self.memory_used = 0.0
+        self.sandboxes = 0
+
+    def fits(self, cpu: float, memory: float) -> bool:
+        return self.cpu_used + cpu <= self.cpu and self.memory_used + memory <= self.memory
+
+    def slack(self, cpu: float, memory: float) -> float:
+        """Largest fraction of either resource left over after placing the request"""
+        return max(
+            (self.cpu - self.cpu_used - cpu) / self.cpu,
+            (self.memory - self.memory_used - memory) / self.memory,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cpu": self.cpu,
+            "memory": self.memory,
+            "cpu_used": self.cpu_used,
+            "memory_used": self.memory_used,
+            "sandboxes": self.sandboxes,
+            "cpu_utilization": round(self.cpu_used / self.cpu, 4),
+            "memory_utilization": round(self.memory_used / self.memory, 4),
+        }
+
+
+# Picks a host for (cpu, memory) from the hosts' current usage, or None
+ChooseFn = Callable[[float, float], Optional[Host]]
+
+
+class PlacementStore:
+    """Host usage, placements (sandbox or reservation -> host) and session pins
+
+    Every worker that places sandboxes on the same hosts must share one
+    store; claims and releases are atomic against each other.
+    """
+
+    backend = "base"
+
+    async def claim(self, hosts: Dict[str, Host], placement_id: str, cpu: float, memory: float,
+                    choose: ChooseFn) -> Optional[str]:
+        """Charge the host ``choose`` picks and record the placement; returns the host name"""
+        raise NotImplementedError
+
+    async def rename(self, old_id: str, new_id: str) -> str:
+        """Move a placement to a new id (reservation -> sandbox); returns the host name"""
+        raise NotImplementedError
+
+    async def release(self, hosts: Dict[str, Host], placement_id: str) -> bool:
+        """Give a placement's capacity back to its host"""
+        raise NotImplementedError
+
+    async def host_of(self, placement_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def pin(self, session_id: str, sandbox_id: str) -> None:
+        raise NotImplementedError
+
+    async def unpin(self, sandbox_id: str) -> None:
+        """Drop the pin of the session this sandbox serves, unless it moved on to another"""
+        raise NotImplementedError
+
+    async def sandbox_for(self, session_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def refresh(self, hosts: Dict[str, Host]) -> Dict[str, int]:
+        """Load current usage into ``hosts``; returns placement and pinned session counts"""
+        raise NotImplementedError
+
+    async def add_waiter(self, waiter_id: str, until: float) -> None:
+        """Record a request queued for capacity, until the wall-clock time it gives up"""
+        raise NotImplementedError
+
+    async def remove_waiter(self, waiter_id: str) -> None:
+        raise NotImplementedError
+
+    async def waiting(self) -> int:
+        """Requests queued for capacity in any worker"""
+        raise NotImplementedError
+
+
+class MemoryPlacementStore(PlacementStore):
+    """Placement state in this process only, for a single worker"""
+
+    backend = "memory"
+
+    def __init__(self) -> None:
+        # placement id -> (host name, cpu, memory)
+        self._placements: Dict[str, Tuple[str, float, float]] = {}
+        self._sessions: Dict[str, str] = {}
+        self._session_of: Dict[str, str] = {}
+        self._waiters: Dict[str, float] = {}
+
+    async def claim(self, hosts: Dict[str, Host], placement_id: str, cpu: float, memory: float,
+                    choose: ChooseFn) -> Optional[str]:
+        host = choose(cpu, memory)
+        if host is None:
+            return None
+        host.cpu_used += cpu
+        host.memory_used += memory
+        host.sandboxes += 1
+        self._placements[placement_id] = (host.name, cpu, memory)
+        return host.name
+
+    async def rename(self, old_id: str, new_id: str) -> str:
+        placement = self._placements.pop(old_id)
+        self._placements[new_id] = placement
+        return placement[0]
+
+    async def release(self, hosts: Dict[str, Host], placement_id: str) -> bool:
+        placement = self._placements.pop(placement_id, None)
+        if placement is None:
+            return False
+        host_name, cpu, memory = placement
+        host = hosts[host_name]
+        host.cpu_used = max(host.cpu_used - cpu, 0.0)
+        host.memory_used = max(host.memory_used - memory, 0.0)
+        host.sandboxes = max(host.sandboxes - 1, 0)
+        return True
+
+    async def host_of(self, placement_id: str) -> Optional[str]:
+        placement = self._placements.get(placement_id)
+        return placement[0] if placement else None
+
+    async def pin(self, session_id: str, sandbox_id: str) -> None:
+        self._sessions[session_id] = sandbox_id
+        self._session_of[sandbox_id] = session_id
+
+    async def unpin(self, sandbox_id: str) -> None:
+        session_id = self._session_of.pop(sandbox_id, None)
+        if session_id is not None and self._sessions.get(session_id) == sandbox_id:
+            del self._sessions[session_id]
+
+    async def sandbox_for(self, session_id: str) -> Optional[str]:
+        return self._sessions.get(session_id)
+
+    async def refresh(self, hosts: Dict[str, Host]) -> Dict[str, int]:
+        return {"sandboxes": len(self._placements), "pinned_sessions": len(self._sessions)}
+
+    async def add_waiter(self, waiter_id: str, until: float) -> None:
+        self._waiters[waiter_id] = until
+
+    async def remove_waiter(self, waiter_id: str) -> None:
+        self._waiters.pop(waiter_id, None)
+
+    async def waiting(self) -> int:
+        return len(self._waiters)
+
+
+class RedisPlacementStore(PlacementStore):
+    """Placement state in Redis, shared by every worker and node
+
+    Each host's usage is a hash ``adx:placement:host:<name>`` (cpu_used,
+    memory_used, sandboxes); placements and session pins are hashes next
+    to it. A claim WATCHes every host hash, picks a host from what it read
+    and charges it in a MULTI, retrying if another worker changed a host in
+    between, so two workers can never both take the last slot. Queued
+    requests sit in a sorted set scored by when they give up, so a worker
+    that dies mid-wait stops counting once its deadline passes.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client: Any, prefix: str = "adx:placement"):
+        self.client = client
+        self._host_prefix = f"{prefix}:host:"
+        self._placements = f"{prefix}:placements"
+        self._sessions = f"{prefix}:sessions"
+        self._session_of = f"{prefix}:session_of"
+        self._waiters = f"{prefix}:waiters"
+
+    def _host_key(self, name: str) -> str:
+        return self._host_prefix + name
+
+    async def _read_hosts(self, reader: Any, hosts: Dict[str, Host]) -> None:
+        for host in hosts.values():
+            usage = await reader.hgetall(self._host_key(host.name))
+            host.cpu_used = round(float(usage.get(b"cpu_used", 0)), 6)
+            host.memory_used = round(float(usage.get(b"memory_used", 0)), 6)
+            host.sandboxes = int(usage.get(b"sandboxes", 0))
+
+    async def claim(self, hosts: Dict[str, Host], placement_id: str, cpu: float, memory: float,
+                    choose: ChooseFn) -> Optional[str]:
+        from redis.exceptions import WatchError
+
+        while True:
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(*[self._host_key(name) for name in hosts])
+                    await self._read_hosts(pipe, hosts)
+                    host = choose(cpu, memory)
+                    if host is None:
+                        return None
+                    pipe.multi()
+                    key = self._host_key(host.name)
+                    pipe.hincrbyfloat(key, "cpu_used", cpu)
+                    pipe.hincrbyfloat(key, "memory_used", memory)
+                    pipe.hincrby(key, "sandboxes", 1)
+                    pipe.hset(self._placements, placement_id, dumps_str([host.name, cpu, memory]))
+                    await pipe.execute()
+                    host.cpu_used += cpu
+                    host.memory_used += memory
+                    host.sandboxes += 1
+                    return host.name
+                except WatchError:
+                    continue
+
+    async def rename(self, old_id: str, new_id: str) -> str:
+        from redis.exceptions import WatchError
+
+        while True:
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(self._placements)
+                    raw = await pipe.hget(self._placements, old_id)
+                    if raw is None:
+                        raise KeyError(old_id)
+                    pipe.multi()
+                    pipe.hdel(self._placements, old_id)
+                    pipe.hset(self._placements, new_id, raw)
+                    await pipe.execute()
+                    return loads(raw)[0]
+                except WatchError:
+                    continue
+
+    async def release(self, hosts: Dict[str, Host], placement_id: str) -> bool:
+        from redis.exceptions import WatchError
+
+        while True:
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    # Only the worker whose MULTI removes the placement gives its capacity back
+                    await pipe.watch(self._placements)
+                    raw = await pipe.hget(self._placements, placement_id)
+                    if raw is None:
+                        return False
+                    host_name, cpu, memory = loads(raw)
+                    pipe.multi()
+                    pipe.hdel(self._placements, placement_id)
+                    key = self._host_key(host_name)
+                    pipe.hincrbyfloat(key, "cpu_used", -cpu)
+                    pipe.hincrbyfloat(key, "memory_used", -memory)
+                    pipe.hincrby(key, "sandboxes", -1)
+                    await pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    async def host_of(self, placement_id: str) -> Optional[str]:
+        raw = await self.client.hget(self._placements, placement_id)
+        return loads(raw)[0] if raw is not None else None
+
+    async def pin(self, session_id: str, sandbox_id: str) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self._sessions, session_id, sandbox_id)
+        pipe.hset(self._session_of, sandbox_id, session_id)
+        await pipe.execute()
+
+    async def unpin(self, sandbox_id: str) -> None:
+        from redis.exceptions import WatchError
+
+        while True:
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(self._session_of, self._sessions)
+                    session_id = await pipe.hget(self._session_of, sandbox_id)
+                    pinned = await pipe.hget(self._sessions, session_id) if session_id else None
+                    pipe.multi()
+                    pipe.hdel(self._session_of, sandbox_id)
+                    if pinned is not None and self._decode(pinned) == sandbox_id:
+                        pipe.hdel(self._sessions, session_id)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    async def sandbox_for(self, session_id: str) -> Optional[str]:
+        sandbox_id = await self.client.hget(self._sessions, session_id)
+        return self._decode(sandbox_id) if sandbox_id is not None else None
+
+    async def refresh(self, hosts: Dict[str, Host]) -> Dict[str, int]:
+        await self._read_hosts(self.client, hosts)
+        return {
+            "sandboxes": await self.client.hlen(self._placements),
+            "pinned_sessions": await self.client.hlen(self._sessions),
+        }
+
+    async def add_waiter(self, waiter_id: str, until: float) -> None:
+        await self.client.zadd(self._waiters, {waiter_id: until})
+
+    async def remove_waiter(self, waiter_id: str) -> None:
+        await self.client.zrem(self._waiters, waiter_id)
+
+    async def waiting(self) -> int:
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zremrangebyscore(self._waiters, "-inf", now)
+        pipe.zcard(self._waiters)
+        return (await pipe.execute())[1]
+
+    @staticmethod
+    def _decode(value: Any) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+
+class SandboxScheduler:
+    """Capacity-aware placement with session affinity
+
+    ``reserve`` claims CPU and memory on a host before a sandbox is
+    booted; ``bind`` attaches the resulting sandbox id and ``release``
+    returns the capacity. When nothing fits, callers wait in a FIFO queue
+    of at most ``queue_size`` for up to ``queue_timeout`` seconds; a
+    release places the first waiters that now fit, so a large request
+    does not hold back small ones behind it. Usage, placements and pins
+    live in the ``store``; with a shared store the queue is per process
+    and waiters also retry every ``poll_interval`` seconds to pick up
+    capacity released by other workers.
+    """
+
+    def __init__(self, hosts: List[Host], policy: str = "best_fit", queue_size: int = 100,
+                 queue_timeout: float = 30.0, store: Optional[PlacementStore] = None,
+                 poll_interval: float = 0.5):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown placement policy: {policy}. Use: {', '.join(POLICIES)}")
+        if not hosts:
+            raise ValueError("At least one host is required")
+        self.hosts = {host.name: host for host in hosts}
+        self.policy = policy
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.store = store or MemoryPlacementStore()
+        self.poll_interval = poll_interval
+        # (cpu, memory, future resolved with the reservation id)
+        self._waiters: Deque[Tuple[float, float, asyncio.Future]] = deque()
+        self._drain_lock = asyncio.Lock()
+
+        self.placements = 0
+        self.queued = 0
+        self.rejections = 0
+        self.timeouts = 0
+        self.granted_after_wait = 0
+        self.wait_ms_total = 0.0
+
+    # Placement
+
+    def place(self, cpu: float, memory: float) -> Optional[Host]:
+        """Host the policy picks for the request, or None when nothing fits"""
+        candidates = [host for host in self.hosts.values() if host.fits(cpu, memory)]
+        if not candidates:
+            return None
+        if self.policy == "first_fit":
+            return candidates[0]
+        if self.policy == "worst_fit":
+            return max(candidates, key=lambda host: host.slack(cpu, memory))
+        return min(candidates, key=lambda host: host.slack(cpu, memory))
+
+    async def _claim(self, cpu: float, memory: float) -> Optional[str]:
+        reservation = f"reservation-{uuid.uuid4().hex}"
+        if await self.store.claim(self.hosts, reservation, cpu, memory, self.place) is None:
+            return None
+        self.placements += 1
+        return reservation
+
+    def _check_fits(self, cpu: float, memory: float) -> None:
+        if not any(host.cpu >= cpu and host.memory >= memory for host in self.hosts.values()):
+            self.rejections += 1
+            raise SandboxNeverFits(f"No host can ever fit {cpu} CPU / {memory}GB")
+
+    async def contended(self) -> bool:
+        """Whether a request in any worker is queued for capacity"""
+        return bool(self._waiters) or await self.store.waiting() > 0
+
+    async def try_reserve(self, cpu: float, memory: float) -> Optional[str]:
+        """Claim capacity only if it is free now and nobody is queued for it"""
+        self._check_fits(cpu, memory)
+        if await self.contended():
+            return None
+        return await self._claim(cpu, memory)
+
+    async def reserve(self, cpu: float, memory: float, timeout: Optional[float] = None) -> str:
+        """Claim capacity for a sandbox; returns a reservation id to ``bind`` or ``release``"""
+        self._check_fits(cpu, memory)
+        if not self._waiters:
+            reservation = await self._claim(cpu, memory)
+            if reservation is not None:
+                return reservation
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejections += 1
+            raise SchedulerSaturated("All hosts are at capacity and the placement queue is full",
+                                     retry_after=self._retry_after())
+        future = asyncio.get_running_loop().create_future()
+        waiter = (cpu, memory, future)
+        self._waiters.append(waiter)
+        self.queued += 1
+        start = time.perf_counter()
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = start + timeout
+        waiter_id = uuid.uuid4().hex
+        try:
+            # Lets warm pools in every worker see the demand and give capacity up
+            await self.store.add_waiter(waiter_id, time.time() + timeout)
+            # Capacity may have been freed by a release that found no waiters yet
+            await self._drain()
+            while not future.done():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise SchedulerSaturated(
+                        "Timed out waiting for sandbox capacity", retry_after=self._retry_after()
+                    )
+                await asyncio.wait({future}, timeout=min(self.poll_interval, remaining))
+                if not future.done():
+                    # Another worker may have released capacity in the shared store
+                    await self._drain()
+        except BaseException:
+            # Granted just as the caller gave up: hand the capacity back
+            if future.done() and not future.cancelled():
+                await self.release(future.result())
+            else:
+                future.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            await self.store.remove_waiter(waiter_id)
+        self.granted_after_wait += 1
+        self.wait_ms_total += (time.perf_counter() - start) * 1000
+        return future.result()
+
+    async def _drain(self) -> None:
+        """Place queued requests that fit now, oldest first"""
+        async with self._drain_lock:
+            for waiter in list(self._waiters):
+                cpu, memory, future = waiter
+                if future.done():
+                    self._waiters.remove(waiter)
+                    continue
+                reservation = await self._claim(cpu, memory)
+                if reservation is None:
+                    continue
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                if future.done():
+                    # The waiter gave up while the claim was in flight
+                    await self.store.release(self.hosts, reservation)
+                else:
+                    future.set_result(reservation)
+
+    def _retry_after(self) -> float:
+        # Rough: one queue timeout per queue's worth of waiters ahead
+        per_waiter = self.queue_timeout / max(self.queue_size, 1)
+        return max(1.0, round(per_waiter * (len(self._waiters) + 1), 1))
+
+    async def bind(self, reservation: str, sandbox_id: str,
+                   session_id: Optional[str] = None) -> str:
+        """Attach a booted sandbox to its reservation; returns the host name"""
+        host_name = await self.store.rename(reservation, sandbox_id)
+        if session_id:
+            await self.pin(session_id, sandbox_id)
+        return host_name
+
+    async def release(self, sandbox_id: str, unpin: bool = True) -> bool:
+        """Free a sandbox's (or reservation's) capacity; a hibernating one keeps its session pin"""
+        if unpin:
+            await self.store.unpin(sandbox_id)
+        if not await self.store.release(self.hosts, sandbox_id):
+            return False
+        await self._drain()
+        return True
+
+    # Session affinity
+
+    async def pin(self, session_id: str, sandbox_id: str) -> None:
+        await self.store.pin(session_id, sandbox_id)
+
+    async def sandbox_for(self, session_id: str) -> Optional[str]:
+        return await self.store.sandbox_for(session_id)
+
+    async def host_of(self, sandbox_id: str) -> Optional[str]:
+        return await self.store.host_of(sandbox_id)
+
+    async def stats(self) -> Dict[str, Any]:
+        counts = await self.store.refresh(self.hosts)
+        hosts = self.hosts.values()
+        cpu = sum(host.cpu for host in hosts)
+        memory = sum(host.memory for host in hosts)
+        return {
+            "store": self.store.backend,
+            "policy": self.policy,
+            "hosts": {name: host.to_dict() for name, host in self.hosts.items()},
+            "cpu_utilization": round(sum(h.cpu_used for h in hosts) / cpu, 4),
+            "memory_utilization": round(sum(h.memory_used for h in hosts) / memory, 4),
+            "sandboxes": counts["sandboxes"],
+            "pinned_sessions": counts["pinned_sessions"],
+            "waiting": len(self._waiters),
+            "placements": self.placements,
+            "queued": self.queued,
+            "rejections": self.rejections,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": (
+                round(self.wait_ms_total / self.granted_after_wait, 3)
+                if self.granted_after_wait else 0.0
+            ),
+        }
+
+
+def parse_hosts(spec: str) -> List[Host]:
+    """"node-a=16:64,node-b=8:32" -> hosts with 16 CPU / 64GB and 8 CPU / 32GB"""
+    hosts = []
+    for part in spec.split(","):
+        if "=" in part:
+            name, capacity = part.split("=", 1)
+            cpu, memory = capacity.split(":", 1)
+            hosts.append(Host(name.strip(), float(cpu), float(memory)))
+    return hosts
+
+
+def default_host() -> Host:
+    """One node sized for MAX_CONCURRENT_SESSIONS sandboxes of the default 2 CPU / 4GB shape"""
+    sessions = int(os.getenv("MAX_CONCURRENT_SESSIONS", "10"))
+    return Host("local", 2.0 * sessions, 4.0 * sessions)
+
+
+def create_placement_store() -> PlacementStore:
+    """Placement state next to the sandbox records: Redis when SESSION_STORE_BACKEND=redis
+
+    Sandboxes in a shared session store are visible to every worker, so
+    the capacity they hold has to be too.
+    """
+    backend = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+    if backend == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        logger.info("Using Redis placement store")
+        return RedisPlacementStore(client)
+    return MemoryPlacementStore()
+
+
+def create_sandbox_scheduler() -> SandboxScheduler:
+    spec = os.getenv("SANDBOX_HOSTS")
+    hosts = parse_hosts(spec) if spec else [default_host()]
+    # Overcommit ratios let sandboxes that mostly idle share cores and memory
+    cpu_ratio = float(os.getenv("SANDBOX_CPU_OVERCOMMIT", "1.0"))
+    memory_ratio = float(os.getenv("SANDBOX_MEMORY_OVERCOMMIT", "1.0"))
+    for host in hosts:
+        host.cpu *= cpu_ratio
+        host.memory *= memory_ratio
+    return SandboxScheduler(
+        hosts,
+        policy=os.getenv("SANDBOX_PLACEMENT_POLICY", "best_fit"),
+        queue_size=int(os.getenv("SANDBOX_QUEUE_SIZE", "100")),
+        queue_timeout=float(os.getenv("SANDBOX_QUEUE_TIMEOUT", "30")),
+        store=create_placement_store(),
+        poll_interval=float(os.getenv("SANDBOX_QUEUE_POLL_INTERVAL", "0.5")),
+    )
+
+
+def simulate(hosts: int = 20, host_cpu: float = 32, host_memory: float = 128, requests: int = 20000,
+             policy: str = "best_fit", seed: int = 7) -> Dict[str, Any]:
+    """Placement throughput and packing on a churning mix of sandbox shapes
+
+    Sandboxes arrive until placement fails, then one random sandbox leaves
+    per arrival, keeping the cluster at saturation where packing matters.
+    """
+    import random
+
+    def mean(values: List[float]) -> Optional[float]:
+        return round(sum(values) / len(values), 4) if values else None
+
+    rng = random.Random(seed)
+    shapes = [(1, 2), (2, 4), (2, 8), (4, 8), (4, 16), (8, 32)]
+    scheduler = SandboxScheduler(
+        [Host(f"node-{i}", host_cpu, host_memory) for i in range(hosts)], policy=policy
+    )
+    live: List[str] = []
+    samples: List[Tuple[float, float]] = []
+
+    async def run() -> int:
+        failed = 0
+        for i in range(requests):
+            cpu, memory = rng.choice(shapes)
+            reservation = await scheduler.try_reserve(cpu, memory)
+            if reservation is None:
+                failed += 1
+                cpu_used = sum(h.cpu_used for h in scheduler.hosts.values())
+                memory_used = sum(h.memory_used for h in scheduler.hosts.values())
+                samples.append(
+                    (cpu_used / (hosts * host_cpu), memory_used / (hosts * host_memory))
+                )
+                # Churn: a random sandbox finishes
+                victim = live.pop(rng.randrange(len(live)))
+                await scheduler.release(victim)
+                continue
+            sandbox_id = f"sandbox-{i}"
+            await scheduler.bind(reservation, sandbox_id)
+            live.append(sandbox_id)
+        return failed
+
+    start = time.perf_counter()
+    failed = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    return {
+        "policy": policy,
+        "requests": requests,
+        "placements_per_s": round(requests / elapsed),
+        "failed_placements": failed,
+        # Utilization at the moments a request did not fit: how full the cluster packs
+        "cpu_utilization_when_full": mean([c for c, _ in samples]),
+        "memory_utilization_when_full": mean([m for _, m in samples]),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate sandbox placement")
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    results = [simulate(args.hosts, requests=args.requests, policy=policy) for policy in POLICIES]
+    print(json.dumps(results, indent=2))
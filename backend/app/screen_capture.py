@@ -0,0 +1,478 @@
+"""
+Screenshot capture with frame diffing and compressed delta transport
+Frames are captured as NumPy arrays and compared tile by tile with the
+previous frame; unchanged frames are skipped and only the changed regions
+are downscaled, encoded (WebP/JPEG) and sent
+"""
+
+import io
+import os
+import time
+import base64
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# (x, y, width, height) in full-resolution pixels
+Region = Tuple[int, int, int, int]
+
+
+class FrameSource:
+    """Produces RGB frames as (height, width, 3) uint8 arrays"""
+
+    name = "base"
+
+    def capture(self) -> np.ndarray:
+        raise NotImplementedError
+
+
+class X11FrameSource(FrameSource):
+    """Grabs the Xvfb display started by the desktop image"""
+
+    name = "x11"
+
+    def __init__(self, display: str = ":0"):
+        from PIL import ImageGrab
+
+        self.display = display
+        self._grab = ImageGrab.grab
+
+    def capture(self) -> np.ndarray:
+        return np.asarray(self._grab(xdisplay=self.display).convert("RGB"))
+
+
+class SyntheticFrameSource(FrameSource):
+    """Desktop-like frames for demo mode and benchmarks
+
+    A static wallpaper with a taskbar clock, a moving cursor and, every
+    ``typing_every`` frames, a new character in an editor window. Most
+    frames change only a few small regions and some none, like a real
+    session.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, width: int = 1920, height: int = 1080, typing_every: int = 3, seed: int = 0):
+        self.width = width
+        self.height = height
+        self.typing_every = typing_every
+        self.frame_number = 0
+        # Pipelines capture from worker threads, possibly several at once
+        self._lock = threading.Lock()
+        rng = np.random.default_rng(seed)
+
+        gradient = np.linspace(40, 120, width, dtype=np.uint8)
+        self._base = np.empty((height, width, 3), dtype=np.uint8)
+        self._base[:] = gradient[None, :, None]
+        self._base[..., 2] = 160
+        self._base[height - 40:] = (30, 30, 30)
+        # Editor window with light background
+        self._editor = (width // 8, height // 8, width // 2, height // 2)
+        x, y, w, h = self._editor
+        self._base[y:y + h, x:x + w] = (245, 245, 245)
+        self._glyphs = rng.integers(0, 2, size=(200, 12, 8), dtype=np.uint8) * 200
+
+    def capture(self) -> np.ndarray:
+        with self._lock:
+            n = self.frame_number
+            self.frame_number += 1
+        frame = self._base.copy()
+
+        # Typed text: one more glyph per typing step, wrapping by line
+        x, y, w, h = self._editor
+        per_line = (w - 20) // 9
+        typed = n // self.typing_every
+        for i in range(min(typed, per_line * ((h - 20) // 16))):
+            gx = x + 10 + (i % per_line) * 9
+            gy = y + 10 + (i // per_line) * 16
+            frame[gy:gy + 12, gx:gx + 8] = 255 - self._glyphs[i % len(self._glyphs)][..., None]
+
+        # Cursor sweeping across the screen, moving on every other frame
+        cx = (n // 2 * 23) % (self.width - 16)
+        cy = (n // 2 * 11) % (self.height - 64)
+        frame[cy:cy + 16, cx:cx + 12] = (0, 0, 0)
+
+        # Taskbar clock ticking once per second at 10 fps
+        if (n // 10) % 2:
+            h, w = self.height, self.width
+            frame[h - 30:h - 10, w - 90:w - 20] = (200, 200, 200)
+        return frame
+
+
+class RecordedFrameSource(FrameSource):
+    """Replays image files (a recorded session) in name order, looping"""
+
+    name = "recorded"
+
+    def __init__(self, directory: str):
+        paths = sorted(
+            os.path.join(directory, entry)
+            for entry in os.listdir(directory)
+            if entry.lower().endswith((".png", ".jpg", ".jpeg", ".webp", ".bmp"))
+        )
+        if not paths:
+            raise ValueError(f"No frames found in {directory}")
+        self.frames = [np.asarray(Image.open(path).convert("RGB")) for path in paths]
+        self.index = 0
+        self._lock = threading.Lock()
+
+    def capture(self) -> np.ndarray:
+        with self._lock:
+            index = self.index
+            self.index += 1
+        return self.frames[index % len(self.frames)]
+
+
+class FrameDelta:
+    """The encoded change between two frames"""
+
+    __slots__ = ("sequence", "keyframe", "width", "height", "scale", "format", "regions",
+                 "raw_bytes", "encode_ms")
+
+    def __init__(
+        self, sequence: int, keyframe: bool, width: int, height: int, scale: float, format: str
+    ):
+        self.sequence = sequence
+        self.keyframe = keyframe
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.format = format
+        # (region in full-resolution pixels, encoded image bytes)
+        self.regions: List[Tuple[Region, bytes]] = []
+        self.raw_bytes = 0
+        self.encode_ms = 0.0
+
+    @property
+    def encoded_bytes(self) -> int:
+        return sum(len(data) for _, data in self.regions)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe form; clients paint each region at (x, y) scaled to (w, h)"""
+        return {
+            "sequence": self.sequence,
+            "keyframe": self.keyframe,
+            "width": self.width,
+            "height": self.height,
+            "scale": self.scale,
+            "format": self.format,
+            "regions": [
+                {"x": x, "y": y, "w": w, "h": h, "data": base64.b64encode(data).decode("ascii")}
+                for (x, y, w, h), data in self.regions
+            ],
+            "encoded_bytes": self.encoded_bytes,
+        }
+
+
+class DeltaEncoder:
+    """Tile-based frame differ for one viewer
+
+    Frames are split into ``tile_size`` squares; a tile is dirty when any
+    channel moved by more than ``threshold``. Dirty tiles in the same tile
+    row are merged into runs so neighbouring changes are encoded together.
+    A full keyframe is sent first, every ``keyframe_interval`` frames, and
+    whenever more than ``keyframe_ratio`` of the tiles changed.
+    """
+
+    def __init__(
+        self,
+        tile_size: int = 64,
+        threshold: int = 8,
+        scale: float = 0.5,
+        format: str = "webp",
+        quality: int = 70,
+        keyframe_interval: int = 300,
+        keyframe_ratio: float = 0.5,
+    ):
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.scale = scale
+        self.format = format.lower()
+        self.quality = quality
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_ratio = keyframe_ratio
+
+        self.previous: Optional[np.ndarray] = None
+        self.sequence = 0
+        self._since_keyframe = 0
+
+    def reset(self) -> None:
+        """Forget the reference frame so the next frame is a keyframe"""
+        self.previous = None
+
+    def dirty_tiles(self, frame: np.ndarray) -> np.ndarray:
+        """Boolean (tile rows, tile cols) mask of tiles that changed"""
+        height, width = frame.shape[:2]
+        t = self.tile_size
+        previous = self.previous
+        if previous is None:
+            # No reference frame: every tile is new
+            return np.ones((-(-height // t), -(-width // t)), dtype=bool)
+        # |a - b| without widening to int16: max - min stays within uint8
+        diff = np.maximum(frame, previous)
+        diff -= np.minimum(frame, previous)
+        # View channels as extra columns so each tile is a (t, 3t) block, then
+        # OR-reduce row bands and column bands; reduceat handles ragged edges
+        changed = (diff > self.threshold).reshape(height, width * 3).view(np.uint8)
+        bands = np.bitwise_or.reduceat(changed, np.arange(0, width * 3, t * 3), axis=1)
+        return np.bitwise_or.reduceat(bands, np.arange(0, height, t), axis=0).astype(bool)
+
+    def regions_from_mask(self, mask: np.ndarray, width: int, height: int) -> List[Region]:
+        t = self.tile_size
+        regions = []
+        for row in range(mask.shape[0]):
+            cols = np.flatnonzero(mask[row])
+            if not len(cols):
+                continue
+            # Split the dirty columns into contiguous runs
+            breaks = np.flatnonzero(np.diff(cols) > 1)
+            for start, end in zip(np.r_[cols[0], cols[breaks + 1]], np.r_[cols[breaks], cols[-1]]):
+                x, y = int(start) * t, row * t
+                regions.append((x, y, min((int(end) + 1) * t, width) - x, min(t, height - y)))
+        return regions
+
+    def encode_region(self, frame: np.ndarray, region: Region) -> bytes:
+        x, y, w, h = region
+        image = Image.fromarray(frame[y:y + h, x:x + w])
+        if self.scale != 1.0:
+            size = (max(1, round(w * self.scale)), max(1, round(h * self.scale)))
+            image = image.resize(size, Image.Resampling.BILINEAR)
+        buffer = io.BytesIO()
+        if self.format == "webp":
+            image.save(buffer, format="WEBP", quality=self.quality, method=0)
+        else:
+            image.save(buffer, format="JPEG", quality=self.quality)
+        return buffer.getvalue()
+
+    def changed_regions(
+        self, frame: np.ndarray, force_keyframe: bool = False
+    ) -> Tuple[bool, List[Region]]:
+        """(keyframe, regions) that differ from the previous frame; no regions means unchanged"""
+        height, width = frame.shape[:2]
+        keyframe = (
+            force_keyframe
+            or self.previous is None
+            or self.previous.shape != frame.shape
+            or self._since_keyframe >= self.keyframe_interval
+        )
+        if keyframe:
+            return True, [(0, 0, width, height)]
+
+        mask = self.dirty_tiles(frame)
+        dirty = int(mask.sum())
+        if not dirty:
+            return False, []
+        if dirty > mask.size * self.keyframe_ratio:
+            return True, [(0, 0, width, height)]
+        return False, self.regions_from_mask(mask, width, height)
+
+    def advance(self, frame: np.ndarray, keyframe: bool) -> None:
+        """Make ``frame`` the reference for the next diff"""
+        self.sequence += 1
+        self._since_keyframe = 0 if keyframe else self._since_keyframe + 1
+        # Keep our own copy; sources may reuse their buffers
+        self.previous = frame.copy()
+
+    def encode(self, frame: np.ndarray, force_keyframe: bool = False) -> Optional[FrameDelta]:
+        """Delta against the previous frame, or None when nothing changed"""
+        start = time.perf_counter()
+        keyframe, regions = self.changed_regions(frame, force_keyframe)
+        if not regions:
+            return None
+
+        self.advance(frame, keyframe)
+        height, width = frame.shape[:2]
+        delta = FrameDelta(self.sequence, keyframe, width, height, self.scale, self.format)
+        for region in regions:
+            delta.regions.append((region, self.encode_region(frame, region)))
+            delta.raw_bytes += region[2] * region[3] * 3
+        delta.encode_ms = round((time.perf_counter() - start) * 1000, 3)
+        return delta
+
+
+class ScreenshotPipeline:
+    """Captures from one source and keeps a delta encoder per viewer session
+
+    Capture and encoding run in a worker thread so the event loop is never
+    blocked by image work.
+    """
+
+    def __init__(self, source: FrameSource, max_sessions: int = 100, **encoder_options: Any):
+        self.source = source
+        self.max_sessions = max_sessions
+        self.encoder_options = encoder_options
+        self._encoders: "OrderedDict[str, DeltaEncoder]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Counters are updated from worker threads of different sessions
+        self._stats_lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.keyframes = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.full_frame_bytes = 0
+        self.encode_ms_total = 0.0
+
+    def _encoder(self, session_id: str) -> DeltaEncoder:
+        encoder = self._encoders.get(session_id)
+        if encoder is None:
+            encoder = self._encoders[session_id] = DeltaEncoder(**self.encoder_options)
+            self._locks[session_id] = asyncio.Lock()
+            while len(self._encoders) > self.max_sessions:
+                evicted, _ = self._encoders.popitem(last=False)
+                self._locks.pop(evicted, None)
+        self._encoders.move_to_end(session_id)
+        return encoder
+
+    def process(
+        self, encoder: DeltaEncoder, frame: np.ndarray, force_keyframe: bool = False
+    ) -> Optional[FrameDelta]:
+        """Encode one frame and update the counters (runs in a worker thread)"""
+        delta = encoder.encode(frame, force_keyframe)
+        with self._stats_lock:
+            self.frames += 1
+            if delta is None:
+                self.skipped += 1
+                return None
+            self.keyframes += delta.keyframe
+            self.full_frame_bytes += frame.nbytes
+            self.raw_bytes += delta.raw_bytes
+            self.encoded_bytes += delta.encoded_bytes
+            self.encode_ms_total += delta.encode_ms
+        return delta
+
+    async def capture(self, session_id: str, force_keyframe: bool = False) -> Optional[FrameDelta]:
+        """Capture now and return the delta for this session, or None if unchanged"""
+        encoder = self._encoder(session_id)
+        # Frames for one session must be diffed in order
+        async with self._locks[session_id]:
+            frame = await asyncio.to_thread(self.source.capture)
+            return await asyncio.to_thread(self.process, encoder, frame, force_keyframe)
+
+    async def capture_changes(self, session_id: str) -> Tuple[np.ndarray, Optional[List[Region]]]:
+        """Capture now without encoding: the frame and its changed regions
+
+        Regions are None when the whole frame should be treated as new and
+        empty when nothing changed. Used by analysis consumers (element
+        detection) that need pixels rather than encoded tiles.
+        """
+        encoder = self._encoder(session_id)
+        async with self._locks[session_id]:
+            frame = await asyncio.to_thread(self.source.capture)
+            keyframe, regions = await asyncio.to_thread(encoder.changed_regions, frame)
+            if regions:
+                encoder.advance(frame, keyframe)
+            return frame, None if keyframe else regions
+
+    def drop_session(self, session_id: str) -> None:
+        self._encoders.pop(session_id, None)
+        self._locks.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        sent = self.frames - self.skipped
+        return {
+            "source": self.source.name,
+            "sessions": len(self._encoders),
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+            "keyframes": self.keyframes,
+            "encoded_bytes": self.encoded_bytes,
+            # Encoded bytes against the same frames uncompressed; skipped frames
+            # are reported by skip_rate rather than inflating this
+            "compression_ratio": (
+                round(self.full_frame_bytes / self.encoded_bytes, 1) if self.encoded_bytes else 0.0
+            ),
+            "avg_encode_ms": round(self.encode_ms_total / sent, 3) if sent else 0.0,
+        }
+
+
+def create_screenshot_pipeline() -> ScreenshotPipeline:
+    """Build the pipeline from SCREENSHOT_* environment variables"""
+    source_name = os.getenv("SCREENSHOT_SOURCE", "synthetic").lower()
+    if source_name == "x11":
+        display = os.getenv("SCREENSHOT_DISPLAY", os.getenv("DISPLAY", ":0"))
+        source: FrameSource = X11FrameSource(display)
+    elif source_name == "recorded":
+        source = RecordedFrameSource(os.environ["SCREENSHOT_FRAMES_DIR"])
+    elif source_name == "shm":
+        # Frames written by `python frame_ring.py serve`, shared with other consumers
+        from frame_ring import SharedRingFrameSource
+
+        source = SharedRingFrameSource(os.getenv("SCREENSHOT_SHM_NAME", "adx-frames"))
+    else:
+        source = SyntheticFrameSource(
+            int(os.getenv("SCREENSHOT_WIDTH", "1920")),
+            int(os.getenv("SCREENSHOT_HEIGHT", "1080")),
+        )
+    return ScreenshotPipeline(
+        source,
+        max_sessions=int(os.getenv("SCREENSHOT_MAX_SESSIONS", "100")),
+        tile_size=int(os.getenv("SCREENSHOT_TILE_SIZE", "64")),
+        threshold=int(os.getenv("SCREENSHOT_DIFF_THRESHOLD", "8")),
+        scale=float(os.getenv("SCREENSHOT_SCALE", "0.5")),
+        format=os.getenv("SCREENSHOT_FORMAT", "webp"),
+        quality=int(os.getenv("SCREENSHOT_QUALITY", "70")),
+        keyframe_interval=int(os.getenv("SCREENSHOT_KEYFRAME_INTERVAL", "300")),
+    )
+
+
+def benchmark(source: FrameSource, frames: int, **encoder_options: Any) -> Dict[str, Any]:
+    """Run a frame sequence through the encoder and compare with full frames"""
+    pipeline = ScreenshotPipeline(source, **encoder_options)
+    encoder = pipeline._encoder("benchmark")
+    full_encoder = DeltaEncoder(**encoder_options)
+
+    full_bytes = 0
+    full_ms = 0.0
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame = source.capture()
+        pipeline.process(encoder, frame)
+        # Baseline: every frame sent whole at the same scale, format and quality
+        t = time.perf_counter()
+        full_bytes += len(full_encoder.encode_region(frame, (0, 0, frame.shape[1], frame.shape[0])))
+        full_ms += (time.perf_counter() - t) * 1000
+    elapsed = time.perf_counter() - start
+
+    stats = pipeline.stats()
+    return {
+        **stats,
+        "fps_capacity": round(frames / max(elapsed - full_ms / 1000, 1e-9), 1),
+        "full_frame_encoded_bytes": full_bytes,
+        "full_frame_avg_encode_ms": round(full_ms / frames, 3),
+        "bytes_saved_vs_full_frames": (
+            round(1 - stats["encoded_bytes"] / full_bytes, 3) if full_bytes else 0.0
+        ),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark screenshot delta encoding")
+    parser.add_argument(
+        "--frames-dir", help="Directory of recorded frames (default: synthetic session)"
+    )
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--tile-size", type=int, default=64)
+    parser.add_argument("--scale", type=float, default=0.5)
+    parser.add_argument("--format", default="webp", choices=["webp", "jpeg"])
+    parser.add_argument("--quality", type=int, default=70)
+    args = parser.parse_args()
+
+    if args.frames_dir:
+        frame_source: FrameSource = RecordedFrameSource(args.frames_dir)
+    else:
+        frame_source = SyntheticFrameSource()
+    result = benchmark(frame_source, args.frames, tile_size=args.tile_size, scale=args.scale,
+                       format=args.format, quality=args.quality)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,99 @@
+"""
+JSON serialization for responses, SSE and WebSocket frames
+Uses orjson when it is installed and falls back to the stdlib json module
+"""
+
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Type
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse
+
+    DefaultResponse: Type[JSONResponse] = ORJSONResponse
+
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    DefaultResponse = JSONResponse
+
+    def _default(obj: Any) -> Any:
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize to UTF-8 JSON bytes"""
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    loads = json.loads
+
+
+def dumps_str(obj: Any) -> str:
+    """Serialize to a JSON string (WebSocket text frames, Redis values)"""
+    return dumps(obj).decode()
+
+
+def sse_frame(event: Any) -> bytes:
+    """Pre-encoded server-sent event frame"""
+    return b"data: " + dumps(event) + b"\n\n"
+
+
+def backend_name() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def sample_event(seq: int) -> Dict[str, Any]:
+    """A typical ai_response_delta event"""
+    return {
+        "type": "ai_response_delta",
+        "seq": seq,
+        "delta": "Analyzing the desktop ",
+        "timestamp": datetime.now(),
+    }
+
+
+def benchmark(frames: int = 100000) -> Dict[str, Any]:
+    """SSE frames/sec: stdlib json with isoformat per frame (the old path) against sse_frame"""
+
+    def stdlib_frame(event: Dict[str, Any]) -> bytes:
+        event = {**event, "timestamp": event["timestamp"].isoformat()}
+        return f"data: {json.dumps(event)}\n\n".encode()
+
+    def rate(encode: Callable[[Dict[str, Any]], bytes]) -> int:
+        events = [sample_event(i) for i in range(frames)]
+        start = time.perf_counter()
+        for event in events:
+            encode(event)
+        return round(frames / (time.perf_counter() - start))
+
+    before, after = rate(stdlib_frame), rate(sse_frame)
+    return {
+        "backend": backend_name(),
+        "frames": frames,
+        "stdlib_frames_per_s": before,
+        "sse_frame_frames_per_s": after,
+        "speedup": round(after / before, 2),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare SSE frame encoding throughput")
+    parser.add_argument("--frames", type=int, default=100000)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.frames), indent=2))
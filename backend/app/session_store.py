@@ -0,0 +1,296 @@
+"""
+Session storage backends
+Chat and sandbox sessions live behind a SessionStore so memory stays bounded
+and several uvicorn workers can share state through Redis
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from serialization import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Async key/value store for JSON-serializable session state"""
+
+    backend = "base"
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 0,
+        ttl: float = 0,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries  # 0 = unbounded
+        self.ttl = ttl  # seconds since last read or write, 0 = never expires
+        self.on_evict = on_evict
+
+        self.hits = 0
+        self.misses = 0
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def contains(self, key: str) -> bool:
+        return await self.get(key) is not None
+
+    async def items(self) -> List[Tuple[str, Any]]:
+        raise NotImplementedError
+
+    async def values(self) -> List[Any]:
+        return [value for _, value in await self.items()]
+
+    async def size(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "lru_evictions": self.lru_evictions,
+            "ttl_evictions": self.ttl_evictions,
+        }
+
+    def _evicted(self, key: str) -> None:
+        if self.on_evict:
+            self.on_evict(key)
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with LRU and TTL eviction
+
+    Entries are kept in order of last use, so the expired ones are always
+    at the front and purging them never scans live entries.
+    """
+
+    backend = "memory"
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 0,
+        ttl: float = 0,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        super().__init__(namespace, max_entries, ttl, on_evict)
+        # key -> (last_used, value), least recently used first
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        if self._expired(entry[0], now):
+            del self._data[key]
+            self.ttl_evictions += 1
+            self.misses += 1
+            self._evicted(key)
+            return None
+        self._data[key] = (now, entry[1])
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if self.max_entries:
+            while len(self._data) > self.max_entries:
+                evicted, _ = self._data.popitem(last=False)
+                self.lru_evictions += 1
+                self._evicted(evicted)
+
+    async def delete(self, key: str) -> bool:
+        return self._data.pop(key, None) is not None
+
+    async def items(self) -> List[Tuple[str, Any]]:
+        self._purge_expired()
+        return [(key, value) for key, (_, value) in self._data.items()]
+
+    async def size(self) -> int:
+        self._purge_expired()
+        return len(self._data)
+
+    def _expired(self, last_used: float, now: float) -> bool:
+        return bool(self.ttl) and now - last_used > self.ttl
+
+    def _purge_expired(self) -> None:
+        if not self.ttl:
+            return
+        now = time.monotonic()
+        while self._data:
+            key, (last_used, _) = next(iter(self._data.items()))
+            if not self._expired(last_used, now):
+                break
+            del self._data[key]
+            self.ttl_evictions += 1
+            self._evicted(key)
+
+
+class RedisSessionStore(SessionStore):
+    """Redis-backed store shared by every worker
+
+    Values are JSON strings under ``adx:<namespace>:<key>``. A sorted set
+    ``adx:<namespace>:index`` scored by last read or write time drives TTL
+    and LRU eviction so both can be counted; reads also extend the key's
+    expiry, so TTL means idle time as in the memory store. Expired index
+    entries are purged at most every ``purge_interval`` seconds.
+    ``encode``/``decode`` convert values that are not plain JSON (e.g.
+    ChatHistory) on the way in and out.
+    """
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        client: Any,
+        namespace: str,
+        max_entries: int = 0,
+        ttl: float = 0,
+        on_evict: Optional[Callable[[str], None]] = None,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+        purge_interval: float = 5.0,
+    ):
+        super().__init__(namespace, max_entries, ttl, on_evict)
+        self.client = client
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self.encode = encode
+        self.decode = decode
+        self._prefix = f"adx:{namespace}:"
+        self._index = f"adx:{namespace}:index"
+
+    def _key(self, key: str) -> str:
+        return self._prefix + key
+
+    async def get(self, key: str) -> Optional[Any]:
+        pipe = self.client.pipeline()
+        pipe.get(self._key(key))
+        if self.ttl:
+            pipe.pexpire(self._key(key), int(self.ttl * 1000))
+        # xx: only refresh keys already indexed, never re-add a missing one
+        pipe.zadd(self._index, {key: time.time()}, xx=True)
+        raw = (await pipe.execute())[0]
+        if raw is None:
+            self.misses += 1
+            # Only the worker whose zrem succeeds reports the eviction
+            if await self.client.zrem(self._index, key):
+                self.ttl_evictions += 1
+                self._evicted(key)
+            return None
+        self.hits += 1
+        return self.decode(loads(raw))
+
+    async def set(self, key: str, value: Any) -> None:
+        pipe = self.client.pipeline()
+        if self.ttl:
+            pipe.set(self._key(key), dumps_str(self.encode(value)), px=int(self.ttl * 1000))
+        else:
+            pipe.set(self._key(key), dumps_str(self.encode(value)))
+        pipe.zadd(self._index, {key: time.time()})
+        await pipe.execute()
+
+        if self.max_entries:
+            overflow = await self.client.zcard(self._index) - self.max_entries
+            if overflow > 0:
+                evicted = await self.client.zpopmin(self._index, overflow)
+                if evicted:
+                    evicted_keys = [self._decode(k) for k, _ in evicted]
+                    await self.client.delete(*[self._key(k) for k in evicted_keys])
+                    self.lru_evictions += len(evicted)
+                    for k in evicted_keys:
+                        self._evicted(k)
+
+    async def delete(self, key: str) -> bool:
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(key))
+        pipe.zrem(self._index, key)
+        deleted, _ = await pipe.execute()
+        return bool(deleted)
+
+    async def items(self) -> List[Tuple[str, Any]]:
+        await self._purge_expired(force=True)
+        keys = [self._decode(k) for k in await self.client.zrange(self._index, 0, -1)]
+        if not keys:
+            return []
+        raws = await self.client.mget([self._key(k) for k in keys])
+        return [(k, self.decode(loads(raw))) for k, raw in zip(keys, raws) if raw is not None]
+
+    async def size(self) -> int:
+        await self._purge_expired()
+        return await self.client.zcard(self._index)
+
+    async def _purge_expired(self, force: bool = False) -> None:
+        if not self.ttl:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        expired = await self.client.zrangebyscore(self._index, "-inf", time.time() - self.ttl)
+        if not expired:
+            return
+        keys = [self._decode(k) for k in expired]
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.zrem(self._index, key)
+        # Another worker may purge the same keys; only the zrem that succeeds reports them
+        for key, removed in zip(keys, await pipe.execute()):
+            if removed:
+                self.ttl_evictions += 1
+                self._evicted(key)
+
+    @staticmethod
+    def _decode(key: Any) -> str:
+        return key.decode() if isinstance(key, bytes) else key
+
+
+def create_session_store(
+    namespace: str,
+    max_entries: int = 0,
+    ttl: float = 0,
+    on_evict: Optional[Callable[[str], None]] = None,
+    encode: Callable[[Any], Any] = lambda value: value,
+    decode: Callable[[Any], Any] = lambda value: value,
+) -> SessionStore:
+    """Build a store from SESSION_STORE_BACKEND (memory or redis)
+
+    The memory backend keeps values as live objects; ``encode``/``decode``
+    only apply when values have to be serialized.
+    """
+    backend = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+
+    if backend == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        logger.info(f"Using Redis session store for {namespace}")
+        return RedisSessionStore(
+            client, namespace, max_entries=max_entries, ttl=ttl,
+            on_evict=on_evict, encode=encode, decode=decode,
+        )
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_STORE_BACKEND: {backend}")
+
+    return MemorySessionStore(namespace, max_entries=max_entries, ttl=ttl, on_evict=on_evict)
@@ -0,0 +1,363 @@
+"""
+Resumable server-sent event streams
+A stream's events are produced by a task of its own into a bounded replay
+ring, so a client that drops the connection can reconnect with
+Last-Event-ID and continue where it left off instead of regenerating the
+response. Idle connections get heartbeat comments, and readers that fall
+too far behind the producer are detected and cut off
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from serialization import sse_frame
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = b": keepalive\n\n"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID as an integer; anything unparseable means "from the start\""""
+    if value is None:
+        return None
+    try:
+        return int(value.strip())
+    except ValueError:
+        return None
+
+
+class ReplayStream:
+    """One generation run: its producer task, replay ring and subscriber count
+
+    Event ids increase per session across runs, so an id from an earlier run
+    is always below ``first_id`` of the current one.
+    """
+
+    def __init__(self, session_id: str, first_id: int, replay_size: int):
+        self.session_id = session_id
+        self.first_id = first_id
+        self.next_id = first_id
+        # (event id, encoded frame including its id: line)
+        self.ring: Deque[Tuple[int, bytes]] = deque(maxlen=replay_size)
+        self.done = False
+        self.finished_at: Optional[float] = None
+        # Subscriber token -> id of the last event it was sent
+        self.cursors: Dict[object, int] = {}
+        self.producer: Optional[asyncio.Task] = None
+        # Pending orphan cancellation, armed when the last reader leaves
+        self.orphan_timer: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Event()
+        self._drained = asyncio.Event()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self.cursors)
+
+    @property
+    def last_id(self) -> int:
+        return self.next_id - 1
+
+    @property
+    def oldest_id(self) -> int:
+        return self.ring[0][0] if self.ring else self.next_id
+
+    def append(self, frame: bytes) -> None:
+        event_id = self.next_id
+        self.next_id += 1
+        self.ring.append((event_id, b"id: %d\n" % event_id + frame))
+        self._wake()
+
+    def blocked_by_reader(self) -> bool:
+        """The next append would overwrite an event some reader has not been sent"""
+        # Readers already lapped no longer hold the producer back
+        return len(self.ring) == self.ring.maxlen and self.oldest_id - 1 in self.cursors.values()
+
+    def finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def _wake(self) -> None:
+        # Waiters are woken once, then wait on a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        """True when an event arrived or the run ended before ``timeout``"""
+        return await _wait(self._changed, timeout)
+
+    def wake_producer(self) -> None:
+        self._drained.set()
+        self._drained = asyncio.Event()
+
+    async def wait_drained(self, timeout: float) -> bool:
+        """True when a reader took an event or left before ``timeout``"""
+        return await _wait(self._drained, timeout)
+
+
+async def _wait(event: asyncio.Event, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class StreamRegistry:
+    """Replay streams keyed by session, with heartbeats and slow-reader detection
+
+    Streams live in this process: with several workers, resuming needs
+    session-sticky routing. Finished runs stay resumable for ``retain``
+    seconds; a run nobody is reading for ``orphan_timeout`` seconds is
+    cancelled.
+    """
+
+    def __init__(
+        self,
+        replay_size: int = 512,
+        heartbeat_interval: float = 15.0,
+        slow_lag: int = 256,
+        stall_timeout: float = 5.0,
+        retain: float = 120.0,
+        orphan_timeout: float = 60.0,
+        max_streams: int = 1000,
+        retry_ms: int = 2000,
+    ):
+        self.replay_size = replay_size
+        self.heartbeat_interval = heartbeat_interval
+        # A reader this many events behind the producer is flagged as slow
+        self.slow_lag = min(slow_lag, replay_size)
+        # How long the producer waits for a slow reader before overwriting its unsent events
+        self.stall_timeout = stall_timeout
+        self.retain = retain
+        self.orphan_timeout = orphan_timeout
+        self.max_streams = max_streams
+        self.retry_ms = retry_ms
+        self.streams: Dict[str, ReplayStream] = {}
+
+        self.runs_started = 0
+        self.resumes = 0
+        self.events_replayed = 0
+        self.replay_gaps = 0
+        self.heartbeats = 0
+        self.producer_stalls = 0
+        self.slow_consumers = 0
+        self.lapped_consumers = 0
+        self.orphans_cancelled = 0
+
+    def get(self, session_id: str) -> Optional[ReplayStream]:
+        return self.streams.get(session_id)
+
+    def start(self, session_id: str, events: AsyncIterator[bytes]) -> ReplayStream:
+        """Run ``events`` (encoded SSE frames) in the background as the session's current stream"""
+        self._sweep()
+        previous = self.streams.get(session_id)
+        first_id = 1
+        if previous is not None:
+            first_id = previous.next_id
+            if previous.producer and not previous.done:
+                # A new request for the session supersedes the old run
+                previous.producer.cancel()
+        stream = ReplayStream(session_id, first_id, self.replay_size)
+        stream.producer = asyncio.create_task(self._produce(stream, events))
+        self.streams[session_id] = stream
+        self.runs_started += 1
+        return stream
+
+    async def _produce(self, stream: ReplayStream, events: AsyncIterator[bytes]) -> None:
+        try:
+            async for frame in events:
+                if stream.blocked_by_reader():
+                    # Backpressure: give connected readers a chance to drain before lapping them
+                    self.producer_stalls += 1
+                    deadline = time.monotonic() + self.stall_timeout
+                    while stream.blocked_by_reader() and time.monotonic() < deadline:
+                        await stream.wait_drained(deadline - time.monotonic())
+                stream.append(frame)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Stream producer for session {stream.session_id} failed: {e}")
+            stream.append(sse_frame({"type": "error", "error": str(e)}))
+        finally:
+            stream.finish()
+
+    async def subscribe(
+        self, stream: ReplayStream, last_event_id: Optional[int] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """Frames after ``last_event_id``, then live frames until the run ends"""
+        token = object()
+        if stream.orphan_timer is not None:
+            # Someone is reading again; a later departure arms a fresh timer
+            stream.orphan_timer.cancel()
+            stream.orphan_timer = None
+        cursor = stream.first_id - 1
+        if last_event_id is not None and last_event_id >= stream.first_id:
+            self.resumes += 1
+            cursor = min(last_event_id, stream.last_id)
+        stream.cursors[token] = cursor
+        # Events up to here were produced before this connection and are a replay
+        replay_until = stream.last_id if last_event_id is not None else cursor
+        try:
+            yield b"retry: %d\n\n" % self.retry_ms
+            if cursor < stream.oldest_id - 1:
+                # Events between the client's id and the ring's start are gone
+                self.replay_gaps += 1
+                yield sse_frame({"type": "replay_gap", "last_event_id": cursor,
+                                 "oldest_event_id": stream.oldest_id})
+                cursor = stream.cursors[token] = stream.oldest_id - 1
+            slow = False
+            while True:
+                if cursor < stream.last_id:
+                    if cursor < stream.oldest_id - 1:
+                        # Lapped: the producer gave up waiting and overwrote unsent events
+                        self.lapped_consumers += 1
+                        logger.warning(
+                            f"Slow SSE consumer on session {stream.session_id} "
+                            f"lapped at event {cursor}"
+                        )
+                        yield sse_frame({"type": "slow_consumer", "last_event_id": cursor,
+                                         "oldest_event_id": stream.oldest_id})
+                        return
+                    if not slow and stream.last_id - cursor >= self.slow_lag:
+                        slow = True
+                        self.slow_consumers += 1
+                    event_id, frame = stream.ring[cursor - stream.oldest_id + 1]
+                    if event_id <= replay_until:
+                        self.events_replayed += 1
+                    yield frame
+                    # Only advanced once the frame was taken, which is when the
+                    # socket accepted the previous one
+                    cursor = stream.cursors[token] = event_id
+                    stream.wake_producer()
+                    continue
+                if stream.done:
+                    return
+                if not await stream.wait(self.heartbeat_interval):
+                    self.heartbeats += 1
+                    yield HEARTBEAT
+        finally:
+            del stream.cursors[token]
+            stream.wake_producer()
+            if not stream.cursors and not stream.done:
+                if stream.orphan_timer is not None:
+                    stream.orphan_timer.cancel()
+                stream.orphan_timer = asyncio.get_running_loop().call_later(
+                    self.orphan_timeout, self._cancel_orphan, stream
+                )
+
+    def _cancel_orphan(self, stream: ReplayStream) -> None:
+        stream.orphan_timer = None
+        if stream.subscribers == 0 and not stream.done and stream.producer:
+            self.orphans_cancelled += 1
+            stream.producer.cancel()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        expired = [
+            session_id for session_id, stream in self.streams.items()
+            if stream.done and stream.subscribers == 0
+            and now - (stream.finished_at or now) > self.retain
+        ]
+        for session_id in expired:
+            del self.streams[session_id]
+        # Over capacity: forget the oldest finished runs first (dicts keep insertion order)
+        for session_id in [s for s, stream in self.streams.items() if stream.done]:
+            if len(self.streams) < self.max_streams:
+                break
+            del self.streams[session_id]
+
+    def drop_session(self, session_id: str) -> None:
+        stream = self.streams.pop(session_id, None)
+        if stream and stream.producer and not stream.done:
+            stream.producer.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "streams": len(self.streams),
+            "live": sum(1 for stream in self.streams.values() if not stream.done),
+            "subscribers": sum(stream.subscribers for stream in self.streams.values()),
+            "runs_started": self.runs_started,
+            "resumes": self.resumes,
+            "events_replayed": self.events_replayed,
+            "replay_gaps": self.replay_gaps,
+            "heartbeats": self.heartbeats,
+            "producer_stalls": self.producer_stalls,
+            "slow_consumers": self.slow_consumers,
+            "lapped_consumers": self.lapped_consumers,
+            "orphans_cancelled": self.orphans_cancelled,
+        }
+
+
+def create_stream_registry() -> StreamRegistry:
+    return StreamRegistry(
+        replay_size=int(os.getenv("SSE_REPLAY_SIZE", "512")),
+        heartbeat_interval=float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15")),
+        slow_lag=int(os.getenv("SSE_SLOW_CONSUMER_LAG", "256")),
+        stall_timeout=float(os.getenv("SSE_STALL_TIMEOUT", "5")),
+        retain=float(os.getenv("SSE_RETAIN_SECONDS", "120")),
+        orphan_timeout=float(os.getenv("SSE_ORPHAN_TIMEOUT", "60")),
+    )
+
+
+async def simulate_reconnects(events: int = 200, drops: int = 5, seed: int = 0) -> Dict[str, int]:
+    """A client that disconnects ``drops`` times mid-stream and resumes with Last-Event-ID
+
+    Drop points and offline times come from ``seed``, so a run is repeatable.
+    """
+    import random
+
+    rng = random.Random(seed)
+
+    async def produce() -> AsyncIterator[bytes]:
+        for seq in range(events):
+            await asyncio.sleep(0.001)
+            yield sse_frame({"seq": seq})
+
+    registry = StreamRegistry(replay_size=events, heartbeat_interval=0.05)
+    stream = registry.start("simulated", produce())
+    received = []
+    last_event_id = None
+    connections = 0
+    while True:
+        connections += 1
+        reader = registry.subscribe(stream, last_event_id)
+        cut = rng.randint(1, events // drops) if connections <= drops else None
+        finished = True
+        async for frame in reader:
+            if not frame.startswith(b"id: "):
+                continue
+            id_line, data = frame.split(b"\n", 1)
+            last_event_id = int(id_line[4:])
+            received.append(int(data.split(b'"seq":', 1)[1].split(b"}", 1)[0]))
+            if cut is not None and len(received) % cut == 0:
+                finished = False
+                break
+        await reader.aclose()
+        if finished:
+            break
+        # Offline for a moment, as a client re-establishing its connection would be
+        await asyncio.sleep(rng.uniform(0.005, 0.03))
+    duplicates = len(received) - len(set(received))
+    return {
+        "events": events,
+        "connections": connections,
+        "received": len(received),
+        "duplicates": duplicates,
+        "missing": len(set(range(events)) - set(received)),
+        **registry.stats(),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    report = asyncio.run(simulate_reconnects())
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["duplicates"] or report["missing"] else 0)
@@ -0,0 +1,159 @@
+"""
+WebSocket connection manager
+Each client gets a bounded outbound queue drained by its own writer task, so
+one slow socket never stalls a broadcast
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from serialization import dumps_str
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+
+
+class ClientConnection:
+    """A connected WebSocket with its outbound queue and writer task"""
+
+    __slots__ = ("websocket", "queue", "writer", "dropped", "closed")
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.closed = False
+
+
+class ConnectionManager:
+    """Tracks connected clients and fans messages out without blocking"""
+
+    def __init__(self, queue_size: int = 256, overflow_policy: str = "drop_oldest"):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy: {overflow_policy}. Use: {', '.join(OVERFLOW_POLICIES)}"
+            )
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.clients: List[ClientConnection] = []
+        # Background closes of slow clients, referenced until done so they are not garbage-collected
+        self._closing: set = set()
+
+        self.messages_broadcast = 0
+        self.frames_dropped = 0
+        self.slow_disconnects = 0
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
+        """Accept a WebSocket and start its writer task"""
+        await websocket.accept()
+        client = ClientConnection(websocket, self.queue_size)
+        client.writer = asyncio.create_task(self._writer(client))
+        self.clients.append(client)
+        return client
+
+    async def disconnect(self, client: ClientConnection) -> None:
+        """Stop the writer task and forget the client"""
+        self._remove(client)
+        if client.writer and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+            try:
+                await client.writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def send(self, client: ClientConnection, message: Dict[str, Any]) -> bool:
+        """Queue a message for one client"""
+        return self._enqueue(client, dumps_str(message))
+
+    def broadcast(self, message: Dict[str, Any]) -> int:
+        """Queue a message for every client; serializes once and never awaits a socket"""
+        if not self.clients:
+            return 0
+        return self.broadcast_frame(dumps_str(message))
+
+    def broadcast_frame(self, frame: str) -> int:
+        """Queue an already-serialized frame for every client"""
+        if not self.clients:
+            return 0
+
+        self.messages_broadcast += 1
+
+        delivered = 0
+        for client in list(self.clients):
+            if self._enqueue(client, frame):
+                delivered += 1
+        return delivered
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.clients),
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "queued_frames": sum(c.queue.qsize() for c in self.clients),
+            "messages_broadcast": self.messages_broadcast,
+            "frames_dropped": self.frames_dropped,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+    def _enqueue(self, client: ClientConnection, frame: str) -> bool:
+        if client.closed:
+            return False
+
+        try:
+            client.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow_policy == "drop_oldest":
+            client.queue.get_nowait()
+            client.queue.put_nowait(frame)
+            client.dropped += 1
+            self.frames_dropped += 1
+            return True
+
+        if self.overflow_policy == "drop_newest":
+            client.dropped += 1
+            self.frames_dropped += 1
+            return False
+
+        # disconnect: the client cannot keep up, close it in the background
+        self.slow_disconnects += 1
+        logger.warning("Disconnecting slow WebSocket client (outbound queue full)")
+        self._remove(client)
+        task = asyncio.get_running_loop().create_task(self._close(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+        return False
+
+    async def _writer(self, client: ClientConnection) -> None:
+        try:
+            while True:
+                frame = await client.queue.get()
+                await client.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket writer stopped: {e}")
+            self._remove(client)
+
+    async def _close(self, client: ClientConnection) -> None:
+        if client.writer:
+            client.writer.cancel()
+        try:
+            await client.websocket.close(code=1013)  # Try again later
+        except Exception:
+            pass
+
+    def _remove(self, client: ClientConnection) -> None:
+        client.closed = True
+        if client in self.clients:
+            self.clients.remove(client)
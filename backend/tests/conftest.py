@@ -0,0 +1,47 @@
+"""
+Shared pytest setup for the backend
+Modules in app/ import each other by flat name (as main.py does), so app/ goes on sys.path
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+# Settings for tests that exercise the FastAPI app; applied before main is first imported
+APP_ENV = {
+    "E2B_API_KEY": "test_key",
+    "SANDBOX_BOOT_DELAY": "0",
+    "SANDBOX_POOL_SIZE": "0",
+    "AI_MODEL_BACKEND": "demo",
+    "RATE_LIMIT_REQUESTS_PER_MINUTE": "100000",
+    "RATE_LIMIT_BURST_SIZE": "10000",
+    "RATE_LIMIT_IP_REQUESTS_PER_MINUTE": "100000",
+    "RATE_LIMIT_IP_BURST_SIZE": "10000",
+}
+
+
+@pytest.fixture(scope="session")
+def app_env():
+    """APP_ENV applied to os.environ, for this process and the servers it starts"""
+    for key, value in APP_ENV.items():
+        os.environ.setdefault(key, value)
+
+
+@pytest.fixture(scope="session")
+def app_main(app_env):
+    """The backend's main module, imported with APP_ENV"""
+    import main
+
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(app_main):
+    """TestClient with startup and shutdown hooks run once for the session"""
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_main.app) as test_client:
+        yield test_client
@@ -0,0 +1,353 @@
+"""
+Tests for admission control: rate limits, queue shedding, slots held by plain and streamed
+responses, body peeking, and latency under overload
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from admission import (
+    MAX_PEEK_BYTES,
+    AdmissionController,
+    AdmissionMiddleware,
+    ConcurrencyGate,
+    MemoryBuckets,
+    RedisBuckets,
+    Rejected,
+    buffer_body,
+    load_test,
+)
+from serialization import loads
+
+
+def middleware(app):
+    gate = ConcurrencyGate("ai_agent", limit=1, queue_size=0)
+    controller = AdmissionController(MemoryBuckets(), {"ai_agent": gate})
+    return gate, AdmissionMiddleware(app, controller)
+
+
+def scope(method="GET", headers=()):
+    return {"type": "http", "method": method, "path": "/api/ai-agent", "query_string": b"",
+            "headers": list(headers), "client": ("10.0.0.1", 0)}
+
+
+async def no_body():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def run(handler, request_scope, receive=no_body):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    return handler(request_scope, receive, send), sent
+
+
+def test_event_stream_gives_its_slot_back_when_the_response_starts():
+    async def main():
+        disconnected = asyncio.Event()
+
+        async def app(scope, receive, send):
+            headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"data: {}\n\n", "more_body": True})
+            await disconnected.wait()
+
+        gate, handler = middleware(app)
+        call, _ = run(handler, scope())
+        stream = asyncio.create_task(call)
+        await asyncio.sleep(0.05)
+        # A second stream is admitted while the first is still connected
+        second = asyncio.create_task(run(handler, scope())[0])
+        await asyncio.sleep(0.05)
+        active = gate.active
+        disconnected.set()
+        await asyncio.gather(stream, second)
+        return gate, active
+
+    gate, active_while_streaming = asyncio.run(main())
+    assert active_while_streaming == 0
+    assert gate.stats()["admitted"] == 2
+    assert gate.stats()["shed"] == 0
+    assert gate.active == 0
+    # The service time reflects time to the response start, not the stream's lifetime
+    assert gate.service_time < 0.04
+
+
+def test_plain_response_holds_its_slot_until_finished():
+    async def main():
+        finish = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json")]})
+            await finish.wait()
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        gate, handler = middleware(app)
+        first = asyncio.create_task(run(handler, scope())[0])
+        await asyncio.sleep(0.01)
+        call, sent = run(handler, scope())
+        await call
+        finish.set()
+        await first
+        return gate, sent
+
+    gate, rejected = asyncio.run(main())
+    assert rejected[0]["status"] == 429
+    assert gate.active == 0
+
+
+def test_session_is_read_from_a_small_json_body_and_the_body_replayed():
+    received = []
+
+    async def app(scope, receive, send):
+        received.append(await receive())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    body = b'{"session_id": "from-body"}'
+    parts = [{"type": "http.request", "body": body[:10], "more_body": True},
+             {"type": "http.request", "body": body[10:], "more_body": False}]
+
+    async def receive():
+        return parts.pop(0)
+
+    gate, handler = middleware(app)
+    taken = []
+    take = handler.controller.buckets.take
+
+    async def recording_take(key, rate, burst):
+        taken.append(key)
+        return await take(key, rate, burst)
+
+    handler.controller.buckets.take = recording_take
+    asyncio.run(run(handler, scope("POST"), receive)[0])
+    assert "session:from-body" in taken
+    assert received == [{"type": "http.request", "body": body, "more_body": False}]
+
+
+def test_large_body_is_not_buffered_past_the_peek_limit():
+    chunk = b"x" * (MAX_PEEK_BYTES // 2 + 1)
+    parts = [{"type": "http.request", "body": chunk, "more_body": True} for _ in range(10)]
+    parts[-1]["more_body"] = False
+    reads = []
+
+    async def receive():
+        reads.append(1)
+        return parts[len(reads) - 1]
+
+    async def main():
+        body, replay = await buffer_body(receive)
+        buffered_reads = len(reads)
+        replayed = []
+        while True:
+            message = await replay()
+            replayed.append(message["body"])
+            if not message["more_body"]:
+                return body, buffered_reads, b"".join(replayed)
+
+    body, buffered_reads, replayed = asyncio.run(main())
+    assert buffered_reads == 2
+    assert len(body) == 2 * len(chunk)
+    assert replayed == chunk * 10
+
+
+def limited(app=None, gate=None, **rates):
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    gate = gate or ConcurrencyGate("ai_agent", limit=100)
+    controller = AdmissionController(MemoryBuckets(), {"ai_agent": gate}, **rates)
+    return AdmissionMiddleware(app or ok, controller)
+
+
+def status_and_headers(sent):
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+
+async def call(handler, request_scope):
+    request, sent = run(handler, request_scope)
+    await request
+    return sent
+
+
+def test_session_bucket_exhaustion_returns_429_with_retry_after():
+    handler = limited(session_rate=0.1, session_burst=2)
+    session = [(b"x-session-id", b"heavy")]
+
+    async def main():
+        return [await call(handler, scope(headers=session)) for _ in range(3)], await call(
+            handler, scope(headers=[(b"x-session-id", b"light")])
+        )
+
+    (first, second, third), other = asyncio.run(main())
+    assert [s[0]["status"] for s in (first, second, other)] == [200, 200, 200]
+    status, headers = status_and_headers(third)
+    # One token every 10 s
+    assert (status, headers[b"retry-after"]) == (429, b"10")
+    assert loads(third[1]["body"]) == {
+        "detail": "Too many requests", "reason": "session_rate", "retry_after": 10
+    }
+    assert handler.controller.stats()["rejected"] == {"session_rate": 1}
+
+
+def test_ip_bucket_limits_many_sessions_from_one_address():
+    handler = limited(ip_rate=0.25, ip_burst=2)
+
+    async def main():
+        return [
+            await call(handler, scope(headers=[(b"x-session-id", f"s{i}".encode())]))
+            for i in range(3)
+        ]
+
+    responses = asyncio.run(main())
+    assert [sent[0]["status"] for sent in responses] == [200, 200, 429]
+    assert status_and_headers(responses[2])[1][b"retry-after"] == b"4"
+    assert loads(responses[2][1]["body"])["reason"] == "ip_rate"
+
+
+def test_gate_sheds_when_the_queue_is_full():
+    async def main():
+        gate = ConcurrencyGate("execute", limit=1, queue_size=1, queue_timeout=5)
+        gate.service_time = 2.0
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        try:
+            await gate.acquire()
+        except Rejected as e:
+            rejection = e
+        gate.release(2.0)
+        await waiter
+        return gate, rejection
+
+    gate, rejection = asyncio.run(main())
+    # The waiter already queued is one service time from a slot, a newcomer two
+    assert (rejection.reason, rejection.retry_after) == ("queue_full", 4.0)
+    assert gate.stats()["admitted"] == 2
+    assert gate.stats()["shed"] == 1
+
+
+def test_gate_sheds_on_deadline_up_front_and_after_waiting():
+    async def main():
+        gate = ConcurrencyGate("execute", limit=1, queue_size=10, queue_timeout=5)
+        gate.service_time = 2.0
+        await gate.acquire()
+        rejections = []
+        start = time.perf_counter()
+        try:
+            # The expected wait is already longer than the caller will wait
+            await gate.acquire(timeout=1.0)
+        except Rejected as e:
+            rejections.append((e.reason, time.perf_counter() - start))
+        gate.service_time = 0.01
+        start = time.perf_counter()
+        try:
+            await gate.acquire(timeout=0.05)
+        except Rejected as e:
+            rejections.append((e.reason, time.perf_counter() - start))
+        return gate, rejections
+
+    gate, ((up_front, shed_at), (waited, gave_up_at)) = asyncio.run(main())
+    assert up_front == waited == "deadline"
+    assert shed_at < 0.01
+    assert 0.05 <= gave_up_at < 0.5
+    assert gate.stats()["waiting"] == 0
+    assert gate.stats()["queued"] == 1 and gate.stats()["shed"] == 2
+
+
+def test_request_timeout_header_bounds_the_queue_wait():
+    async def main():
+        finish = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await finish.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        gate = ConcurrencyGate("ai_agent", limit=1, queue_size=10, queue_timeout=5)
+        handler = limited(app, gate)
+        busy = asyncio.create_task(call(handler, scope()))
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        impatient = await call(handler, scope(headers=[(b"x-request-timeout", b"0.05")]))
+        waited = time.perf_counter() - start
+        patient = asyncio.create_task(call(handler, scope(headers=[(b"x-request-timeout", b"2")])))
+        await asyncio.sleep(0.05)
+        finish.set()
+        return impatient, waited, await busy, await patient
+
+    impatient, waited, busy, patient = asyncio.run(main())
+    status, headers = status_and_headers(impatient)
+    assert (status, loads(impatient[1]["body"])["reason"]) == (429, "deadline")
+    assert headers[b"retry-after"] == b"1"
+    assert 0.05 <= waited < 0.5
+    assert busy[0]["status"] == patient[0]["status"] == 200
+
+
+def redis_buckets(server):
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisBuckets(fakeredis.FakeAsyncRedis(server=server))
+
+
+def test_redis_buckets_are_shared_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    # fakeredis runs the Lua script with lupa
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    first, second = redis_buckets(server), redis_buckets(server)
+
+    async def main():
+        waits = [await worker.take("session:s", 0.5, 3) for worker in (first, second, first)]
+        return waits, await second.take("session:s", 0.5, 3), await first.take("session:t", 0.5, 3)
+
+    waits, exhausted, other = asyncio.run(main())
+    assert waits == [0.0, 0.0, 0.0]
+    # One token every 2 s, shared by both workers
+    assert 1.9 < exhausted <= 2.0
+    assert other == 0.0
+    assert first.errors == second.errors == 0
+
+
+def test_redis_buckets_fail_open_when_redis_errors():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    server.connected = False
+    buckets = redis_buckets(server)
+    handler = limited(session_rate=0.1, session_burst=1)
+    handler.controller.buckets = buckets
+
+    async def main():
+        return [await call(handler, scope(headers=[(b"x-session-id", b"s")])) for _ in range(3)]
+
+    responses = asyncio.run(main())
+    # Rate limits are skipped, not turned into errors
+    assert [sent[0]["status"] for sent in responses] == [200, 200, 200]
+    assert buckets.errors == 6
+
+
+def test_admission_keeps_admitted_latency_bounded_under_overload():
+    options = {"capacity": 8, "service": 0.02, "overload": 3.0, "duration": 1.0,
+               "queue_size": 16, "queue_timeout": 0.2}
+
+    async def main():
+        return (await load_test(False, **options), await load_test(True, **options))
+
+    unadmitted, admitted = asyncio.run(main())
+    backlog = unadmitted["statuses"]["200"]
+    served, shed = admitted["statuses"]["200"], admitted["statuses"]["429"]
+    # Without admission the upstream queue grows for as long as the overload lasts: the
+    # latest requests wait about twice as long as the median one
+    assert backlog["p99_ms"] > 300
+    assert backlog["max_ms"] > 1.5 * backlog["p50_ms"]
+    # With it, admitted requests wait at most the queue timeout plus their own service
+    assert served["p99_ms"] < 200 + 20 + 100
+    assert backlog["p99_ms"] > 2 * served["p99_ms"]
+    # The excess gets a fast 429 rather than a slow answer
+    assert shed["count"] > served["count"] / 2
+    assert shed["p99_ms"] < 200 + 100
@@ -0,0 +1,47 @@
+"""Chat history ring: bounded window, cached counters, spills to the archive"""
+
+import asyncio
+
+from chat_history import ChatHistory, MemoryHistoryArchive, benchmark_memory
+
+
+def test_window_is_bounded_and_spills_oldest():
+    history = ChatHistory(capacity=3)
+    spilled = [history.append("user", f"m{i}", f"t{i}") for i in range(5)]
+
+    assert spilled == [None, None, None, ("user", "m0", "t0"), ("user", "m1", "t1")]
+    assert [m["content"] for m in history.context()] == ["m2", "m3", "m4"]
+    assert history.summary() == {"message_count": 5, "created_at": "t0", "last_activity": "t4"}
+
+
+def test_round_trips_through_dict():
+    history = ChatHistory(capacity=2)
+    for i in range(3):
+        history.append("assistant", f"m{i}", f"t{i}")
+    restored = ChatHistory.from_dict(history.to_dict())
+
+    assert restored.context() == history.context()
+    assert restored.summary() == history.summary()
+    assert restored.window.maxlen == 2
+
+
+def test_archive_keeps_latest_spills_per_session():
+    async def run():
+        archive = MemoryHistoryArchive(max_messages=2)
+        for i in range(3):
+            await archive.append("s1", ("user", f"m{i}", f"t{i}"))
+        read = await archive.read("s1")
+        archive.discard("s1")
+        return read, await archive.read("s1"), archive.stats()
+
+    read, after_discard, stats = asyncio.run(run())
+    assert [m["content"] for m in read] == ["m1", "m2"]
+    assert after_discard == []
+    assert stats["spilled"] == 3
+
+
+def test_memory_per_session_does_not_grow_with_history():
+    short = benchmark_memory(sessions=2000, messages=10)
+    long = benchmark_memory(sessions=2000, messages=200)
+
+    assert long["bytes_per_session"] < short["bytes_per_session"] * 1.2
@@ -0,0 +1,142 @@
+"""Context builder: token budget, truncation, dedup, running summaries and archive bootstrap"""
+
+from context_builder import (
+    ContextBuilder,
+    ExtractiveSummarizer,
+    TokenCounter,
+    estimate_tokens,
+)
+
+
+def turn(n, output):
+    return [
+        {"role": "user", "content": f"Step {n}: check the build. Report failures."},
+        {"role": "tool", "content": output},
+        {"role": "assistant", "content": f"Turn {n} done. Moving on."},
+    ]
+
+
+def tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+class CountingSummarizer(ExtractiveSummarizer):
+    def __init__(self):
+        super().__init__()
+        self.folded = []
+
+    def summarize(self, previous, messages, max_tokens):
+        self.folded.append([m["content"] for m in messages])
+        return super().summarize(previous, messages, max_tokens)
+
+
+def test_history_over_budget_is_cut_to_the_budget_and_summarized():
+    builder = ContextBuilder(budget=600, summary_budget=100, max_tool_tokens=100)
+    log = "\n".join(f"compiling module_{i}.py ... ok" for i in range(400))
+    messages = [m for n in range(8) for m in turn(n, f"{n}: {log}")]
+
+    built, report = builder.build("s", messages)
+
+    assert report["tokens_in"] == tokens(messages)
+    assert report["tokens_out"] == tokens(built) <= 600
+    # The latest turn is sent in full; the turns that did not fit are in the summary
+    assert built[-3:][0] == messages[-3]
+    assert report["messages_summarized"] == len(messages) - report["messages_kept"]
+    newest_dropped = messages[report["messages_summarized"] - 1]
+    assert built[0]["role"] == "system"
+    summary_lines = built[0]["content"].splitlines()
+    role, content = newest_dropped["role"], newest_dropped["content"]
+    assert summary_lines[-1].startswith(f"- {role}: {content[:20]}")
+    assert estimate_tokens("\n".join(summary_lines[1:])) <= 100 + 4
+    # Long tool output is cut to its head and tail
+    output = built[-2]["content"]
+    assert output.startswith("7: compiling module_0.py") and "characters omitted" in output
+    assert output.endswith("module_399.py ... ok")
+    assert estimate_tokens(output) <= 100 + 16
+
+
+def test_repeated_tool_output_is_sent_once():
+    builder = ContextBuilder()
+    screenshot = "Screenshot captured. data:image/png;base64,"
+    messages = [
+        *turn(0, screenshot + "A" * 2000),
+        *turn(1, "exit_code=0\nAll 214 tests passed."),
+        *turn(2, screenshot + "B" * 2000),
+        *turn(3, "exit_code=0\nAll 214 tests passed."),
+    ]
+
+    built, report = builder.build("s", messages)
+
+    tool_outputs = [m["content"] for m in built if m["role"] == "tool"]
+    # Screenshots differing only in image bytes count as the same output; the latest is kept
+    assert tool_outputs == [
+        "Screenshot captured. [screenshot omitted]",
+        "exit_code=0\nAll 214 tests passed.",
+    ]
+    assert report["deduplicated"] == 2
+    # User turns are never deduplicated
+    assert sum(m["role"] == "user" for m in built) == 4
+
+
+def test_spilled_messages_fold_into_a_running_summary_once():
+    summarizer = CountingSummarizer()
+    builder = ContextBuilder(summarizer=summarizer)
+    spilled = turn(0, "exit_code=1\nTwo tests failed. See the log.")
+    for message in spilled:
+        builder.observe("s", message)
+    window = turn(1, "exit_code=0")
+
+    first, report = builder.build("s", window)
+    second, _ = builder.build("s", window)
+    builder.observe("s", turn(1, "ignored")[0])
+    third, _ = builder.build("s", window)
+
+    assert first[0] == second[0]
+    assert first[0]["content"].splitlines()[1:] == [
+        "- user: Step 0: check the build.",
+        "- tool: exit_code=1 Two tests failed.",
+        "- assistant: Turn 0 done.",
+    ]
+    assert first[1:] == window
+    assert report["messages_summarized"] == 3
+    # Each spilled message is summarized once, however many turns follow
+    assert summarizer.folded == [[m["content"] for m in spilled], [turn(1, "")[0]["content"]]]
+    assert third[0]["content"].endswith("- user: Step 1: check the build.")
+
+
+def test_bootstrap_from_the_archive_replaces_observed_messages():
+    summarizer = CountingSummarizer()
+    builder = ContextBuilder(summarizer=summarizer)
+    archived = turn(0, "exit_code=0") + turn(1, "exit_code=0")
+    window = turn(2, "exit_code=0")
+
+    # Another worker spilled these; this process has never seen the session
+    assert builder.needs_bootstrap("s", message_count=9, window=3)
+    assert not builder.needs_bootstrap("s", message_count=3, window=3)
+    builder.observe("s", archived[-1])
+    builder.bootstrap("s", archived)
+    built, report = builder.build("s", window)
+
+    assert not builder.needs_bootstrap("s", message_count=12, window=3)
+    assert summarizer.folded == [[m["content"] for m in archived]]
+    assert report["messages_summarized"] == len(archived)
+    assert built[0]["content"].count("- assistant: Turn 1 done.") == 1
+    builder.drop_session("s")
+    assert builder.needs_bootstrap("s", message_count=12, window=3)
+
+
+def test_caches_are_keyed_by_digest_not_content():
+    counter = TokenCounter()
+    builder = ContextBuilder(counter=counter)
+    output = "x" * 100000
+    messages = turn(0, output)
+
+    builder.build("s", messages)
+    builder.build("s", messages)
+
+    keys = list(counter._cache) + list(builder._compacted)
+    assert keys and all(len(key) == 24 for key in keys)
+    # Compaction that changed nothing keeps no copy of the content
+    assert all(compacted is None or len(compacted) < len(output)
+               for _, compacted in builder._compacted.values())
+    assert counter.stats()["hit_ratio"] > 0.5
@@ -0,0 +1,61 @@
+"""
+Tests for the element detector's process pool and result cache
+OCR is disabled so the tests do not depend on a tesseract install
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from element_detection import ElementDetector  # noqa: E402
+
+
+def desktop_frame():
+    frame = np.full((512, 512, 3), 240, dtype=np.uint8)
+    frame[40:70, 20:110] = 30
+    frame[300:330, 260:460] = 60
+    return frame
+
+
+def test_worker_pool_does_not_fork_the_server():
+    detector = ElementDetector(workers=1, ocr=False)
+    try:
+        pool = detector._executor()
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        detector.close()
+
+
+def test_pool_results_match_in_process_results():
+    frame = desktop_frame()
+
+    async def detect(workers):
+        detector = ElementDetector(cell_size=128, workers=workers, ocr=False)
+        try:
+            return await detector.detect("viewer", frame)
+        finally:
+            detector.close()
+
+    pooled = asyncio.run(detect(1))
+    in_process = asyncio.run(detect(0))
+    assert len(pooled["elements"]) == 2
+    assert pooled["elements"] == in_process["elements"]
+    assert pooled["cells_analyzed"] == in_process["cells_analyzed"]
+
+
+def test_unchanged_cells_come_from_the_cache():
+    frame = desktop_frame()
+    detector = ElementDetector(cell_size=128, workers=0, ocr=False)
+
+    async def main():
+        first = await detector.detect("viewer", frame)
+        again = await detector.detect("viewer", frame, regions=[(20, 40, 90, 30)])
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert again["cells_checked"] == 1
+    assert again["cells_analyzed"] == 0
+    assert again["elements"] == first["elements"]
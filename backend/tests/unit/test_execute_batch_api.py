@@ -0,0 +1,60 @@
+"""/api/execute/batch over HTTP: saturation answers 503 in both modes; one request runs N commands
+
+Wall-clock comparison against N single calls: python execution_engine.py
+"""
+
+import pytest
+
+
+@pytest.fixture
+def saturated(app_main):
+    engine = app_main.execution_engine
+    limit = engine.max_pending
+    engine.max_pending = 1
+    yield
+    engine.max_pending = limit
+
+
+BATCH = {"commands": [{"command": "ls"}, {"command": "pwd"}, {"command": "whoami"}]}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_saturated_batch_is_rejected_up_front(client, saturated, stream):
+    response = client.post("/api/execute/batch", json={**BATCH, "stream": stream})
+    assert response.status_code == 503
+
+
+def test_streamed_batch_yields_every_result(client):
+    response = client.post("/api/execute/batch", json={**BATCH, "stream": True})
+    assert response.status_code == 200
+    assert response.text.count('"type":"result"') == 3
+    assert '"type":"completion"' in response.text
+
+
+def test_one_request_runs_every_command_and_resolves_each_sandbox_once(
+    client, app_main, monkeypatch
+):
+    resolved = []
+    resolve_sandbox = app_main.resolve_sandbox
+
+    async def counting_resolve(sandbox_id, session_id):
+        resolved.append((sandbox_id, session_id))
+        return await resolve_sandbox(sandbox_id, session_id)
+
+    monkeypatch.setattr(app_main, "resolve_sandbox", counting_resolve)
+    sessions = ["batch-a"] * 4 + ["batch-b"] * 3 + [None] * 3
+    commands = [{"command": f"echo {i}", "session_id": s} for i, s in enumerate(sessions)]
+    submitted = app_main.execution_engine.stats()["submitted"]
+
+    body = client.post("/api/execute/batch", json={"commands": commands}).json()
+
+    assert body["count"] == body["succeeded"] == len(commands)
+    assert app_main.execution_engine.stats()["submitted"] - submitted == len(commands)
+    # Three distinct targets, each looked up once however many commands share it
+    assert sorted(resolved, key=str) == sorted(
+        [(None, "batch-a"), (None, "batch-b"), (None, None)], key=str
+    )
+    sandbox_of = {}
+    for session, result in zip(sessions, body["results"]):
+        assert sandbox_of.setdefault(session, result["sandbox_id"]) == result["sandbox_id"]
+    assert len(set(sandbox_of.values())) == 3
@@ -0,0 +1,227 @@
+"""Execution engine: saturation, per-sandbox limits, batch semantics and real subprocesses"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+from execution_engine import (
+    EngineSaturated,
+    ExecutionBackend,
+    ExecutionEngine,
+    ExecutionJob,
+    LocalSubprocessBackend,
+)
+
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="POSIX shell and process groups")
+
+
+class ScriptedBackend(ExecutionBackend):
+    """Commands are "<seconds> <exit code>"; tracks peak concurrency per sandbox"""
+
+    name = "scripted"
+
+    def __init__(self):
+        self.active = {}
+        self.peak = {}
+
+    async def run(self, job, emit):
+        delay, exit_code = job.command.split()
+        self.active[job.sandbox_id] = self.active.get(job.sandbox_id, 0) + 1
+        active = self.active[job.sandbox_id]
+        self.peak[job.sandbox_id] = max(self.peak.get(job.sandbox_id, 0), active)
+        try:
+            await asyncio.sleep(float(delay))
+            emit("stdout", job.command)
+            return int(exit_code)
+        finally:
+            self.active[job.sandbox_id] -= 1
+
+
+def commands(*specs, sandbox_id="sb"):
+    return [{"command": spec, "sandbox_id": sandbox_id} for spec in specs]
+
+
+async def collect(batch):
+    return [item async for item in batch]
+
+
+def test_submit_rejects_when_queue_is_full():
+    async def run():
+        engine = ExecutionEngine(ScriptedBackend(), max_pending=2)
+        jobs = [engine.submit("0.01 0"), engine.submit("0.01 0")]
+        with pytest.raises(EngineSaturated):
+            engine.submit("0.01 0")
+        await asyncio.gather(*(job.wait() for job in jobs))
+        return engine.stats()
+
+    stats = asyncio.run(run())
+    assert stats["rejected"] == 1 and stats["completed"] == 2 and stats["pending"] == 0
+
+
+def test_run_batch_rejects_before_iteration():
+    async def run():
+        engine = ExecutionEngine(ScriptedBackend(), max_pending=2)
+        # Raised by the call itself, not by the first step of the iterator
+        with pytest.raises(EngineSaturated):
+            engine.run_batch(commands("0 0", "0 0", "0 0"))
+        sequential = await collect(engine.run_batch(commands("0 0", "0 0", "0 0"), parallel=False))
+        return engine.stats(), sequential
+
+    stats, sequential = asyncio.run(run())
+    assert stats["rejected"] == 1
+    assert [index for index, _ in sequential] == [0, 1, 2]
+
+
+def test_per_sandbox_concurrency_limit():
+    async def run():
+        backend = ScriptedBackend()
+        engine = ExecutionEngine(backend, max_workers=8, per_sandbox=2)
+        jobs = [engine.submit("0.02 0", sandbox_id="a") for _ in range(5)]
+        jobs += [engine.submit("0.02 0", sandbox_id="b") for _ in range(5)]
+        await asyncio.gather(*(job.wait() for job in jobs))
+        return backend.peak, engine.active_jobs("a")
+
+    peak, active = asyncio.run(run())
+    assert peak == {"a": 2, "b": 2}
+    assert active == 0
+
+
+def test_sequential_fail_fast_skips_the_rest():
+    async def run():
+        engine = ExecutionEngine(ScriptedBackend())
+        batch = engine.run_batch(commands("0 0", "0 1", "0 0"), parallel=False, fail_fast=True)
+        return await collect(batch)
+
+    results = [result for _, result in asyncio.run(run())]
+    assert [r["status"] for r in results] == ["completed", "completed", "skipped"]
+    assert results[1]["exit_code"] == 1
+
+
+def test_parallel_fail_fast_cancels_the_rest():
+    async def run():
+        engine = ExecutionEngine(ScriptedBackend(), per_sandbox=4)
+        batch = engine.run_batch(commands("0.01 1", "1 0", "1 0"), fail_fast=True)
+        results = dict(await collect(batch))
+        return results, engine.stats()
+
+    results, stats = asyncio.run(run())
+    assert results[0]["exit_code"] == 1
+    assert results[1]["status"] == results[2]["status"] == "cancelled"
+    assert stats["pending"] == 0 and stats["running"] == 0
+
+
+def run_local(command, **kwargs):
+    """Run one command on a LocalSubprocessBackend; returns the job and its streamed events"""
+    async def run():
+        max_output = kwargs.pop("max_output", 1 << 20)
+        engine = ExecutionEngine(LocalSubprocessBackend(), max_output=max_output)
+        job = engine.submit(command, **kwargs)
+        events = [event async for event in job.stream()]
+        return job, events
+
+    return asyncio.run(run())
+
+
+def running(pid):
+    """True while pid exists and is not a zombie waiting to be reaped"""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_output_cap_counts_encoded_bytes():
+    async def run():
+        job = ExecutionJob("cmd", "sb", timeout=1, max_output=5)
+        job.emit("stdout", "\u00e9\u00e9\u00e9")  # six bytes in UTF-8
+        job.emit("stdout", "more")
+        return job
+
+    job = asyncio.run(run())
+    # Cut on the character boundary under the cap, never mid-character
+    assert job.output("stdout") == "\u00e9\u00e9"
+    assert job.truncated and job.output_bytes == 5
+
+
+@posix_only
+def test_local_backend_streams_stdout_and_stderr_as_produced():
+    job, events = run_local("echo first; echo oops >&2; sleep 0.3; echo second")
+    output = [event for event in events if event["type"] == "output"]
+    result = events[-1]["result"]
+
+    assert result["status"] == "completed" and result["exit_code"] == 0
+    assert result["stdout"] == "first\nsecond\n"
+    assert result["stderr"] == "oops\n"
+    # The first line arrived as its own event, ahead of the sleep
+    assert output[0] == {"type": "output", "seq": 0, "stream": "stdout", "data": "first\n"}
+    assert {event["stream"] for event in output} == {"stdout", "stderr"}
+
+
+@posix_only
+def test_local_backend_reports_non_zero_exit():
+    _, events = run_local("echo failing >&2; exit 3")
+    result = events[-1]["result"]
+    assert result["status"] == "completed"
+    assert result["exit_code"] == 3
+    assert result["stderr"] == "failing\n"
+
+
+@posix_only
+def test_local_backend_passes_environment_through():
+    _, events = run_local('echo "$ADX_TEST_VALUE:$HOME"', environment={"ADX_TEST_VALUE": "set"})
+    # Job variables are added to, not substituted for, the server's environment
+    assert events[-1]["result"]["stdout"] == f"set:{os.environ.get('HOME', '')}\n"
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc to inspect processes")
+def test_local_backend_timeout_kills_the_process_group(tmp_path):
+    pidfile = tmp_path / "child.pid"
+    job, events = run_local(f"sleep 30 & echo $! > {pidfile}; sleep 30", timeout=0.5)
+    result = events[-1]["result"]
+
+    assert result["status"] == "timeout"
+    assert result["execution_time"] < 5
+    # The background child the shell started died with it
+    child = int(pidfile.read_text())
+    for _ in range(50):
+        if not running(child):
+            break
+        asyncio.run(asyncio.sleep(0.01))
+    assert not running(child)
+
+
+@posix_only
+def test_local_backend_caps_real_output_in_bytes():
+    job, _ = run_local("printf '\\303\\251%.0s' $(seq 100)", max_output=11)
+    assert job.truncated
+    assert job.output("stdout") == "\u00e9" * 5
+    assert len(job.output("stdout").encode()) <= 11
+
+
+@posix_only
+def test_execute_accepts_then_polls_then_streams(client, app_main, monkeypatch):
+    monkeypatch.setattr(app_main.execution_engine, "backend", LocalSubprocessBackend())
+
+    accepted = client.post("/api/execute", json={"command": "echo start; sleep 0.3; echo done"})
+    assert accepted.status_code == 202
+    execution_id = accepted.json()["execution_id"]
+    assert accepted.json()["endpoints"]["stream"] == f"/api/execute/{execution_id}/stream"
+
+    polled = client.get(f"/api/execute/{execution_id}").json()["result"]
+    assert polled["status"] in ("queued", "running")
+
+    events = []
+    with client.stream("GET", f"/api/execute/{execution_id}/stream") as response:
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[6:]))
+    assert [event["type"] for event in events][-1] == "result"
+    assert "".join(e["data"] for e in events if e["type"] == "output") == "start\ndone\n"
+
+    final = client.get(f"/api/execute/{execution_id}").json()["result"]
+    assert final["status"] == "completed" and final["exit_code"] == 0
+    assert final["stdout"] == "start\ndone\n"
@@ -0,0 +1,88 @@
+"""
+Tests for the shared-memory frame ring and its FrameSource
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+
+from frame_ring import FrameGone, SharedFrameRing, SharedRingFrameSource  # noqa: E402
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing.create(None, width=32, height=16, slots=3)
+    yield ring
+    ring.close()
+
+
+def frame(value):
+    return np.full((16, 32, 3), value, dtype=np.uint8)
+
+
+def test_reader_sees_latest_frame_and_detects_laps(ring):
+    reader = SharedFrameRing.attach(ring.name)
+    try:
+        first = ring.write(frame(1))
+        sequence, view, _ = reader.latest()
+        assert sequence == first
+        assert not view.flags.writeable
+        assert reader.check(first)
+        # Views pin the mapping; drop ours before the reader closes
+        del view
+
+        for value in range(2, 2 + ring.slots):
+            ring.write(frame(value))
+        assert not reader.check(first)
+        with pytest.raises(FrameGone):
+            reader.read(first)
+    finally:
+        reader.close()
+
+
+def test_source_returns_a_copy_that_survives_the_writer(ring):
+    source = SharedRingFrameSource(ring.name)
+    try:
+        ring.write(frame(7))
+        captured = source.capture()
+        # The writer laps the whole ring while the pipeline still holds the frame
+        for value in range(ring.slots + 1):
+            ring.write(frame(100 + value))
+        assert captured.flags.writeable
+        assert (captured == 7).all()
+    finally:
+        source.ring.close()
+
+
+def test_source_retries_a_copy_torn_by_the_writer(ring):
+    source = SharedRingFrameSource(ring.name)
+    source.ring = reader = SharedFrameRing.attach(ring.name)
+    ring.write(frame(1))
+    check = reader.check
+    torn = []
+
+    def check_after_write(sequence):
+        # The writer commits a new frame while the first copy is in progress
+        if not torn:
+            torn.append(sequence)
+            ring.write(frame(2))
+            return False
+        return check(sequence)
+
+    reader.check = check_after_write
+    try:
+        captured = source.capture()
+        assert torn == [1]
+        assert (captured == 2).all()
+    finally:
+        reader.close()
+
+
+def test_source_before_first_frame_raises(ring):
+    source = SharedRingFrameSource(ring.name)
+    try:
+        with pytest.raises(FrameGone):
+            source.capture()
+    finally:
+        source.ring.close()
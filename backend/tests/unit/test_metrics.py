@@ -0,0 +1,125 @@
+"""Metrics: Prometheus request histograms and in-flight gauges, /health percentiles, SSE timing"""
+
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from metrics import LatencyReservoir, MetricsMiddleware, timed_sse
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def scrape(client):
+    """/metrics as {(name, sorted labels): value}"""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    return {
+        (s.name, tuple(sorted(s.labels.items()))): s.value
+        for family in text_string_to_metric_families(response.text)
+        for s in family.samples
+    }
+
+
+def test_request_is_recorded_under_its_route_template(client):
+    labels = (("method", "GET"), ("route", "/api/execute/{execution_id}"), ("status", "404"))
+    count = ("adx_http_request_duration_seconds_count", labels)
+    before = scrape(client).get(count, 0.0)
+
+    assert client.get("/api/execute/no-such-job").status_code == 404
+    after = scrape(client)
+
+    # One observation, labelled by the route template rather than the raw path
+    assert after[count] == before + 1
+    bucket = tuple(sorted(labels + (("le", "+Inf"),)))
+    assert after[("adx_http_request_duration_seconds_bucket", bucket)] >= 1
+    assert not any("no-such-job" in value for _, pairs in after for _, value in pairs)
+    # The scrape itself is the only GET in flight while /metrics renders
+    assert after[("adx_http_requests_in_flight", (("method", "GET"),))] == 1
+
+
+def test_in_flight_gauge_follows_requests_through_the_middleware():
+    async def main():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 204, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            pass
+
+        middleware = MetricsMiddleware(app)
+        scope = {"type": "http", "method": "PATCH", "path": "/held"}
+        before = sample("adx_http_requests_in_flight", method="PATCH")
+        requests = [asyncio.create_task(middleware(scope, None, send)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        during = sample("adx_http_requests_in_flight", method="PATCH")
+        release.set()
+        await asyncio.gather(*requests)
+        return before, during, sample("adx_http_requests_in_flight", method="PATCH")
+
+    before, during, after = asyncio.run(main())
+    assert during == before + 3
+    assert after == before
+    # No route matched, so the label is bounded to "unmatched"
+    assert sample(
+        "adx_http_request_duration_seconds_count", method="PATCH", route="unmatched", status="204"
+    ) >= 3
+
+
+def test_health_percentiles_come_from_the_latency_reservoir(client, app_main):
+    for ms in range(1, 101):
+        app_main.latency_reservoir.observe("GET /percentile-probe", ms / 1000)
+
+    client.get("/health")
+    latency = client.get("/health").json()["latency"]
+
+    assert latency["GET /percentile-probe"] == {
+        "count": 100, "p50_ms": 51.0, "p95_ms": 96.0, "p99_ms": 100.0,
+    }
+    # The middleware feeds the same reservoir: the earlier /health call is in it
+    assert latency["GET /health"]["count"] >= 1
+    assert latency == app_main.latency_reservoir.percentiles() | {
+        "GET /health": latency["GET /health"]
+    }
+
+
+def test_reservoir_keeps_only_the_most_recent_samples():
+    reservoir = LatencyReservoir(size=10)
+    for ms in range(100):
+        reservoir.observe("GET /x", ms / 1000)
+    assert reservoir.percentiles()["GET /x"] == {
+        "count": 10, "p50_ms": 95.0, "p95_ms": 99.0, "p99_ms": 99.0,
+    }
+
+
+def test_time_to_first_event_is_observed_once_per_stream():
+    async def events():
+        await asyncio.sleep(0.05)
+        for i in range(3):
+            yield f"data: {i}\n\n".encode()
+
+    async def main():
+        return [frame async for frame in timed_sse("metrics-test", events())]
+
+    count = sample("adx_sse_time_to_first_event_seconds_count", stream="metrics-test")
+    total = sample("adx_sse_time_to_first_event_seconds_sum", stream="metrics-test")
+    frames = asyncio.run(main())
+
+    assert len(frames) == 3
+    assert sample("adx_sse_time_to_first_event_seconds_count", stream="metrics-test") == count + 1
+    delay = sample("adx_sse_time_to_first_event_seconds_sum", stream="metrics-test") - total
+    assert 0.05 <= delay < 1
+    assert sample("adx_sse_events_total", stream="metrics-test") >= 3
+
+
+def test_execute_stream_reports_time_to_first_event(client):
+    count = sample("adx_sse_time_to_first_event_seconds_count", stream="execute")
+    execution_id = client.post("/api/execute", json={"command": "echo hi"}).json()["execution_id"]
+    client.get(f"/api/execute/{execution_id}/stream")
+    assert sample("adx_sse_time_to_first_event_seconds_count", stream="execute") == count + 1
@@ -0,0 +1,70 @@
+"""
+Tests for the streaming model backends and the /api/ai-agent event stream built on them
+"""
+
+import asyncio
+import json
+import time
+
+from model_backends import DemoModelBackend, FakeModelBackend, demo_response, split_tokens
+
+
+def stream_events(client, content, session_id):
+    body = {"messages": [{"role": "user", "content": content}], "session_id": session_id}
+    events = []
+    with client.stream("POST", "/api/ai-agent", json=body) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[6:]))
+    return events
+
+
+def test_tokens_keep_their_whitespace():
+    text = "Hello  there,\nworld "
+    assert "".join(split_tokens(text)) == text.rstrip()
+    assert split_tokens("one two") == ["one", " two"]
+
+
+def test_fake_backend_waits_ttfb_then_streams_every_token():
+    backend = FakeModelBackend(ttfb=0.05, token_delay=0.001, tokens=20)
+
+    async def main():
+        start = time.perf_counter()
+        arrivals = []
+        async for chunk in backend.stream([], "", full_mode=False):
+            arrivals.append((time.perf_counter() - start, chunk))
+        return arrivals
+
+    arrivals = asyncio.run(main())
+    assert [chunk for _, chunk in arrivals] == [f"tok{i} " for i in range(20)]
+    assert arrivals[0][0] >= 0.05
+    assert arrivals[-1][0] >= 0.05 + 19 * 0.001
+
+
+def test_demo_backend_streams_the_demo_response_in_pieces():
+    messages = [{"role": "user", "content": "open the browser"}]
+
+    async def main():
+        return [chunk async for chunk in DemoModelBackend().stream(messages, "ctx", False)]
+
+    chunks = asyncio.run(main())
+    assert len(chunks) > 10
+    assert "".join(chunks) == demo_response(messages, "ctx").rstrip()
+
+
+def test_ai_agent_streams_deltas_then_a_terminal_event(client):
+    events = stream_events(client, "stream this in pieces", "stream-deltas")
+    kinds = [event["type"] for event in events]
+    deltas = [event for event in events if event["type"] == "ai_response_delta"]
+
+    # Many deltas, then exactly one end marker, then the tool call and completion
+    assert len(deltas) > 10
+    end = kinds.index("ai_response_end")
+    assert kinds[:end] == ["ai_response_delta"] * end
+    assert kinds[end:] == ["ai_response_end", "tool_call", "completion"]
+    assert [delta["seq"] for delta in deltas] == list(range(len(deltas)))
+    assert "stream this in pieces" in "".join(delta["delta"] for delta in deltas)
+    metadata = events[end]["metadata"]
+    assert metadata["chunks"] == len(deltas)
+    assert events[end]["seq"] == len(deltas)
@@ -0,0 +1,93 @@
+"""Cross-worker broadcast: every subscribed worker receives each published frame exactly once"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from pubsub import LocalBroadcaster, RedisBroadcaster, benchmark
+
+
+def test_local_broadcast_reaches_every_worker_on_the_channel():
+    async def run():
+        received = {name: [] for name in ("a", "b", "other")}
+        workers = {
+            "a": LocalBroadcaster("test:fanout"),
+            "b": LocalBroadcaster("test:fanout"),
+            "other": LocalBroadcaster("test:elsewhere"),
+        }
+        for name, broadcaster in workers.items():
+            await broadcaster.start(received[name].append)
+
+        await workers["a"].publish("one")
+        await workers["b"].stop()
+        await workers["a"].publish("two")
+        for broadcaster in workers.values():
+            await broadcaster.stop()
+        return received, workers["a"].stats()
+
+    received, stats = asyncio.run(run())
+    assert received == {"a": ["one", "two"], "b": ["one"], "other": []}
+    assert stats["published"] == 2 and stats["received"] == 2
+
+
+def test_handler_errors_do_not_stop_delivery():
+    async def run():
+        good = []
+        failing = LocalBroadcaster("test:errors")
+        healthy = LocalBroadcaster("test:errors")
+        await failing.start(lambda frame: 1 / 0)
+        await healthy.start(good.append)
+        await failing.publish("frame")
+        await failing.stop()
+        await healthy.stop()
+        return good
+
+    assert asyncio.run(run()) == ["frame"]
+
+
+def test_redis_broadcast_reaches_other_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        server = fakeredis.FakeServer()
+        received = [[], []]
+        workers = [
+            RedisBroadcaster(fakeredis.FakeAsyncRedis(server=server), "test:redis")
+            for _ in range(2)
+        ]
+        for worker, frames in zip(workers, received):
+            await worker.start(frames.append)
+        await workers[0].publish('{"n":1}')
+        for _ in range(50):
+            if all(received):
+                break
+            await asyncio.sleep(0.01)
+        for worker in workers:
+            await worker.stop()
+        return received
+
+    assert asyncio.run(run()) == [['{"n":1}'], ['{"n":1}']]
+
+
+def test_benchmark_fans_out_across_worker_processes():
+    fakeredis = pytest.importorskip("fakeredis")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    # A Redis over TCP that the spawned worker processes can all reach
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        result = benchmark(workers=2, clients_per_worker=5, messages=20,
+                           redis_url=f"redis://127.0.0.1:{port}/0", timeout=20)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Every frame published by either process reaches every client of both
+    assert result["delivered"] == result["expected"] == 20 * 2 * 5
+    assert result["delivered_per_s"] > 0
+    assert result["fanout_latency"]["count"] == 200
+    assert 0 <= result["fanout_latency"]["p50_ms"] <= result["fanout_latency"]["p99_ms"]
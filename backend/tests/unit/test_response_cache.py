@@ -0,0 +1,66 @@
+"""
+Tests for the model response cache: keys shared across sessions and request coalescing
+"""
+
+import asyncio
+
+from response_cache import ResponseCache, response_key
+
+
+def test_key_ignores_whitespace_but_not_content():
+    messages = [{"role": "user", "content": "open  the\nbrowser"}]
+    same = [{"role": "user", "content": "open the browser"}]
+    other = [{"role": "user", "content": "close the browser"}]
+    key = response_key(messages, "demo", False)
+    assert key == response_key(same, "demo", False)
+    assert key != response_key(other, "demo", False)
+    assert key != response_key(messages, "demo", True)
+    assert key != response_key(messages, "fake", False)
+
+
+def test_same_prompt_from_another_session_is_a_hit(client):
+    content = "cross-session cache probe"
+    first = client.post("/api/chat", json={"content": content, "session_id": "cache-a"}).json()
+    second = client.post("/api/chat", json={"content": content, "session_id": "cache-b"}).json()
+    assert first["cache"] == "miss"
+    assert second["cache"] == "hit"
+    # The model was told the first session's context; a hit replays that answer as is
+    assert "Session: cache-a" in first["content"]
+    assert second["content"] == first["content"]
+
+
+def test_opted_out_session_gets_an_answer_with_its_own_context(client):
+    content = "per-session context probe"
+    client.post("/api/chat", json={"content": content, "session_id": "context-a"})
+    body = {"content": content, "session_id": "context-b", "cache": False}
+    own = client.post("/api/chat", json=body).json()
+    assert own["cache"] == "bypass"
+    assert "Session: context-b" in own["content"]
+    assert "context-a" not in own["content"]
+
+
+def test_concurrent_identical_requests_share_one_model_call():
+    cache = ResponseCache()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        for chunk in ("one ", "two ", "three"):
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    async def collect(chunks):
+        return "".join([chunk async for chunk in chunks])
+
+    async def main():
+        opened = [cache.open("key", generate, f"session-{i}") for i in range(3)]
+        texts = await asyncio.gather(*(collect(chunks) for _, chunks in opened))
+        outcome, chunks = cache.open("key", generate, "session-late")
+        return [outcome for outcome, _ in opened], texts, outcome, await collect(chunks)
+
+    outcomes, texts, late_outcome, late_text = asyncio.run(main())
+    assert outcomes == ["miss", "coalesced", "coalesced"]
+    assert texts == ["one two three"] * 3
+    assert (late_outcome, late_text) == ("hit", "one two three")
+    assert len(calls) == 1
+    assert cache.stats()["in_flight"] == 0
@@ -0,0 +1,172 @@
+"""
+Tests for the sandbox reaper: activity kept in the shared store, hibernation and wake
+Two managers over one store stand in for two processes serving the same sandboxes
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from sandbox_lifecycle import SandboxLifecycleManager
+from sandbox_scheduler import Host, SandboxScheduler
+from session_store import MemorySessionStore, RedisSessionStore
+
+
+def setup(**options):
+    store = MemorySessionStore("sandbox")
+    scheduler = SandboxScheduler([Host("local", 8, 16)])
+    options = {"idle_ttl": 60, "hibernated_ttl": 600, "max_lifetime": 3600,
+               "activity": MemorySessionStore("sandbox_activity"), **options}
+    return store, scheduler, SandboxLifecycleManager(store, scheduler, **options)
+
+
+async def provision(store, scheduler, sandbox_id, created_ago=120):
+    reservation = await scheduler.reserve(2, 4)
+    host = await scheduler.bind(reservation, sandbox_id, f"session-{sandbox_id}")
+    created = datetime.now() - timedelta(seconds=created_ago)
+    sandbox = {"id": sandbox_id, "status": "running", "host": host,
+               "config": {"cpu": 2, "memory": 4}, "created_at": created.isoformat()}
+    await store.set(sandbox_id, sandbox)
+    return sandbox
+
+
+def test_activity_recorded_by_another_process_keeps_the_sandbox_awake():
+    store, scheduler, reaper = setup()
+    other_worker = SandboxLifecycleManager(store, scheduler, idle_ttl=60, activity=reaper.activity)
+
+    async def main():
+        await provision(store, scheduler, "used")
+        await provision(store, scheduler, "idle")
+        await other_worker.touch("used")
+        actions = await reaper.sweep()
+        placement = await scheduler.host_of("idle"), await scheduler.sandbox_for("session-idle")
+        return actions, await store.get("used"), await store.get("idle"), placement
+
+    actions, used, idle, (host, pinned) = asyncio.run(main())
+    assert actions == {"hibernate": 1, "destroy": 0}
+    assert used["status"] == "running"
+    assert idle["status"] == "hibernated"
+    assert host is None
+    # The session pin survives hibernation so the next request wakes the same sandbox
+    assert pinned == "idle"
+
+
+def test_touch_writes_activity_at_most_once_per_interval_and_never_the_record():
+    store, _, manager = setup(touch_interval=30)
+    writes = []
+
+    def counting(target, name):
+        set_value = target.set
+
+        async def counting_set(key, value):
+            writes.append((name, key))
+            await set_value(key, value)
+        target.set = counting_set
+
+    async def main():
+        await store.set("sandbox-1", {"id": "sandbox-1"})
+        counting(store, "record")
+        counting(manager.activity, "activity")
+        for _ in range(5):
+            await manager.touch("sandbox-1")
+        return await store.get("sandbox-1"), await manager.activity.get("sandbox-1")
+
+    sandbox, last_active = asyncio.run(main())
+    assert writes == [("activity", "sandbox-1")]
+    assert sandbox == {"id": "sandbox-1"}
+    assert time.time() - last_active < 5
+
+
+def test_touch_racing_a_hibernate_in_another_process_keeps_the_new_status():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+
+    def redis_store(namespace):
+        client = fakeredis.FakeAsyncRedis(server=server)
+        return RedisSessionStore(client, namespace, purge_interval=0)
+
+    store, worker_store = redis_store("sandbox"), redis_store("sandbox")
+    scheduler = SandboxScheduler([Host("local", 8, 16)])
+    worker = SandboxLifecycleManager(worker_store, scheduler, idle_ttl=60,
+                                     activity=redis_store("activity"))
+    touches = []
+    read = worker_store.get
+
+    async def slow_read(key):
+        # A read-modify-write of the record would write back after the hibernate landed
+        value = await read(key)
+        await asyncio.sleep(0.05)
+        return value
+
+    async def pause(sandbox, action):
+        # The request arrives after the reaper's last check, while it pauses the sandbox
+        touches.append(asyncio.create_task(worker.touch(sandbox["id"])))
+        await asyncio.sleep(0.01)
+
+    worker_store.get = slow_read
+    reaper = SandboxLifecycleManager(store, scheduler, idle_ttl=60, control=pause,
+                                     activity=redis_store("activity"))
+
+    async def main():
+        sandbox = await provision(store, scheduler, "racy")
+        applied = await reaper._apply(sandbox, "hibernate", "idle_ttl")
+        await asyncio.gather(*touches)
+        await asyncio.sleep(0.1)
+        return applied, await store.get("racy"), await worker.activity.get("racy")
+
+    applied, stored, last_active = asyncio.run(main())
+    assert applied
+    # A touch never rewrites the record, so it cannot put the old status back
+    assert stored["status"] == "hibernated" and stored["host"] is None
+    assert time.time() - last_active < 5
+
+
+def test_sandbox_used_after_the_scan_is_left_alone():
+    store, scheduler, reaper = setup()
+
+    async def main():
+        sandbox = await provision(store, scheduler, "racy")
+        # The scan saw it idle; a request lands before the action is applied
+        await reaper.touch("racy")
+        applied = await reaper._apply(sandbox, "hibernate", "idle_ttl")
+        return applied, await store.get("racy")
+
+    applied, sandbox = asyncio.run(main())
+    assert not applied
+    assert sandbox["status"] == "running"
+
+
+def test_wake_places_a_hibernated_sandbox_and_marks_it_active():
+    store, scheduler, reaper = setup()
+
+    async def main():
+        await provision(store, scheduler, "sleepy")
+        await reaper.sweep()
+        hibernated = await store.get("sleepy")
+        woken = await reaper.wake(hibernated)
+        return woken, await store.get("sleepy"), await scheduler.host_of("sleepy")
+
+    woken, stored, host = asyncio.run(main())
+    assert woken["status"] == stored["status"] == "running"
+    assert stored["host"] == host == "local"
+    assert reaper.idle_for(stored) < 5
+    assert reaper.stats()["woken"] == 1
+
+
+def test_expired_and_long_hibernated_sandboxes_are_destroyed():
+    store, scheduler, reaper = setup()
+
+    async def main():
+        await provision(store, scheduler, "old", created_ago=7200)
+        sleepy = await provision(store, scheduler, "sleepy")
+        long_ago = time.time() - 1000
+        await store.set("sleepy", {**sleepy, "status": "hibernated", "last_active": long_ago})
+        await scheduler.release("sleepy", unpin=False)
+        return await reaper.sweep(), await store.size()
+
+    actions, remaining = asyncio.run(main())
+    assert actions == {"hibernate": 0, "destroy": 2}
+    assert remaining == 0
+    assert reaper.stats()["expired"] == 1
@@ -0,0 +1,165 @@
+"""Warm sandbox pool: hits, misses, shape limits and teardown of unused sandboxes"""
+
+import asyncio
+
+import pytest
+
+from sandbox_pool import SandboxPool
+from sandbox_scheduler import Host, RedisPlacementStore, SandboxScheduler
+
+DEFAULT = {"memory": 4, "cpu": 2}
+
+
+def make_pool(**kwargs):
+    booted, killed = [], []
+
+    async def boot(config):
+        sandbox = {"id": f"sb-{len(booted)}", "config": config}
+        booted.append(sandbox)
+        return sandbox
+
+    async def teardown(sandbox):
+        killed.append(sandbox["id"])
+
+    kwargs.setdefault("refill_interval", 0.01)
+    return SandboxPool(boot=boot, teardown=teardown, **kwargs), booted, killed
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_warm_shape_is_a_hit_and_unwarmed_shape_a_miss():
+    async def run():
+        pool, booted, _ = make_pool(size=2)
+        pool.register_shape(DEFAULT)
+        await pool.start()
+        await asyncio.sleep(0.05)
+
+        sandbox = await pool.acquire(DEFAULT)
+        assert sandbox["config"] == DEFAULT and "assigned_at" in sandbox
+        await pool.acquire({"memory": 8, "cpu": 4})
+        await pool.stop()
+        return pool.stats()
+
+    stats = asyncio.run(run())
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_auto_registered_shapes_are_capped_and_torn_down():
+    async def run():
+        pool, _, killed = make_pool(size=1, max_shapes=2)
+        pool.register_shape(DEFAULT)
+        await pool.start()
+        for memory in (8, 16, 32):
+            await pool.acquire({"memory": memory, "cpu": 2})
+            await asyncio.sleep(0.05)
+        shapes = pool.stats()["shapes"]
+        await pool.stop()
+        return shapes, killed, pool.stats()
+
+    shapes, killed, stats = asyncio.run(run())
+    # The pinned default plus the two most recently requested shapes
+    assert shapes == 3
+    assert stats["warm"] == 0
+    # The dropped shape's warm sandbox plus everything still warm at stop is torn down
+    assert stats["teardowns"] == len(killed) == 4
+
+
+def test_max_shapes_zero_warms_only_registered_shapes():
+    async def run():
+        pool, _, _ = make_pool(size=1, max_shapes=0)
+        await pool.acquire({"memory": 8, "cpu": 2})
+        return pool.stats()
+
+    assert asyncio.run(run())["shapes"] == 0
+
+
+def test_idle_warm_sandboxes_are_evicted_and_torn_down():
+    async def run():
+        pool, _, killed = make_pool(size=1, max_idle=0.02)
+        pool.register_shape(DEFAULT)
+        pool._refill()
+        await settle()
+        await asyncio.sleep(0.03)
+        pool._evict_idle()
+        await settle()
+        return pool.stats(), killed
+
+    stats, killed = asyncio.run(run())
+    assert stats["evictions"] == 1
+    assert killed == ["sb-0"]
+
+
+def test_warm_sandboxes_hold_scheduler_capacity():
+    async def run():
+        scheduler = SandboxScheduler([Host("local", 6, 12)])
+        pool, booted, killed = make_pool(size=2, scheduler=scheduler)
+        pool.register_shape(DEFAULT)
+        pool._refill()
+        await settle()
+        warm = await scheduler.stats()
+        # Two warm 2-CPU sandboxes leave room for exactly one more
+        first = await scheduler.try_reserve(2, 4)
+        second = await scheduler.try_reserve(2, 4)
+        # A pool hit is already placed; shedding the other warm sandbox frees its share
+        hit = pool.take(DEFAULT)
+        shed = await pool.shed()
+        third = await scheduler.try_reserve(2, 4)
+        hit_host = await scheduler.host_of(hit["id"])
+        await pool.stop()
+        return warm, first, second, shed, third, hit_host, killed, await scheduler.stats()
+
+    warm, first, second, shed, third, hit_host, killed, after = asyncio.run(run())
+    assert warm["hosts"]["local"]["cpu_used"] == 4 and warm["sandboxes"] == 2
+    assert first is not None and second is None
+    assert shed and third is not None
+    assert hit_host == "local"
+    assert killed == ["sb-1"]
+    # The handed-out sandbox and the two reservations are all that is left
+    assert after["hosts"]["local"]["cpu_used"] == 6
+
+
+def test_pool_does_not_warm_past_free_capacity():
+    async def run():
+        scheduler = SandboxScheduler([Host("local", 2, 4)])
+        pool, booted, _ = make_pool(size=3, scheduler=scheduler)
+        pool.register_shape(DEFAULT)
+        pool._refill()
+        await settle()
+        return booted, pool.stats()
+
+    booted, stats = asyncio.run(run())
+    assert len(booted) == 1
+    assert stats["capacity_skips"] == 2
+
+
+def test_request_queued_in_another_worker_makes_warm_pools_shed():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+
+    def worker():
+        store = RedisPlacementStore(fakeredis.FakeAsyncRedis(server=server))
+        return SandboxScheduler([Host("local", 2, 4)], store=store, poll_interval=0.02)
+
+    async def run():
+        holder, requester = worker(), worker()
+        pool, _, killed = make_pool(size=1, scheduler=holder)
+        pool.register_shape(DEFAULT)
+        pool._refill()
+        await settle()
+        # The only slot is warm in the first worker's pool; the second worker queues for it
+        waiter = asyncio.create_task(requester.reserve(2, 4, timeout=2))
+        await asyncio.sleep(0.05)
+        await pool.start()
+        reservation = await waiter
+        await pool.stop()
+        return reservation, killed, pool.stats()
+
+    reservation, killed, stats = asyncio.run(run())
+    assert reservation is not None
+    assert killed == ["sb-0"]
+    assert stats["shed"] == 1
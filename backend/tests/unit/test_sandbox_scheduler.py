@@ -0,0 +1,230 @@
+"""
+Tests for sandbox placement: packing, queueing, rejections, and budgets shared by several workers
+"""
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from sandbox_scheduler import (
+    Host,
+    MemoryPlacementStore,
+    RedisPlacementStore,
+    SandboxNeverFits,
+    SandboxScheduler,
+    SchedulerSaturated,
+    create_sandbox_scheduler,
+)
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "app")
+
+
+def scheduler(policy="best_fit", **options):
+    return SandboxScheduler([Host("big", 16, 64), Host("small", 4, 16)], policy=policy, **options)
+
+
+def workers_on(server, count, hosts=(("only", 4, 8),), **options):
+    """Schedulers with their own Redis clients on one server, as separate workers would have"""
+    fakeredis = pytest.importorskip("fakeredis")
+    return [
+        SandboxScheduler([Host(*host) for host in hosts],
+                         store=RedisPlacementStore(fakeredis.FakeAsyncRedis(server=server)),
+                         **options)
+        for _ in range(count)
+    ]
+
+
+def test_best_fit_packs_the_tightest_host_and_worst_fit_spreads():
+    assert scheduler("best_fit").place(2, 4).name == "small"
+    assert scheduler("worst_fit").place(2, 4).name == "big"
+
+
+def test_bind_pins_the_session_and_release_unpins():
+    placement = scheduler()
+
+    async def main():
+        reservation = await placement.reserve(2, 4)
+        host = await placement.bind(reservation, "sandbox-1", "session-1")
+        pinned = await placement.sandbox_for("session-1")
+        released = await placement.release("sandbox-1")
+        return host, pinned, released, await placement.sandbox_for("session-1")
+
+    host, pinned, released, unpinned = asyncio.run(main())
+    assert host == "small"
+    assert pinned == "sandbox-1"
+    assert released and unpinned is None
+    assert placement.hosts["small"].cpu_used == 0
+
+
+def test_request_larger_than_every_host_is_rejected_without_queueing():
+    placement = scheduler()
+
+    with pytest.raises(SandboxNeverFits):
+        asyncio.run(placement.reserve(32, 4))
+    assert placement.rejections == 1
+    assert placement.queued == 0
+
+
+def test_full_cluster_queues_until_release():
+    placement = SandboxScheduler([Host("only", 4, 8)])
+
+    async def main():
+        first = await placement.reserve(4, 8)
+        waiter = asyncio.create_task(placement.reserve(2, 4))
+        await asyncio.sleep(0)
+        assert (await placement.stats())["waiting"] == 1
+        await placement.release(first)
+        reservation = await waiter
+        return await placement.host_of(reservation), await placement.stats()
+
+    host, stats = asyncio.run(main())
+    assert host == "only"
+    assert stats["queued"] == 1
+
+
+def test_full_queue_and_wait_timeout_are_saturation():
+    placement = SandboxScheduler([Host("only", 4, 8)], queue_size=1, queue_timeout=0.05)
+
+    async def main():
+        await placement.reserve(4, 8)
+        waiter = asyncio.create_task(placement.reserve(1, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerSaturated):
+            await placement.reserve(1, 1)
+        with pytest.raises(SchedulerSaturated):
+            await waiter
+
+    asyncio.run(main())
+    assert placement.timeouts == 1
+
+
+def test_memory_and_redis_stores_place_identically():
+    fakeredis = pytest.importorskip("fakeredis")
+    hosts = [("a", 8, 16), ("b", 4, 32), ("c", 16, 16)]
+    shapes = [(2, 4), (4, 8), (1, 16), (2, 2), (8, 8), (4, 4), (1, 1)]
+
+    async def run(store):
+        placement = SandboxScheduler([Host(*host) for host in hosts], store=store)
+        placed = []
+        for i, (cpu, memory) in enumerate(shapes):
+            reservation = await placement.try_reserve(cpu, memory)
+            placed.append(reservation and await placement.bind(reservation, f"sb-{i}"))
+        await placement.release("sb-1")
+        return placed, (await placement.stats())["hosts"]
+
+    memory = asyncio.run(run(MemoryPlacementStore()))
+    redis = asyncio.run(run(RedisPlacementStore(fakeredis.FakeAsyncRedis())))
+    assert memory == redis
+
+
+def test_workers_sharing_redis_never_overcommit_a_host():
+    fakeredis = pytest.importorskip("fakeredis")
+    workers = workers_on(fakeredis.FakeServer(), 4)
+
+    async def main():
+        # Every worker races for the same 4 CPU; only four 1-CPU claims can win
+        attempts = [worker.try_reserve(1, 1) for worker in workers for _ in range(3)]
+        granted = [r for r in await asyncio.gather(*attempts) if r is not None]
+        return granted, await workers[0].stats()
+
+    granted, stats = asyncio.run(main())
+    assert len(granted) == 4
+    assert stats["hosts"]["only"]["cpu_used"] == 4
+    assert stats["sandboxes"] == 4
+
+
+def test_pins_and_releases_are_visible_to_every_worker():
+    fakeredis = pytest.importorskip("fakeredis")
+    first, second = workers_on(fakeredis.FakeServer(), 2, poll_interval=0.02)
+
+    async def main():
+        held = await first.reserve(4, 8)
+        await first.bind(held, "sandbox-1", "session-1")
+        pinned = await second.sandbox_for("session-1")
+        # The second worker queues; the first worker's release reaches it through the store
+        waiter = asyncio.create_task(second.reserve(2, 2, timeout=2))
+        await asyncio.sleep(0.05)
+        waiting = (await second.stats())["waiting"]
+        await first.release("sandbox-1")
+        reservation = await waiter
+        return pinned, waiting, await second.sandbox_for("session-1"), await first.host_of(
+            reservation
+        )
+
+    pinned, waiting, unpinned, host = asyncio.run(main())
+    assert pinned == "sandbox-1"
+    assert waiting == 1
+    assert unpinned is None
+    assert host == "only"
+
+
+def claim_in_process(redis_url, attempts, results):
+    """Worker process body: race for 1-CPU slots on a shared host"""
+    import redis.asyncio as redis
+
+    async def main():
+        store = RedisPlacementStore(redis.from_url(redis_url))
+        placement = SandboxScheduler([Host("only", 6, 64)], store=store)
+        granted = [await placement.try_reserve(1, 1) for _ in range(attempts)]
+        await store.client.aclose()
+        return sum(r is not None for r in granted)
+
+    results.put(asyncio.run(main()))
+
+
+def test_worker_processes_share_one_budget():
+    fakeredis = pytest.importorskip("fakeredis")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=claim_in_process,
+                        args=(f"redis://127.0.0.1:{port}/0", 5, results))
+        for _ in range(4)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        granted = [results.get(timeout=30) for _ in processes]
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+        server.shutdown()
+        server.server_close()
+
+    # 20 attempts across 4 processes, 6 slots
+    assert sum(granted) == 6
+
+
+def test_several_workers_and_redis_are_accepted(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    monkeypatch.setenv("SESSION_STORE_BACKEND", "redis")
+    pytest.importorskip("redis")
+    assert isinstance(create_sandbox_scheduler().store, RedisPlacementStore)
+    monkeypatch.setenv("SESSION_STORE_BACKEND", "memory")
+    assert isinstance(create_sandbox_scheduler().store, MemoryPlacementStore)
+
+
+def test_main_imports_with_several_workers_and_redis():
+    env = {**os.environ, "WEB_CONCURRENCY": "4", "SESSION_STORE_BACKEND": "redis",
+           "SANDBOX_POOL_SIZE": "0"}
+    # Redis clients connect lazily, so importing needs no server
+    result = subprocess.run([sys.executable, "-c", "import main"], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+
+def test_api_rejects_a_sandbox_no_host_can_fit(client):
+    response = client.post("/api/sandbox", json={"action": "create", "config": {"cpu": 10000}})
+    assert response.status_code == 400
+    assert "can ever fit" in response.json()["detail"]
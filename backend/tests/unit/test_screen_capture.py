@@ -0,0 +1,90 @@
+"""
+Tests for screenshot frame diffing and the capture pipeline's counters
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+
+from screen_capture import (  # noqa: E402
+    DeltaEncoder,
+    FrameSource,
+    ScreenshotPipeline,
+    SyntheticFrameSource,
+)
+
+
+class StaticFrameSource(FrameSource):
+    """The same frame forever: everything after the first frame is skipped"""
+
+    name = "static"
+
+    def __init__(self, width=256, height=128):
+        self.frame = np.full((height, width, 3), 90, dtype=np.uint8)
+
+    def capture(self):
+        return self.frame
+
+
+def test_unchanged_frames_are_skipped_and_changes_are_regions():
+    encoder = DeltaEncoder(tile_size=32, scale=1.0)
+    frame = np.zeros((128, 256, 3), dtype=np.uint8)
+
+    first = encoder.encode(frame)
+    assert first.keyframe
+    assert encoder.encode(frame) is None
+
+    changed = frame.copy()
+    changed[40:50, 70:80] = 255
+    delta = encoder.encode(changed)
+    assert not delta.keyframe
+    assert [region for region, _ in delta.regions] == [(64, 32, 32, 32)]
+
+
+def test_compression_ratio_ignores_skipped_frames():
+    source = StaticFrameSource()
+    pipeline = ScreenshotPipeline(source, tile_size=32)
+    encoder = pipeline._encoder("viewer")
+
+    pipeline.process(encoder, source.capture())
+    single = pipeline.stats()
+    for _ in range(9):
+        pipeline.process(encoder, source.capture())
+    stats = pipeline.stats()
+
+    assert stats["frames"] == 10
+    assert stats["skipped"] == 9
+    assert stats["skip_rate"] == 0.9
+    # Nine skipped frames cost nothing to send, but they must not make the
+    # one encoded frame look ten times better compressed
+    assert stats["compression_ratio"] == single["compression_ratio"]
+    assert stats["compression_ratio"] == round(source.frame.nbytes / stats["encoded_bytes"], 1)
+
+
+def test_synthetic_source_frame_numbers_survive_concurrent_capture():
+    source = SyntheticFrameSource(width=320, height=240)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: source.capture(), range(200)))
+
+    assert source.frame_number == 200
+
+
+def test_pipeline_counts_frames_across_concurrent_sessions():
+    pipeline = ScreenshotPipeline(SyntheticFrameSource(width=320, height=240), tile_size=32)
+
+    async def main():
+        sessions = [f"viewer-{i}" for i in range(4)]
+        for _ in range(5):
+            await asyncio.gather(*(pipeline.capture(session) for session in sessions))
+
+    asyncio.run(main())
+    stats = pipeline.stats()
+    assert stats["sessions"] == 4
+    assert stats["frames"] == 20
+    assert stats["keyframes"] >= 4
+    assert 0.0 <= stats["skip_rate"] < 1.0
@@ -0,0 +1,30 @@
+"""JSON serialization: same output with orjson or the stdlib fallback, pre-encoded SSE frames"""
+
+import json
+from datetime import datetime
+
+from serialization import benchmark, dumps, dumps_str, loads, sse_frame
+
+
+def test_datetimes_encode_as_iso_strings():
+    moment = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert loads(dumps({"at": moment})) == {"at": moment.isoformat()}
+
+
+def test_dumps_str_is_compact_utf8_json():
+    text = dumps_str({"text": "héllo", "n": [1, 2]})
+    assert isinstance(text, str)
+    assert json.loads(text) == {"text": "héllo", "n": [1, 2]}
+    assert " " not in text.replace("héllo", "")
+
+
+def test_sse_frame_is_a_complete_data_event():
+    frame = sse_frame({"type": "ai_response_delta", "seq": 3})
+    assert isinstance(frame, bytes)
+    assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+    assert loads(frame[len(b"data: "):]) == {"type": "ai_response_delta", "seq": 3}
+
+
+def test_benchmark_reports_both_paths():
+    result = benchmark(frames=200)
+    assert result["stdlib_frames_per_s"] > 0 and result["sse_frame_frames_per_s"] > 0
@@ -0,0 +1,102 @@
+"""Session stores: LRU and idle-TTL eviction for the memory and Redis (fakeredis) backends"""
+
+import asyncio
+
+import pytest
+
+from session_store import MemorySessionStore, RedisSessionStore
+
+BACKENDS = ("memory", "redis")
+
+
+def make_store(backend, **kwargs):
+    evicted = []
+    kwargs["on_evict"] = evicted.append
+    if backend == "memory":
+        return MemorySessionStore("test", **kwargs), evicted
+    fakeredis = pytest.importorskip("fakeredis")
+    store = RedisSessionStore(fakeredis.FakeAsyncRedis(), "test", purge_interval=0, **kwargs)
+    return store, evicted
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_round_trip_and_delete(backend):
+    async def run():
+        store, _ = make_store(backend)
+        await store.set("a", {"messages": [1, 2]})
+        value = await store.get("a")
+        deleted = await store.delete("a")
+        return value, deleted, await store.get("a"), await store.size(), store.stats()
+
+    value, deleted, missing, size, stats = asyncio.run(run())
+    assert value == {"messages": [1, 2]}
+    assert deleted and missing is None and size == 0
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_lru_evicts_least_recently_used(backend):
+    async def run():
+        store, evicted = make_store(backend, max_entries=2)
+        await store.set("a", 1)
+        await store.set("b", 2)
+        # Reading "a" makes "b" the least recently used
+        await store.get("a")
+        await store.set("c", 3)
+        return sorted(k for k, _ in await store.items()), evicted, store.stats()
+
+    keys, evicted, stats = asyncio.run(run())
+    assert keys == ["a", "c"]
+    assert evicted == ["b"]
+    assert stats["lru_evictions"] == 1
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ttl_counts_from_last_use(backend):
+    async def run():
+        store, _ = make_store(backend, ttl=0.2)
+        await store.set("idle", 1)
+        await store.set("used", 2)
+        await asyncio.sleep(0.12)
+        await store.get("used")
+        await asyncio.sleep(0.12)
+        return await store.get("idle"), await store.get("used"), await store.size(), store.stats()
+
+    idle, used, size, stats = asyncio.run(run())
+    assert idle is None
+    assert used == 2
+    assert size == 1
+    assert stats["ttl_evictions"] == 1
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ttl_expiry_reports_each_evicted_key_once(backend):
+    async def run():
+        store, evicted = make_store(backend, ttl=0.05)
+        for key in ("listed", "read"):
+            await store.set(key, key)
+        await asyncio.sleep(0.08)
+        # Expired through a read miss, then through the purge behind size()
+        missing = await store.get("read")
+        size = await store.size()
+        await store.get("read")
+        return missing, size, evicted, store.stats()
+
+    missing, size, evicted, stats = asyncio.run(run())
+    assert missing is None and size == 0
+    assert sorted(evicted) == ["listed", "read"]
+    assert stats["ttl_evictions"] == 2
+
+
+def test_memory_purge_only_touches_expired_entries():
+    async def run():
+        store, evicted = make_store("memory", ttl=0.05)
+        for key in ("a", "b"):
+            await store.set(key, key)
+        await asyncio.sleep(0.08)
+        await store.set("c", "c")
+        return await store.size(), evicted
+
+    size, evicted = asyncio.run(run())
+    assert size == 1
+    assert evicted == ["a", "b"]
@@ -0,0 +1,144 @@
+"""
+Tests for resumable SSE streams: reconnects, replay gaps, lapped readers and orphans
+Producers yield control between events instead of sleeping, so runs are repeatable
+"""
+
+import asyncio
+import json
+
+from serialization import sse_frame
+from sse_streams import StreamRegistry, simulate_reconnects
+
+
+async def produce(count, gate=None):
+    for seq in range(count):
+        if gate is not None:
+            await gate.wait()
+        await asyncio.sleep(0)
+        yield sse_frame({"seq": seq})
+
+
+def parse(frame):
+    """(event id or None, payload dict or None) of one encoded frame"""
+    event_id = None
+    payload = None
+    for line in frame.decode().splitlines():
+        if line.startswith("id: "):
+            event_id = int(line[4:])
+        elif line.startswith("data: "):
+            payload = json.loads(line[6:])
+    return event_id, payload
+
+
+async def read(registry, stream, last_event_id=None, limit=None):
+    """Payloads with their ids, stopping after ``limit`` events like a dropped connection"""
+    received = []
+    reader = registry.subscribe(stream, last_event_id)
+    try:
+        async for frame in reader:
+            event_id, payload = parse(frame)
+            if payload is None:
+                continue
+            received.append((event_id, payload))
+            if limit is not None and len(received) == limit:
+                break
+    finally:
+        await reader.aclose()
+    return received
+
+
+def test_reconnects_resume_without_duplicates_or_gaps():
+    async def main():
+        registry = StreamRegistry(replay_size=100, heartbeat_interval=0.05)
+        stream = registry.start("s", produce(60))
+        received = []
+        last_event_id = None
+        for limit in (7, 13, 29, None):
+            events = await read(registry, stream, last_event_id, limit)
+            received.extend(payload["seq"] for _, payload in events)
+            last_event_id = events[-1][0]
+        return received, registry.stats()
+
+    received, stats = asyncio.run(main())
+    assert received == list(range(60))
+    assert stats["resumes"] == 3
+    assert stats["replay_gaps"] == 0
+    assert stats["lapped_consumers"] == 0
+
+
+def test_simulated_reconnects_are_repeatable():
+    first = asyncio.run(simulate_reconnects(events=80, drops=4, seed=3))
+    second = asyncio.run(simulate_reconnects(events=80, drops=4, seed=3))
+    assert first["duplicates"] == first["missing"] == 0
+    assert first["connections"] == second["connections"] == 5
+
+
+def test_resume_past_the_replay_ring_reports_a_gap():
+    async def main():
+        registry = StreamRegistry(replay_size=4, heartbeat_interval=0.05)
+        stream = registry.start("s", produce(10))
+        await stream.producer
+        return await read(registry, stream, last_event_id=2), registry.stats()
+
+    events, stats = asyncio.run(main())
+    gap = events[0][1]
+    assert gap == {"type": "replay_gap", "last_event_id": 2, "oldest_event_id": 7}
+    assert [event_id for event_id, _ in events[1:]] == [7, 8, 9, 10]
+    assert stats["replay_gaps"] == 1
+    assert stats["events_replayed"] == 4
+
+
+def test_stalled_reader_is_lapped_and_cut_off():
+    async def main():
+        registry = StreamRegistry(replay_size=4, slow_lag=2, stall_timeout=0.01,
+                                  heartbeat_interval=0.05)
+        gate = asyncio.Event()
+        stream = registry.start("s", produce(20, gate))
+        reader = registry.subscribe(stream)
+        await reader.__anext__()  # retry: line
+        gate.set()
+        first = parse(await reader.__anext__())[1]
+        assert first == {"seq": 0}
+        # The reader takes nothing more while the producer runs to completion
+        await stream.producer
+        frames = [frame async for frame in reader]
+        return [parse(frame)[1] for frame in frames], registry.stats()
+
+    payloads, stats = asyncio.run(main())
+    assert payloads[-1]["type"] == "slow_consumer"
+    assert payloads[-1]["oldest_event_id"] == 17
+    assert stats["producer_stalls"] >= 1
+    assert stats["lapped_consumers"] == 1
+
+
+def test_attaching_reader_cancels_pending_orphan_timer():
+    async def main():
+        registry = StreamRegistry(orphan_timeout=0.2, heartbeat_interval=0.05)
+        gate = asyncio.Event()
+        stream = registry.start("s", produce(5, gate))
+
+        reader = registry.subscribe(stream)
+        await reader.__anext__()
+        await reader.aclose()
+        first_timer = stream.orphan_timer
+        assert first_timer is not None
+
+        # A reconnect shortly before the first timer would fire
+        await asyncio.sleep(0.15)
+        reader = registry.subscribe(stream)
+        await reader.__anext__()
+        assert first_timer.cancelled()
+        assert stream.orphan_timer is None
+        await reader.aclose()
+
+        # The first departure's deadline passes; only 0.1s orphaned since
+        await asyncio.sleep(0.1)
+        assert not stream.producer.done()
+
+        await asyncio.sleep(0.2)
+        return stream, registry.stats()
+
+    stream, stats = asyncio.run(main())
+    assert stream.done
+    assert stream.next_id == 1
+    assert stats["orphans_cancelled"] == 1
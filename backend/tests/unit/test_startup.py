@@ -0,0 +1,31 @@
+"""
+Cold-start budget for the backend
+Runs features.benchmark_startup, which imports main and serves /health in
+fresh processes, so modules imported by other tests do not count
+"""
+
+import os
+
+import pytest
+
+import features
+
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "3000"))
+HEALTH_BUDGET_MS = float(os.getenv("STARTUP_HEALTH_BUDGET_MS", "8000"))
+
+
+@pytest.fixture(scope="module")
+def startup(app_env):
+    return features.benchmark_startup()
+
+
+def test_import_main_loads_no_heavy_modules(startup):
+    assert startup["heavy"] == []
+
+
+def test_import_within_budget(startup):
+    assert startup["import_ms"] <= IMPORT_BUDGET_MS
+
+
+def test_first_health_within_budget(startup):
+    assert startup["first_health_ms"] <= HEALTH_BUDGET_MS
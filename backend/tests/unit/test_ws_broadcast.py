@@ -0,0 +1,190 @@
+"""WebSocket fan-out: slow clients never stall a broadcast; overflow policies apply per client"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from ws_broadcast import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records frames; a slow socket blocks every send until ``release`` is set
+
+    With ``delay`` every send takes that long instead, like a client on a
+    slow link. Arrival times are kept for latency checks.
+    """
+
+    def __init__(self, slow: bool = False, delay: float = 0.0):
+        self.frames = []
+        self.arrivals = []
+        self.closed_with = None
+        self.delay = delay
+        self.release = asyncio.Event()
+        if not slow:
+            self.release.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        await self.release.wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames.append(frame)
+        self.arrivals.append(time.perf_counter())
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def connect_all(manager, sockets):
+    return [await manager.connect(ws) for ws in sockets]
+
+
+def test_slow_client_does_not_stall_fast_clients():
+    async def run():
+        manager = ConnectionManager(queue_size=4, overflow_policy="drop_oldest")
+        fast = [FakeWebSocket() for _ in range(50)]
+        slow = FakeWebSocket(slow=True)
+        clients = await connect_all(manager, fast + [slow])
+
+        for i in range(10):
+            assert manager.broadcast({"n": i}) == len(clients)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+
+        stats = manager.stats()
+        slow.release.set()
+        await asyncio.sleep(0.01)
+        for client in clients:
+            await manager.disconnect(client)
+        return fast, slow, stats
+
+    fast, slow, stats = asyncio.run(run())
+    assert all(len(ws.frames) == 10 for ws in fast)
+    # The slow client keeps only the newest frames its queue can hold
+    assert stats["frames_dropped"] > 0
+    assert slow.frames[-1] == '{"n":9}'
+    assert len(slow.frames) < 10
+
+
+def test_broadcast_serializes_once_for_all_clients():
+    async def run():
+        manager = ConnectionManager(queue_size=8)
+        sockets = [FakeWebSocket(slow=True) for _ in range(3)]
+        clients = await connect_all(manager, sockets)
+        manager.broadcast({"type": "chat", "text": "hi"})
+        frames = [client.queue.get_nowait() for client in clients]
+        for client in clients:
+            await manager.disconnect(client)
+        return frames
+
+    frames = asyncio.run(run())
+    assert all(frame is frames[0] for frame in frames)
+
+
+def test_drop_newest_keeps_queued_frames():
+    async def run():
+        manager = ConnectionManager(queue_size=2, overflow_policy="drop_newest")
+        slow = FakeWebSocket(slow=True)
+        (client,) = await connect_all(manager, [slow])
+        delivered = [manager.broadcast({"n": 0})]
+        await asyncio.sleep(0)
+        # The writer holds the first frame in send_text; two more fill the queue
+        delivered += [manager.broadcast({"n": i}) for i in range(1, 5)]
+        slow.release.set()
+        await asyncio.sleep(0.01)
+        await manager.disconnect(client)
+        return delivered, slow.frames
+
+    delivered, frames = asyncio.run(run())
+    assert delivered == [1, 1, 1, 0, 0]
+    assert frames == ['{"n":0}', '{"n":1}', '{"n":2}']
+
+
+def test_disconnect_policy_closes_slow_client_in_background():
+    async def run():
+        manager = ConnectionManager(queue_size=1, overflow_policy="disconnect")
+        fast, slow = FakeWebSocket(), FakeWebSocket(slow=True)
+        await connect_all(manager, [fast, slow])
+        closing = 0
+        for i in range(3):
+            manager.broadcast({"n": i})
+            # The close task is referenced by the manager until it finishes
+            closing = max(closing, len(manager._closing))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        return manager, fast, slow, closing
+
+    manager, fast, slow, closing = asyncio.run(run())
+    assert closing == 1
+    assert not manager._closing
+    assert slow.closed_with == 1013
+    assert manager.stats()["slow_disconnects"] == 1
+    assert len(manager) == 1
+    assert len(fast.frames) == 3
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "drop_newest", "disconnect"])
+def test_hundreds_of_clients_with_slow_quarter(policy):
+    fast_count, slow_count, messages, queue_size = 300, 100, 40, 8
+
+    async def run():
+        manager = ConnectionManager(queue_size=queue_size, overflow_policy=policy)
+        fast = [FakeWebSocket() for _ in range(fast_count)]
+        # A broadcast that waited on these would take 40 x 50ms
+        slow = [FakeWebSocket(delay=0.05) for _ in range(slow_count)]
+        sockets = fast + slow
+        clients = await connect_all(manager, sockets)
+        sent = []
+        for n in range(messages):
+            sent.append(time.perf_counter())
+            manager.broadcast({"n": n})
+            await asyncio.sleep(0.002)
+        # Long enough for every fast client and any slow queue to drain
+        await asyncio.sleep(0.05 * (queue_size + 2))
+        stats = manager.stats()
+        connected = set(map(id, manager.clients))
+        for client in clients:
+            await manager.disconnect(client)
+        return fast, slow, clients, sent, stats, connected
+
+    fast, slow, clients, sent, stats, connected = asyncio.run(run())
+    fast_clients, slow_clients = clients[:fast_count], clients[fast_count:]
+
+    # Fast clients get everything, in order, with a bounded delay, whatever the slow ones do
+    latencies = []
+    for ws in fast:
+        assert [json.loads(frame)["n"] for frame in ws.frames] == list(range(messages))
+        latencies += [arrived - sent[n] for n, arrived in enumerate(ws.arrivals)]
+    latencies.sort()
+    assert latencies[int(len(latencies) * 0.99)] < 0.1
+    assert latencies[-1] < 0.25
+    assert all(client.dropped == 0 and id(client) in connected for client in fast_clients)
+    assert all(ws.closed_with is None for ws in fast)
+
+    received = [[json.loads(frame)["n"] for frame in ws.frames] for ws in slow]
+    if policy == "disconnect":
+        assert stats["slow_disconnects"] == slow_count
+        assert stats["connections"] == fast_count
+        assert all(ws.closed_with == 1013 for ws in slow)
+        assert all(len(frames) < messages for frames in received)
+    else:
+        assert stats["slow_disconnects"] == 0
+        assert stats["frames_dropped"] == sum(client.dropped for client in slow_clients)
+        assert all(client.dropped > 0 and id(client) in connected for client in slow_clients)
+        for frames in received:
+            assert frames == sorted(frames) and len(frames) < messages
+            if policy == "drop_oldest":
+                # Old frames made way: the newest one always arrives
+                assert frames[-1] == messages - 1
+            else:
+                # Nothing is refused until the queue (plus the frame in flight) is full
+                assert frames[:queue_size + 1] == list(range(queue_size + 1))
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ConnectionManager(overflow_policy="block")
@@ -0,0 +1,188 @@
+"""
+Result cache for idempotent MCP tool calls
+Repeated searches and repository reads are answered from memory, and
+identical calls in flight at the same time share one gateway request
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tool -> seconds a result stays fresh; tools not listed are never cached
+DEFAULT_TTLS = {"exa": 600.0, "github": 120.0}
+
+# Actions starting with one of these only read, so their results can be reused
+READ_ONLY_PREFIXES = ("search", "find", "get", "list", "read", "fetch", "extract")
+
+# (status code, JSON body, extra headers)
+ToolResult = Tuple[int, Any, Dict[str, str]]
+
+
+def normalize(value: Any) -> Any:
+    """Canonical form of call arguments: no None values, trimmed strings"""
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def cache_key(tool: str, action: str, parameters: Optional[Dict[str, Any]]) -> str:
+    args = json.dumps(normalize(parameters or {}), sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(args.encode()).hexdigest()
+    return f"{tool}:{action.strip().lower()}:{digest}"
+
+
+class ToolResultCache:
+    """LRU of successful tool results with per-tool TTLs and single-flight loads"""
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 1000,
+                 read_only_prefixes: Tuple[str, ...] = READ_ONLY_PREFIXES):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.read_only_prefixes = read_only_prefixes
+        # key -> (expires_at, result)
+        self._entries: "OrderedDict[str, Tuple[float, ToolResult]]" = OrderedDict()
+        self._in_flight: Dict[str, "asyncio.Task[ToolResult]"] = {}
+        self._tasks: Set["asyncio.Task[ToolResult]"] = set()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def cacheable(self, tool: str, action: str) -> bool:
+        return self.ttls.get(tool, 0) > 0 and action.strip().lower().startswith(self.read_only_prefixes)
+
+    def _count(self, tool: str, outcome: str) -> None:
+        counters = self._counters.setdefault(
+            tool, {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "evictions": 0, "expirations": 0}
+        )
+        counters[outcome] += 1
+
+    async def get_or_call(
+        self,
+        tool: str,
+        action: str,
+        parameters: Optional[Dict[str, Any]],
+        call: Callable[[], Awaitable[ToolResult]],
+        bypass: bool = False,
+    ) -> Tuple[ToolResult, str]:
+        """Result for the call and how it was served: hit, miss, coalesced, bypass or uncacheable"""
+        if not self.cacheable(tool, action):
+            return await call(), "uncacheable"
+
+        key = cache_key(tool, action, parameters)
+        if bypass:
+            # A bypass skips the lookup but still refreshes the entry
+            self._count(tool, "bypassed")
+        else:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._count(tool, "hits")
+                    return entry[1], "hit"
+                del self._entries[key]
+                self._count(tool, "expirations")
+
+            pending = self._in_flight.get(key)
+            if pending is not None:
+                self._count(tool, "coalesced")
+                return await asyncio.shield(pending), "coalesced"
+            self._count(tool, "misses")
+
+        # The gateway call runs in its own task: a caller that disconnects
+        # stops waiting, but the call carries on for everyone else and still
+        # fills the cache
+        task = asyncio.get_running_loop().create_task(self._load(tool, key, call))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._loaded(key, done))
+        if not bypass:
+            self._in_flight[key] = task
+        return await asyncio.shield(task), "bypass" if bypass else "miss"
+
+    async def _load(
+        self, tool: str, key: str, call: Callable[[], Awaitable[ToolResult]]
+    ) -> ToolResult:
+        result = await call()
+        if 200 <= result[0] < 300:
+            self._store(tool, key, result)
+        return result
+
+    def _loaded(self, key: str, task: "asyncio.Task[ToolResult]") -> None:
+        # A done callback rather than a finally, so a task cancelled before
+        # it ever ran is cleared too
+        self._tasks.discard(task)
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark retrieved: every waiter may have gone before a failure landed
+            task.exception()
+
+    def _store(self, tool: str, key: str, result: ToolResult) -> None:
+        self._entries[key] = (time.monotonic() + self.ttls[tool], result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._count(evicted.split(":", 1)[0], "evictions")
+
+    def invalidate(self, tool: Optional[str] = None) -> int:
+        """Drop every entry, or only one tool's"""
+        if tool is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+        keys = [key for key in self._entries if key.startswith(f"{tool}:")]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        totals = {"hits": 0, "misses": 0, "coalesced": 0}
+        tools = {}
+        for tool, counters in self._counters.items():
+            lookups = counters["hits"] + counters["misses"] + counters["coalesced"]
+            tools[tool] = {
+                **counters,
+                "ttl": self.ttls.get(tool, 0),
+                # Coalesced calls were served without their own gateway request
+                "hit_ratio": round((counters["hits"] + counters["coalesced"]) / lookups, 3) if lookups else 0.0,
+            }
+            for name in totals:
+                totals[name] += counters[name]
+        lookups = sum(totals.values())
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._in_flight),
+            "hit_ratio": round((totals["hits"] + totals["coalesced"]) / lookups, 3) if lookups else 0.0,
+            "tools": tools,
+        }
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """"exa=600,github=120" -> {"exa": 600.0, "github": 120.0}"""
+    ttls = {}
+    for part in spec.split(","):
+        if "=" in part:
+            tool, ttl = part.split("=", 1)
+            ttls[tool.strip()] = float(ttl)
+    return ttls
+
+
+def create_tool_cache() -> ToolResultCache:
+    spec = os.getenv("MCP_CACHE_TTLS")
+    return ToolResultCache(
+        ttls=parse_ttls(spec) if spec is not None else None,
+        max_entries=int(os.getenv("MCP_CACHE_MAX_ENTRIES", "1000")),
+    )
@@ -0,0 +1,288 @@
+"""
+MCP gateway client with per-tool circuit breakers and adaptive timeouts
+A slow or failing tool backend fails fast instead of holding every caller
+for the gateway's full timeout
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a tool whose breaker is open"""
+
+    def __init__(self, tool: str, retry_after: float):
+        super().__init__(f"Circuit open for {tool}, retry in {retry_after:.1f}s")
+        self.tool = tool
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Rolling-window breaker for one tool
+
+    Trips when at least ``min_requests`` of the calls in the last
+    ``window`` seconds (at most ``max_calls`` of them) failed at
+    ``error_rate`` or more. After ``cooldown`` seconds it lets
+    ``half_open_trials`` calls through; if they all succeed it closes,
+    and any failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 30.0,
+        max_calls: int = 20,
+        min_requests: int = 3,
+        error_rate: float = 0.5,
+        cooldown: float = 15.0,
+        half_open_trials: int = 1,
+    ):
+        self.name = name
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.half_open_trials = half_open_trials
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._calls: Deque[Tuple[float, bool]] = deque(maxlen=max_calls)
+        self._trials_in_flight = 0
+        self._trial_successes = 0
+
+    def _trim(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def current_error_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+
+    def retry_after(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; half-open trials are reserved here"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._trials_in_flight = 0
+            self._trial_successes = 0
+            logger.info(f"Circuit for {self.name} half-open")
+
+        if self.state == HALF_OPEN:
+            if self._trials_in_flight >= self.half_open_trials:
+                self.rejected += 1
+                return False
+            self._trials_in_flight += 1
+        return True
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+
+        if self.state == HALF_OPEN:
+            self._trials_in_flight = max(0, self._trials_in_flight - 1)
+            if not ok:
+                self._open(now)
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_trials:
+                self.state = CLOSED
+                self._calls.clear()
+                logger.info(f"Circuit for {self.name} closed")
+            return
+
+        self._calls.append((now, ok))
+        self._trim(now)
+        if self.state == CLOSED and len(self._calls) >= self.min_requests:
+            failures = sum(1 for _, call_ok in self._calls if not call_ok)
+            if failures / len(self._calls) >= self.error_rate:
+                self._open(now)
+
+    def abandon(self) -> None:
+        """A call was cancelled before it produced a result"""
+        if self.state == HALF_OPEN:
+            self._trials_in_flight = max(0, self._trials_in_flight - 1)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        logger.warning(f"Circuit for {self.name} opened")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "error_rate": round(self.current_error_rate(), 3),
+            "calls_in_window": len(self._calls),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1),
+        }
+
+
+class AdaptiveTimeout:
+    """Timeout derived from recent latency: p99 times ``multiplier``, clamped
+
+    Until ``min_samples`` calls have been seen the ceiling is used, so a
+    cold tool is never cut off early.
+    """
+
+    def __init__(self, floor: float, ceiling: float, multiplier: float = 3.0,
+                 size: int = 200, min_samples: int = 20):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p99(self) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(int(0.99 * len(ordered)), len(ordered) - 1)]
+
+    def timeout(self) -> float:
+        if len(self._samples) < self.min_samples:
+            return self.ceiling
+        return min(self.ceiling, max(self.floor, self.p99() * self.multiplier))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self._samples),
+            "p99_ms": round(self.p99() * 1000, 2),
+            "timeout_s": round(self.timeout(), 3),
+        }
+
+
+class MCPToolClient:
+    """Calls gateway tool endpoints through each tool's breaker
+
+    5xx responses, timeouts and connection errors count as failures; 4xx
+    responses are the caller's problem and count as successes. Latency is
+    tracked per tool and operation, since a health check and an execute
+    call have very different normal latencies.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8080",
+        health_timeout: float = 3.0,
+        execute_timeout: float = 120.0,
+        timeout_floor: float = 0.5,
+        timeout_multiplier: float = 3.0,
+        max_connections: int = 50,
+        **breaker_options: Any,
+    ):
+        self.base_url = base_url
+        self.ceilings = {"health": health_timeout, "execute": execute_timeout}
+        self.timeout_floor = timeout_floor
+        self.timeout_multiplier = timeout_multiplier
+        self.breaker_options = breaker_options
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.timeouts: Dict[Tuple[str, str], AdaptiveTimeout] = {}
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def breaker(self, tool: str) -> CircuitBreaker:
+        breaker = self.breakers.get(tool)
+        if breaker is None:
+            breaker = self.breakers[tool] = CircuitBreaker(tool, **self.breaker_options)
+        return breaker
+
+    def adaptive_timeout(self, tool: str, operation: str) -> AdaptiveTimeout:
+        key = (tool, operation)
+        timeout = self.timeouts.get(key)
+        if timeout is None:
+            timeout = self.timeouts[key] = AdaptiveTimeout(
+                min(self.timeout_floor, self.ceilings[operation]), self.ceilings[operation], self.timeout_multiplier
+            )
+        return timeout
+
+    async def request(self, tool: str, operation: str, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        breaker = self.breaker(tool)
+        if not breaker.allow():
+            raise CircuitOpen(tool, breaker.retry_after())
+
+        adaptive = self.adaptive_timeout(tool, operation)
+        timeout = adaptive.timeout()
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, timeout=timeout, **kwargs)
+        except httpx.TimeoutException:
+            # A timed-out call took at least the timeout; keep it in the latency window
+            adaptive.observe(timeout)
+            breaker.record(False)
+            raise
+        except httpx.HTTPError:
+            breaker.record(False)
+            raise
+        except BaseException:
+            breaker.abandon()
+            raise
+
+        adaptive.observe(time.perf_counter() - start)
+        breaker.record(response.status_code < 500)
+        return response
+
+    async def health(self, tool: str) -> httpx.Response:
+        return await self.request(tool, "health", "GET", f"/tools/{tool}/health")
+
+    async def execute(self, tool: str, action: str, parameters: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        return await self.request(tool, "execute", "POST", f"/tools/{tool}/execute",
+                                  json={"action": action, "parameters": parameters or {}})
+
+    def stats(self) -> Dict[str, Any]:
+        report = {}
+        for tool, breaker in self.breakers.items():
+            report[tool] = {
+                **breaker.stats(),
+                "timeouts": {
+                    operation: timeout.stats()
+                    for (name, operation), timeout in self.timeouts.items() if name == tool
+                },
+            }
+        return report
+
+
+def create_tool_client(base_url: str, health_timeout: float = 3.0) -> MCPToolClient:
+    return MCPToolClient(
+        base_url,
+        health_timeout=health_timeout,
+        execute_timeout=float(os.getenv("MCP_EXECUTE_TIMEOUT", "120")),
+        timeout_floor=float(os.getenv("MCP_TIMEOUT_FLOOR", "0.5")),
+        timeout_multiplier=float(os.getenv("MCP_TIMEOUT_MULTIPLIER", "3")),
+        window=float(os.getenv("MCP_BREAKER_WINDOW", "30")),
+        max_calls=int(os.getenv("MCP_BREAKER_MAX_CALLS", "20")),
+        min_requests=int(os.getenv("MCP_BREAKER_MIN_REQUESTS", "3")),
+        error_rate=float(os.getenv("MCP_BREAKER_ERROR_RATE", "0.5")),
+        cooldown=float(os.getenv("MCP_BREAKER_COOLDOWN", "15")),
+        half_open_trials=int(os.getenv("MCP_BREAKER_HALF_OPEN_TRIALS", "1")),
+    )
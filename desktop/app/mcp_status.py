@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+MCP status aggregator for the desktop sandbox
+Probes the MCP gateway and every tool in the background, serves the last
+snapshot from memory and pushes changes to subscribers over SSE
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+from fastapi import Body, FastAPI, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from mcp_cache import ToolResult, create_tool_cache
+from mcp_client import CircuitOpen, MCPToolClient, create_tool_client
+
+logging.basicConfig(level=os.getenv("MCP_LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOLS = ("github", "browserbase", "exa")
+
+
+class MCPStatusAggregator:
+    """Background prober holding the latest gateway and tool snapshot
+
+    Requests never touch the gateway: they read ``snapshot``, which the
+    probe loop replaces every ``interval`` seconds. Tool probes run in
+    parallel, so a refresh takes as long as the slowest probe rather than
+    the sum of all of them. Probes go through the tool client's circuit
+    breakers, so a tool whose breaker is open is reported without waiting.
+    """
+
+    def __init__(
+        self,
+        tool_client: MCPToolClient,
+        tools: tuple = DEFAULT_TOOLS,
+        interval: float = 10.0,
+        gateway_timeout: float = 5.0,
+        tool_timeout: float = 3.0,
+        heartbeat: float = 15.0,
+    ):
+        self.tool_client = tool_client
+        self.gateway_url = tool_client.base_url
+        self.tools = tuple(tools)
+        self.interval = interval
+        self.gateway_timeout = gateway_timeout
+        self.tool_timeout = tool_timeout
+        self.heartbeat = heartbeat
+
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.version = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.last_probe_ms = 0.0
+        self._ready = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.probe_failures += 1
+                logger.error(f"MCP status probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Probe now; concurrent callers share one probe"""
+        probes = self.probes
+        async with self._refresh_lock:
+            if self.probes != probes and self.snapshot is not None:
+                # Another caller refreshed while we waited for the lock
+                return self.snapshot
+
+            start = time.perf_counter()
+            gateway, *tools = await asyncio.gather(
+                self._probe_gateway(),
+                *(self._probe_tool(tool) for tool in self.tools),
+            )
+            self.last_probe_ms = round((time.perf_counter() - start) * 1000, 2)
+            self.probes += 1
+
+            snapshot = {
+                "mcp_gateway": gateway,
+                "tools": dict(zip(self.tools, tools)),
+                "timestamp": time.time(),
+            }
+            changed = self.snapshot is None or _state(snapshot) != _state(self.snapshot)
+            if changed:
+                self.version += 1
+            snapshot["version"] = self.version
+            self.snapshot = snapshot
+            self._ready.set()
+
+            if changed:
+                self._notify(snapshot)
+            return snapshot
+
+    async def _probe_gateway(self) -> Dict[str, Any]:
+        try:
+            response = await self.tool_client.client.get("/health", timeout=self.gateway_timeout)
+        except Exception as e:
+            return {"status": "unreachable", "error": str(e) or type(e).__name__}
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            # Snapshots and _state() expect a mapping; an HTML error page or a bare list is not one
+            return {
+                "status": "unhealthy",
+                "response_code": response.status_code,
+                "error": "gateway health response is not a JSON object",
+            }
+        return body
+
+    async def _probe_tool(self, tool: str) -> Dict[str, Any]:
+        breaker = self.tool_client.breaker(tool)
+        start = time.perf_counter()
+        try:
+            response = await self.tool_client.health(tool)
+        except CircuitOpen:
+            return {"status": "unhealthy", "response_code": "circuit_open", "circuit": breaker.state}
+        except Exception:
+            return {"status": "unknown", "response_code": "error", "circuit": breaker.state}
+        return {
+            "status": "healthy" if response.status_code == 200 else "unhealthy",
+            "response_code": response.status_code,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "circuit": breaker.state,
+        }
+
+    async def current(self, wait: float = 0.0) -> Optional[Dict[str, Any]]:
+        """Latest snapshot with its age; optionally wait for the first probe"""
+        if self.snapshot is None and wait:
+            try:
+                await asyncio.wait_for(self._ready.wait(), wait)
+            except asyncio.TimeoutError:
+                return None
+        if self.snapshot is None:
+            return None
+        return self._with_age(self.snapshot)
+
+    def _with_age(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        age = time.time() - snapshot["timestamp"]
+        return {**snapshot, "age": round(age, 3), "stale": age > self.interval * 3}
+
+    def _notify(self, snapshot: Dict[str, Any]) -> None:
+        for queue in self._subscribers:
+            # Subscribers only need the newest snapshot; replace anything unread
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """SSE frames: the current snapshot, then one per change"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        try:
+            snapshot = await self.current(wait=self.gateway_timeout + self.tool_timeout)
+            if snapshot is not None:
+                yield _sse(snapshot)
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment frame keeps proxies from closing an idle stream
+                    yield ": heartbeat\n\n"
+                    continue
+                yield _sse(self._with_age(snapshot))
+        finally:
+            self._subscribers.discard(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
+            "last_probe_ms": self.last_probe_ms,
+            "version": self.version,
+            "subscribers": len(self._subscribers),
+        }
+
+
+def _state(snapshot: Dict[str, Any]) -> Any:
+    """The parts of a snapshot whose change is worth pushing"""
+    return (
+        snapshot["mcp_gateway"].get("status"),
+        tuple(
+            (tool, status["status"], status["response_code"], status["circuit"])
+            for tool, status in snapshot["tools"].items()
+        ),
+    )
+
+
+def _sse(snapshot: Dict[str, Any]) -> str:
+    return f"id: {snapshot['version']}\nevent: status\ndata: {json.dumps(snapshot)}\n\n"
+
+
+def create_aggregator() -> MCPStatusAggregator:
+    port = os.getenv("MCP_GATEWAY_PORT", "8080")
+    tools: List[str] = [t.strip() for t in os.getenv("MCP_STATUS_TOOLS", ",".join(DEFAULT_TOOLS)).split(",") if t.strip()]
+    tool_timeout = float(os.getenv("MCP_STATUS_TOOL_TIMEOUT", "3"))
+    return MCPStatusAggregator(
+        create_tool_client(os.getenv("MCP_GATEWAY_URL", f"http://localhost:{port}"), health_timeout=tool_timeout),
+        tools=tuple(tools),
+        interval=float(os.getenv("MCP_STATUS_INTERVAL", "10")),
+        gateway_timeout=float(os.getenv("MCP_STATUS_GATEWAY_TIMEOUT", "5")),
+        tool_timeout=tool_timeout,
+    )
+
+
+aggregator = create_aggregator()
+tool_client = aggregator.tool_client
+tool_cache = create_tool_cache()
+app = FastAPI(title="MCP Status")
+
+
+@app.on_event("startup")
+async def startup_event():
+    await aggregator.start()
+    logger.info(f"MCP status aggregator probing {aggregator.gateway_url} every {aggregator.interval:g}s")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await aggregator.stop()
+    await tool_cache.close()
+    await tool_client.aclose()
+
+
+@app.get("/mcp/status")
+async def mcp_status(refresh: bool = False):
+    """Cached gateway and tool status; ``refresh=true`` forces a probe"""
+    if refresh:
+        await aggregator.refresh()
+    # Only the first request after startup waits, and only for one probe round
+    snapshot = await aggregator.current(wait=aggregator.gateway_timeout + aggregator.tool_timeout)
+    if snapshot is None:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "No MCP status collected yet", "status": "starting", "timestamp": time.time()},
+        )
+    # Breaker counters move between probes, so they are read live rather than cached
+    return {**snapshot, "breakers": tool_client.stats()}
+
+
+@app.get("/mcp/status/stream")
+async def mcp_status_stream():
+    """Server-sent events: current status, then every change"""
+    return StreamingResponse(
+        aggregator.subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _execute(tool: str, action: str, parameters: Optional[Dict[str, Any]]) -> ToolResult:
+    try:
+        response = await tool_client.execute(tool, action, parameters)
+    except CircuitOpen as e:
+        return 503, {"error": str(e), "tool": tool, "circuit": "open"}, {"Retry-After": str(max(1, round(e.retry_after)))}
+    except httpx.TimeoutException:
+        return 504, {"error": f"{tool} timed out", "tool": tool}, {}
+    except httpx.HTTPError as e:
+        return 502, {"error": f"{tool} unreachable: {e!r}", "tool": tool}, {}
+
+    try:
+        content = response.json()
+    except ValueError:
+        content = {"result": response.text}
+    return response.status_code, content, {}
+
+
+@app.post("/mcp/tools/{tool}/execute")
+async def execute_tool(tool: str, request: Dict[str, Any] = Body(...), cache: bool = True,
+                       cache_control: Optional[str] = Header(None)):
+    """Execute a tool through the result cache, its circuit breaker and adaptive timeout
+
+    Read-only actions of cached tools are served from the result cache;
+    ``cache=false`` or ``Cache-Control: no-cache`` forces a fresh call.
+    """
+    action = request.get("action", "")
+    parameters = request.get("parameters")
+    bypass = not cache or "no-cache" in (cache_control or "")
+    (status, content, headers), outcome = await tool_cache.get_or_call(
+        tool, action, parameters, lambda: _execute(tool, action, parameters), bypass=bypass
+    )
+    return JSONResponse(status_code=status, content=content, headers={**headers, "X-Cache": outcome.upper()})
+
+
+@app.get("/health")
+async def health():
+    breakers = tool_client.stats()
+    open_circuits = [tool for tool, breaker in breakers.items() if breaker["state"] != "closed"]
+    return {
+        "status": "degraded" if open_circuits else "healthy",
+        "open_circuits": open_circuits,
+        "aggregator": aggregator.stats(),
+        "breakers": breakers,
+        "cache": tool_cache.stats(),
+        "timestamp": time.time(),
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("MCP_STATUS_PORT", "8081")), log_level="warning")
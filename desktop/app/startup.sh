@@ -140,56 +140,12 @@ python3 app.py &
 APP_PID=$!
 echo "Application server started"
 
-# Create MCP status endpoint
-echo "📊 Creating MCP status endpoint..."
-cat > /app/mcp-status.py << 'EOF'
-#!/usr/bin/env python3
-import json
-import requests
-import time
-from flask import Flask, jsonify
-
-app = Flask(__name__)
-
-@app.route('/mcp/status')
-def mcp_status():
-    try:
-        # Check MCP gateway health
-        mcp_health = requests.get('http://localhost:8080/health', timeout=5).json()
-        
-        # Check configured tools
-        tools_status = {}
-        for tool in ['github', 'browserbase', 'exa']:
-            try:
-                response = requests.get(f'http://localhost:8080/tools/{tool}/health', timeout=3)
-                tools_status[tool] = {
-                    'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-                    'response_code': response.status_code
-                }
-            except:
-                tools_status[tool] = {'status': 'unknown', 'response_code': 'error'}
-        
-        return jsonify({
-            'mcp_gateway': mcp_health,
-            'tools': tools_status,
-            'timestamp': time.time()
-        })
-    except Exception as e:
-        return jsonify({
-            'error': str(e),
-            'status': 'error',
-            'timestamp': time.time()
-        }), 500
-
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8081, debug=False)
-EOF
-
 # Start MCP status monitoring
 echo "📈 Starting MCP status monitoring..."
-python3 /app/mcp-status.py &
+export MCP_STATUS_PORT="${MCP_STATUS_PORT:-8081}"
+python3 /app/mcp_status.py &
 MCP_STATUS_PID=$!
-echo "MCP status monitoring started on port 8081"
+echo "MCP status monitoring started on port $MCP_STATUS_PORT"
 
 # Function to handle shutdown
 shutdown() {
@@ -231,6 +187,7 @@ if pgrep -f "Xvfb" > /dev/null && \
     echo "   • App API: http://localhost:8080"
     echo "   • MCP Gateway: http://localhost:8080"
     echo "   • MCP Status: http://localhost:8081/mcp/status"
+    echo "   • MCP Status Stream: http://localhost:8081/mcp/status/stream"
     echo ""
     echo "🔧 Available MCP Tools:"
     echo "   • GitHub: Repository management"
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Local mock MCP gateway for offline testing
+Speaks just enough HTTP/1.1 (with keep-alive) to serve the endpoints the
+integration tester and load generator hit, with configurable latency,
+capacity and per-tool fault injection
+"""
+
+import json
+import time
+import random
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_TOOLS = {
+    "github": "Repository management",
+    "browserbase": "Web automation",
+    "exa": "AI-powered search",
+}
+
+REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class ToolFaults:
+    """Injected behaviour for one tool"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, down: bool = False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.down = down
+
+
+class MockGateway:
+    """In-process mock of the MCP gateway started by desktop/app/startup.sh
+
+    ``workers`` bounds how many requests are processed at once and
+    ``backlog`` how many may wait for a worker before getting 503, which
+    gives the load generator a real saturation point to find.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.005,
+        jitter: float = 0.002,
+        workers: int = 100,
+        backlog: int = 1000,
+        tools: Optional[Dict[str, str]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.workers = workers
+        self.backlog = backlog
+        self.tools = dict(tools or DEFAULT_TOOLS)
+        self.faults: Dict[str, ToolFaults] = {name: ToolFaults() for name in self.tools}
+        self.random = random.Random(seed)
+
+        self.started_at = time.time()
+        self.requests = 0
+        self.rejected = 0
+        self.waiting = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def set_fault(self, tool: str, **kwargs: Any) -> None:
+        """Change a tool's injected latency, jitter, error_rate or down flag"""
+        faults = self.faults.setdefault(tool, ToolFaults())
+        for key, value in kwargs.items():
+            setattr(faults, key, value)
+
+    async def start(self) -> "MockGateway":
+        self._slots = asyncio.Semaphore(self.workers)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockGateway":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = b""
+                length = int(headers.get("content-length", 0))
+                if length:
+                    body = await reader.readexactly(length)
+
+                status, payload = await self._dispatch(method, path.split("?", 1)[0], body)
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        self.requests += 1
+        if self.waiting >= self.backlog:
+            self.rejected += 1
+            return 503, {"error": "Gateway saturated"}
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await self._route(method, path, body)
+        finally:
+            self._slots.release()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        parts = [p for p in path.split("/") if p]
+
+        if parts == ["health"]:
+            await self._delay(self.latency, self.jitter)
+            return 200, {"status": "healthy", "version": "mock", "timestamp": time.time(),
+                         "uptime": round(time.time() - self.started_at, 1)}
+
+        if parts == ["tools"]:
+            await self._delay(self.latency, self.jitter)
+            return 200, {"tools": [{"name": name, "description": desc} for name, desc in self.tools.items()]}
+
+        if parts == ["mcp", "status"]:
+            await self._delay(self.latency, self.jitter)
+            return 200, {
+                "mcp_gateway": {"status": "healthy", "uptime": round(time.time() - self.started_at, 1)},
+                "tools": {name: {"status": "unhealthy" if self.faults[name].down else "healthy"}
+                          for name in self.tools},
+                "timestamp": time.time(),
+            }
+
+        if len(parts) == 3 and parts[0] == "tools" and parts[1] in self.tools:
+            tool, action = parts[1], parts[2]
+            faults = self.faults[tool]
+            await self._delay(self.latency + faults.latency, self.jitter + faults.jitter)
+            if faults.down or self.random.random() < faults.error_rate:
+                return 503, {"error": f"{tool} unavailable"}
+
+            if action == "health" and method == "GET":
+                return 200, {"tool": tool, "status": "healthy"}
+            if action == "execute" and method == "POST":
+                request = json.loads(body or b"{}")
+                return 200, {"tool": tool, "status": "completed",
+                             "action": request.get("action"), "result": {"echo": request.get("parameters")}}
+            return 405, {"error": "Method not allowed"}
+
+        return 404, {"error": "Not found"}
+
+    async def _delay(self, latency: float, jitter: float) -> None:
+        delay = latency + (self.random.uniform(-jitter, jitter) if jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def serve(args) -> None:
+    gateway = MockGateway(args.host, args.port, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                          workers=args.workers, backlog=args.backlog)
+    for spec in args.fault:
+        # tool:error_rate[:latency_ms]
+        tool, error_rate, *latency = spec.split(":")
+        gateway.set_fault(tool, error_rate=float(error_rate),
+                          latency=float(latency[0]) / 1000 if latency else 0.0)
+    await gateway.start()
+    print(f"🧪 Mock MCP gateway listening on {gateway.url}")
+    await asyncio.Event().wait()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local mock MCP gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=5, help="Base latency in ms (default: 5)")
+    parser.add_argument("--jitter", type=float, default=2, help="Latency jitter in ms (default: 2)")
+    parser.add_argument("--workers", type=int, default=100,
+                        help="Requests processed at once (default: 100, like --max-connections)")
+    parser.add_argument("--backlog", type=int, default=1000,
+                        help="Requests allowed to wait before 503 (default: 1000)")
+    parser.add_argument("--fault", action="append", default=[],
+                        help="Inject faults as tool:error_rate[:latency_ms], e.g. browserbase:0.5:200")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
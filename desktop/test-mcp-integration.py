@@ -4,217 +4,508 @@ MCP Integration Test Script for ADX-Agent
 Tests MCP gateway connectivity and tool availability
 """
 
-import requests
 import json
 import time
 import sys
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+# Tool name -> (emoji, display name)
+TOOLS = {
+    "github": ("🐙", "GitHub"),
+    "browserbase": ("🌐", "Browserbase"),
+    "exa": ("🔍", "Exa"),
+}
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
 
 class MCPTester:
-    def __init__(self, base_url: str = "http://localhost:8080"):
+    def __init__(self, base_url: str = "http://localhost:8080", timeout: float = 10.0,
+                 report_path: str = "/app/mcp-test-report.json", max_connections: int = 20):
         self.base_url = base_url
+        self.timeout = timeout
+        self.report_path = report_path
+        self.max_connections = max_connections
+        self.client: Optional[httpx.AsyncClient] = None
+        self.verbose = True
         self.results = {}
-    
-    def test_gateway_health(self) -> bool:
-        """Test MCP gateway health endpoint"""
-        print("🏥 Testing MCP Gateway Health...")
-        
+        # probe name -> latencies (seconds) of completed requests
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.rounds: List[Dict[str, bool]] = []
+
+    async def __aenter__(self) -> "MCPTester":
+        # One pooled client for every probe, so repeated rounds reuse connections
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    def log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    async def probe(self, name: str, path: str) -> Tuple[Optional[httpx.Response], Optional[Exception]]:
+        """GET a path, recording its latency under the probe name"""
+        start = time.perf_counter()
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✅ Gateway Status: {data.get('status', 'unknown')}")
-                print(f"📊 Version: {data.get('version', 'unknown')}")
-                print(f"🕐 Timestamp: {data.get('timestamp', 'unknown')}")
-                return True
-            else:
-                print(f"❌ Gateway health check failed: {response.status_code}")
-                return False
+            response = await self.client.get(path)
         except Exception as e:
-            print(f"❌ Gateway connection failed: {e}")
-            return False
-    
-    def test_mcp_status(self) -> Dict[str, Any]:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return None, e
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        return response, None
+
+    async def test_gateway_health(self) -> bool:
+        """Test MCP gateway health endpoint"""
+        response, error = await self.probe("gateway_health", "/health")
+
+        lines = ["🏥 Testing MCP Gateway Health..."]
+        ok = False
+        if error:
+            lines.append(f"❌ Gateway connection failed: {error!r}")
+        elif response.status_code == 200:
+            data = response.json()
+            lines.append(f"✅ Gateway Status: {data.get('status', 'unknown')}")
+            lines.append(f"📊 Version: {data.get('version', 'unknown')}")
+            lines.append(f"🕐 Timestamp: {data.get('timestamp', 'unknown')}")
+            ok = True
+        else:
+            lines.append(f"❌ Gateway health check failed: {response.status_code}")
+
+        self.log("\n".join(lines))
+        return ok
+
+    async def test_mcp_status(self) -> Dict[str, Any]:
         """Test detailed MCP status endpoint"""
-        print("\n📊 Testing MCP Status...")
-        
-        try:
-            response = requests.get(f"{self.base_url}/mcp/status", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                
-                print("🔧 MCP Gateway Status:")
-                gateway_status = data.get('mcp_gateway', {})
-                print(f"   Status: {gateway_status.get('status', 'unknown')}")
-                print(f"   Uptime: {gateway_status.get('uptime', 'unknown')}")
-                
-                print("\n🛠️ Tool Status:")
-                tools = data.get('tools', {})
-                for tool_name, tool_status in tools.items():
-                    status = tool_status.get('status', 'unknown')
-                    if status == 'healthy':
-                        print(f"   ✅ {tool_name}: {status}")
-                    elif status == 'unhealthy':
-                        print(f"   ⚠️ {tool_name}: {status}")
-                    else:
-                        print(f"   ❓ {tool_name}: {status}")
-                
-                return data
-            else:
-                print(f"❌ MCP status check failed: {response.status_code}")
-                return {}
-        except Exception as e:
-            print(f"❌ MCP status connection failed: {e}")
-            return {}
-    
-    def test_tool_list(self) -> bool:
+        response, error = await self.probe("mcp_status", "/mcp/status")
+
+        lines = ["\n📊 Testing MCP Status..."]
+        data: Dict[str, Any] = {}
+        if error:
+            lines.append(f"❌ MCP status connection failed: {error!r}")
+        elif response.status_code == 200:
+            data = response.json()
+
+            lines.append("🔧 MCP Gateway Status:")
+            gateway_status = data.get('mcp_gateway', {})
+            lines.append(f"   Status: {gateway_status.get('status', 'unknown')}")
+            lines.append(f"   Uptime: {gateway_status.get('uptime', 'unknown')}")
+
+            lines.append("\n🛠️ Tool Status:")
+            tools = data.get('tools', {})
+            for tool_name, tool_status in tools.items():
+                status = tool_status.get('status', 'unknown')
+                if status == 'healthy':
+                    lines.append(f"   ✅ {tool_name}: {status}")
+                elif status == 'unhealthy':
+                    lines.append(f"   ⚠️ {tool_name}: {status}")
+                else:
+                    lines.append(f"   ❓ {tool_name}: {status}")
+        else:
+            lines.append(f"❌ MCP status check failed: {response.status_code}")
+
+        self.log("\n".join(lines))
+        return data
+
+    async def test_tool_list(self) -> bool:
         """Test available tools list"""
-        print("\n📋 Testing Available Tools...")
-        
-        try:
-            response = requests.get(f"{self.base_url}/tools", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                tools = data.get('tools', [])
-                print(f"✅ Found {len(tools)} tools:")
-                for tool in tools:
-                    print(f"   • {tool.get('name', 'unknown')}: {tool.get('description', 'no description')}")
-                return True
-            else:
-                print(f"❌ Tool list failed: {response.status_code}")
-                return False
-        except Exception as e:
-            print(f"❌ Tool list connection failed: {e}")
-            return False
-    
-    def test_github_tool(self) -> bool:
-        """Test GitHub tool functionality"""
-        print("\n🐙 Testing GitHub Tool...")
-        
-        try:
-            # Test GitHub tool health
-            response = requests.get(f"{self.base_url}/tools/github/health", timeout=10)
-            if response.status_code == 200:
-                print("✅ GitHub tool is accessible")
-                return True
-            else:
-                print(f"⚠️ GitHub tool returned: {response.status_code}")
-                return False
-        except Exception as e:
-            print(f"❌ GitHub tool test failed: {e}")
-            return False
-    
-    def test_browserbase_tool(self) -> bool:
-        """Test Browserbase tool functionality"""
-        print("\n🌐 Testing Browserbase Tool...")
-        
-        try:
-            # Test Browserbase tool health
-            response = requests.get(f"{self.base_url}/tools/browserbase/health", timeout=10)
-            if response.status_code == 200:
-                print("✅ Browserbase tool is accessible")
-                return True
-            else:
-                print(f"⚠️ Browserbase tool returned: {response.status_code}")
-                return False
-        except Exception as e:
-            print(f"❌ Browserbase tool test failed: {e}")
-            return False
-    
-    def test_exa_tool(self) -> bool:
-        """Test Exa tool functionality"""
-        print("\n🔍 Testing Exa Tool...")
-        
-        try:
-            # Test Exa tool health
-            response = requests.get(f"{self.base_url}/tools/exa/health", timeout=10)
-            if response.status_code == 200:
-                print("✅ Exa tool is accessible")
-                return True
-            else:
-                print(f"⚠️ Exa tool returned: {response.status_code}")
-                return False
-        except Exception as e:
-            print(f"❌ Exa tool test failed: {e}")
-            return False
-    
-    def run_comprehensive_test(self) -> Dict[str, bool]:
-        """Run all MCP integration tests"""
-        print("🚀 Starting MCP Integration Test Suite")
-        print("=" * 50)
-        
-        tests = {
+        response, error = await self.probe("tool_list", "/tools")
+
+        lines = ["\n📋 Testing Available Tools..."]
+        ok = False
+        if error:
+            lines.append(f"❌ Tool list connection failed: {error!r}")
+        elif response.status_code == 200:
+            data = response.json()
+            tools = data.get('tools', [])
+            lines.append(f"✅ Found {len(tools)} tools:")
+            for tool in tools:
+                lines.append(f"   • {tool.get('name', 'unknown')}: {tool.get('description', 'no description')}")
+            ok = True
+        else:
+            lines.append(f"❌ Tool list failed: {response.status_code}")
+
+        self.log("\n".join(lines))
+        return ok
+
+    async def test_tool(self, tool: str) -> bool:
+        """Test a tool's health endpoint"""
+        emoji, label = TOOLS.get(tool, ("🛠️", tool))
+        response, error = await self.probe(f"{tool}_tool", f"/tools/{tool}/health")
+
+        lines = [f"\n{emoji} Testing {label} Tool..."]
+        ok = False
+        if error:
+            lines.append(f"❌ {label} tool test failed: {error!r}")
+        elif response.status_code == 200:
+            lines.append(f"✅ {label} tool is accessible")
+            ok = True
+        else:
+            lines.append(f"⚠️ {label} tool returned: {response.status_code}")
+
+        self.log("\n".join(lines))
+        return ok
+
+    async def run_comprehensive_test(self) -> Dict[str, bool]:
+        """Run all MCP integration probes concurrently"""
+        self.log("🚀 Starting MCP Integration Test Suite")
+        self.log("=" * 50)
+
+        probes = {
             "gateway_health": self.test_gateway_health(),
-            "mcp_status": bool(self.test_mcp_status()),
+            "mcp_status": self.test_mcp_status(),
             "tool_list": self.test_tool_list(),
-            "github_tool": self.test_github_tool(),
-            "browserbase_tool": self.test_browserbase_tool(),
-            "exa_tool": self.test_exa_tool()
+            **{f"{tool}_tool": self.test_tool(tool) for tool in TOOLS},
         }
-        
+        results = await asyncio.gather(*probes.values())
+
+        tests = {name: bool(result) for name, result in zip(probes, results)}
+        self.rounds.append(tests)
         return tests
-    
+
+    async def run_rounds(self, rounds: int, interval: float = 0.0) -> Dict[str, bool]:
+        """Soak mode: repeat the suite; a test passes only if it passed every round"""
+        for round_number in range(1, rounds + 1):
+            self.verbose = round_number == 1
+            tests = await self.run_comprehensive_test()
+            if not self.verbose:
+                print(f"🔁 Round {round_number}/{rounds}: {sum(tests.values())}/{len(tests)} passed")
+            if interval and round_number < rounds:
+                await asyncio.sleep(interval)
+        self.verbose = True
+
+        return {name: all(r[name] for r in self.rounds) for name in self.rounds[0]}
+
+    def latency_report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-probe latency (ms) over every round"""
+        report = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            ordered = sorted(self.latencies.get(name, []))
+            report[name] = {
+                "samples": len(ordered),
+                "errors": self.errors.get(name, 0),
+                "min_ms": round(ordered[0] * 1000, 2) if ordered else None,
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2) if ordered else None,
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 2) if ordered else None,
+                "max_ms": round(ordered[-1] * 1000, 2) if ordered else None,
+            }
+        return report
+
     def generate_report(self, tests: Dict[str, bool]) -> None:
         """Generate test report"""
         print("\n" + "=" * 50)
         print("📊 MCP Integration Test Report")
         print("=" * 50)
-        
+
         passed = sum(tests.values())
         total = len(tests)
-        
-        print(f"\n📈 Summary: {passed}/{total} tests passed")
-        
+
+        print(f"\n📈 Summary: {passed}/{total} tests passed over {len(self.rounds)} round(s)")
+
+        latency = self.latency_report()
         for test_name, result in tests.items():
             status = "✅ PASS" if result else "❌ FAIL"
-            print(f"   {test_name}: {status}")
-        
+            stats = latency.get(test_name)
+            if stats and stats["samples"]:
+                print(f"   {test_name}: {status}  "
+                      f"(min {stats['min_ms']}ms / p50 {stats['p50_ms']}ms / p95 {stats['p95_ms']}ms)")
+            else:
+                print(f"   {test_name}: {status}")
+
         if passed == total:
             print("\n🎉 All tests passed! MCP integration is working correctly.")
         else:
             print(f"\n⚠️ {total - passed} test(s) failed. Check configuration.")
-        
+
         # Save report
         report_data = {
             "timestamp": time.time(),
             "tests": tests,
+            "rounds": len(self.rounds),
+            "latency": latency,
             "summary": {
                 "passed": passed,
                 "total": total,
                 "success_rate": f"{(passed/total)*100:.1f}%"
             }
         }
-        
-        with open("/app/mcp-test-report.json", "w") as f:
+
+        with open(self.report_path, "w") as f:
             json.dump(report_data, f, indent=2)
-        
-        print(f"\n💾 Detailed report saved to: /app/mcp-test-report.json")
+
+        print(f"\n💾 Detailed report saved to: {self.report_path}")
+
+
+class MCPLoadGenerator:
+    """Drives the gateway at a target concurrency or request rate and measures it"""
+
+    # Request mix entry name -> weight; tool entries are spread over every tool
+    DEFAULT_MIX = {"health": 5, "tools": 1, "execute": 2}
+
+    def __init__(self, client: httpx.AsyncClient, mix: Optional[Dict[str, int]] = None,
+                 tools: Tuple[str, ...] = tuple(TOOLS)):
+        self.client = client
+        self.tools = tools
+        self.requests: List[Tuple[str, str, str, Optional[Dict[str, Any]]]] = []
+        for kind, weight in (mix or self.DEFAULT_MIX).items():
+            self.requests.extend(self._requests_for(kind) * weight)
+        if not self.requests:
+            raise ValueError("Empty request mix")
+
+    def _requests_for(self, kind: str) -> List[Tuple[str, str, str, Optional[Dict[str, Any]]]]:
+        # (label, method, path, json body)
+        if kind == "health":
+            return [(f"{t}_health", "GET", f"/tools/{t}/health", None) for t in self.tools]
+        if kind == "tools":
+            return [("tool_list", "GET", "/tools", None)]
+        if kind == "execute":
+            return [(f"{t}_execute", "POST", f"/tools/{t}/execute",
+                     {"action": "ping", "parameters": {"source": "load-test"}}) for t in self.tools]
+        raise ValueError(f"Unknown request kind: {kind}. Use: health, tools, execute")
+
+    async def _send(self, index: int, stats: Dict[str, Any]) -> None:
+        label, method, path, body = self.requests[index % len(self.requests)]
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, json=body)
+            outcome = str(response.status_code)
+            ok = response.status_code < 400
+        except httpx.TimeoutException:
+            outcome, ok = "timeout", False
+        except httpx.HTTPError as e:
+            outcome, ok = type(e).__name__, False
+        elapsed = time.perf_counter() - start
+
+        stats["latencies"].append(elapsed)
+        stats["outcomes"][outcome] = stats["outcomes"].get(outcome, 0) + 1
+        per_label = stats["by_request"].setdefault(label, {"latencies": [], "errors": 0})
+        per_label["latencies"].append(elapsed)
+        if not ok:
+            stats["errors"] += 1
+            per_label["errors"] += 1
+
+    async def run_level(self, duration: float, concurrency: int, rps: float = 0.0) -> Dict[str, Any]:
+        """Closed loop at `concurrency` workers, or open loop at `rps` capped at `concurrency` in flight"""
+        stats: Dict[str, Any] = {"latencies": [], "errors": 0, "outcomes": {}, "by_request": {}, "late": 0}
+        deadline = time.perf_counter() + duration
+        counter = iter(range(sys.maxsize))
+        start = time.perf_counter()
+
+        if rps > 0:
+            in_flight = asyncio.Semaphore(concurrency)
+            tasks = set()
+            interval = 1.0 / rps
+            next_at = start
+            while next_at < deadline:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if in_flight.locked():
+                    # Every slot busy: the arrival is late, which is how saturation shows in open loop
+                    stats["late"] += 1
+                await in_flight.acquire()
+                task = asyncio.create_task(self._send(next(counter), stats))
+                task.add_done_callback(lambda t: (in_flight.release(), tasks.discard(t)))
+                tasks.add(task)
+                next_at += interval
+            if tasks:
+                await asyncio.gather(*tasks)
+        else:
+            async def worker() -> None:
+                while time.perf_counter() < deadline:
+                    await self._send(next(counter), stats)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        return summarize_level(stats, time.perf_counter() - start, concurrency, rps)
+
+    async def run(self, duration: float, levels: List[int], rps: float = 0.0) -> Dict[str, Any]:
+        """Step through load levels and locate the saturation point"""
+        results = []
+        for level in levels:
+            target = f"{rps:g} rps, {level} max in flight" if rps else f"{level} concurrent"
+            print(f"📈 Load level: {target} for {duration:g}s...")
+            result = await self.run_level(duration, level, rps)
+            print(f"   {result['throughput_rps']} req/s  p50 {result['p50_ms']}ms  "
+                  f"p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms  errors {result['error_rate']:.2%}")
+            results.append(result)
+
+        return {"levels": results, "saturation": find_saturation(results)}
+
+
+def summarize_level(stats: Dict[str, Any], elapsed: float, concurrency: int, rps: float) -> Dict[str, Any]:
+    ordered = sorted(stats["latencies"])
+    total = len(ordered)
+
+    def ms(q: float) -> float:
+        return round(percentile(ordered, q) * 1000, 2)
+
+    return {
+        "concurrency": concurrency,
+        "target_rps": rps or None,
+        "requests": total,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(0.50),
+        "p95_ms": ms(0.95),
+        "p99_ms": ms(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "errors": stats["errors"],
+        "error_rate": stats["errors"] / total if total else 0.0,
+        "late_arrivals": stats["late"],
+        "outcomes": stats["outcomes"],
+        "by_request": {
+            label: {
+                "requests": len(data["latencies"]),
+                "errors": data["errors"],
+                "p50_ms": round(percentile(sorted(data["latencies"]), 0.50) * 1000, 2),
+                "p95_ms": round(percentile(sorted(data["latencies"]), 0.95) * 1000, 2),
+            }
+            for label, data in sorted(stats["by_request"].items())
+        },
+    }
+
+
+def find_saturation(levels: List[Dict[str, Any]], min_gain: float = 0.05,
+                    latency_factor: float = 3.0, max_error_rate: float = 0.01) -> Optional[Dict[str, Any]]:
+    """First level where throughput falls short, p95 blows up or errors appear
+
+    Closed loop (no target rate): throughput that stops growing between
+    levels is a plateau. Open loop (``--rps``): throughput is capped at the
+    offered rate by design, so a level saturates when it achieves less
+    than the offered rate instead.
+    """
+    if not levels:
+        return None
+    baseline_p95 = levels[0]["p95_ms"] or 0.001
+    for index, level in enumerate(levels):
+        previous = levels[index - 1] if index else None
+        reasons = []
+        if level.get("target_rps"):
+            if level["throughput_rps"] < level["target_rps"] * (1 - min_gain):
+                reasons.append("throughput below offered rate")
+        elif previous and level["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            reasons.append("throughput plateau")
+        if level["p95_ms"] > baseline_p95 * latency_factor:
+            reasons.append("p95 latency growth")
+        if level["error_rate"] > max_error_rate:
+            reasons.append("error rate")
+        if reasons:
+            sustained = level if level.get("target_rps") or previous is None else previous
+            return {"concurrency": level["concurrency"], "throughput_rps": sustained["throughput_rps"],
+                    "reasons": reasons}
+    return None
+
+
+async def run_load(args) -> bool:
+    gateway = None
+    url = args.url
+    if args.mock_gateway:
+        from mcp_mock_gateway import MockGateway
+
+        gateway = await MockGateway().start()
+        url = gateway.url
+        print(f"🧪 Using bundled mock gateway at {url}")
+
+    levels = [int(level) for level in args.steps.split(",")] if args.steps else [args.concurrency]
+    mix = None
+    if args.mix:
+        mix = {kind: int(weight) for kind, weight in (part.split("=") for part in args.mix.split(","))}
+
+    try:
+        async with httpx.AsyncClient(
+            base_url=url,
+            timeout=httpx.Timeout(args.timeout),
+            limits=httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels)),
+        ) as client:
+            report = await MCPLoadGenerator(client, mix).run(args.duration, levels, args.rps)
+    finally:
+        if gateway:
+            await gateway.stop()
+
+    saturation = report["saturation"]
+    if saturation:
+        print(f"\n🧱 Saturation at {saturation['concurrency']} in flight "
+              f"(~{saturation['throughput_rps']} req/s): {', '.join(saturation['reasons'])}")
+    else:
+        print("\n✅ No saturation point reached within the tested levels")
+
+    report.update({"timestamp": time.time(), "url": url, "mock_gateway": bool(gateway)})
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Load report saved to: {args.report}")
+
+    return all(level["error_rate"] <= args.max_error_rate for level in report["levels"])
+
+
+async def run_tests(args) -> Dict[str, bool]:
+    async with MCPTester(args.url, timeout=args.timeout, report_path=args.report) as tester:
+        tests = await tester.run_rounds(args.rounds, args.interval)
+        tester.generate_report(tests)
+        return tests
+
 
 def main():
     """Main test execution"""
     import argparse
-    
+
     parser = argparse.ArgumentParser(description="MCP Integration Test Suite")
-    parser.add_argument("--url", default="http://localhost:8080", 
+    parser.add_argument("--url", default="http://localhost:8080",
                        help="MCP gateway URL (default: http://localhost:8080)")
-    parser.add_argument("--timeout", type=int, default=30,
+    parser.add_argument("--timeout", type=float, default=30,
                        help="Request timeout in seconds (default: 30)")
-    
+    parser.add_argument("--rounds", type=int, default=1,
+                       help="Soak mode: repeat the suite this many times (default: 1)")
+    parser.add_argument("--interval", type=float, default=0.0,
+                       help="Seconds to wait between rounds (default: 0)")
+    parser.add_argument("--report", default="/app/mcp-test-report.json",
+                       help="Where to write the JSON report (default: /app/mcp-test-report.json)")
+
+    load = parser.add_argument_group("load testing")
+    load.add_argument("--load", action="store_true",
+                      help="Run the load generator instead of the integration suite")
+    load.add_argument("--mock-gateway", action="store_true",
+                      help="Start the bundled local mock gateway and target it (offline/CI)")
+    load.add_argument("--duration", type=float, default=10,
+                      help="Seconds per load level (default: 10)")
+    load.add_argument("--concurrency", type=int, default=10,
+                      help="Concurrent requests, or max in flight with --rps (default: 10)")
+    load.add_argument("--rps", type=float, default=0,
+                      help="Open-loop target requests per second (default: closed loop)")
+    load.add_argument("--steps", default="",
+                      help="Comma-separated concurrency levels to step through, e.g. 10,50,100,200")
+    load.add_argument("--mix", default="",
+                      help="Request mix weights, e.g. health=5,tools=1,execute=2")
+    load.add_argument("--max-error-rate", type=float, default=0.01,
+                      help="Fail the run if any level exceeds this error rate (default: 0.01)")
+
     args = parser.parse_args()
-    
-    # Create tester instance
-    tester = MCPTester(args.url)
-    
-    # Set global timeout
-    requests.get = lambda *args, **kwargs: requests.get(*args, timeout=args.timeout, **kwargs)
-    
+
     try:
-        # Run tests
-        tests = tester.run_comprehensive_test()
-        
-        # Generate report
-        tester.generate_report(tests)
-        
+        if args.load:
+            ok = asyncio.run(run_load(args))
+            sys.exit(0 if ok else 1)
+
+        # Run tests and generate report
+        tests = asyncio.run(run_tests(args))
+
         # Exit with appropriate code
         if all(tests.values()):
             print("\n✅ All tests passed!")
@@ -222,7 +513,7 @@ def main():
         else:
             print("\n❌ Some tests failed!")
             sys.exit(1)
-            
+
     except KeyboardInterrupt:
         print("\n\n⚠️ Test interrupted by user")
         sys.exit(130)
@@ -231,4 +522,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,25 @@
+"""
+Shared pytest setup for the desktop service
+The MCP modules in app/ and the tools in this directory are scripts imported by
+flat name, so both directories go on sys.path
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+DESKTOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(DESKTOP, "app"))
+sys.path.insert(0, DESKTOP)
+
+
+@pytest.fixture(scope="session")
+def integration_tester():
+    """desktop/test-mcp-integration.py, which cannot be imported by name because of its hyphens"""
+    path = os.path.join(DESKTOP, "test-mcp-integration.py")
+    spec = importlib.util.spec_from_file_location("mcp_integration", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,45 @@
+"""Saturation detection in the MCP load generator, for closed-loop and open-loop (--rps) runs"""
+
+
+def level(concurrency, throughput, p95=5.0, error_rate=0.0, target_rps=None):
+    return {
+        "concurrency": concurrency,
+        "target_rps": target_rps,
+        "throughput_rps": throughput,
+        "p95_ms": p95,
+        "error_rate": error_rate,
+    }
+
+
+def test_closed_loop_plateau(integration_tester):
+    levels = [level(5, 100.0), level(20, 380.0), level(50, 390.0)]
+    saturation = integration_tester.find_saturation(levels)
+    assert saturation == {
+        "concurrency": 50, "throughput_rps": 380.0, "reasons": ["throughput plateau"],
+    }
+
+
+def test_closed_loop_scaling_is_not_saturated(integration_tester):
+    assert integration_tester.find_saturation([level(5, 100.0), level(20, 390.0)]) is None
+
+
+def test_open_loop_at_offered_rate_is_not_saturated(integration_tester):
+    # Throughput is capped at --rps, so equal throughput across levels is not a plateau
+    levels = [level(5, 49.8, p95=9.0, target_rps=50.0), level(20, 49.9, p95=9.0, target_rps=50.0)]
+    assert integration_tester.find_saturation(levels) is None
+
+
+def test_open_loop_below_offered_rate_is_saturated(integration_tester):
+    levels = [level(5, 30.0, target_rps=50.0), level(20, 49.9, target_rps=50.0)]
+    saturation = integration_tester.find_saturation(levels)
+    assert saturation["concurrency"] == 5
+    assert saturation["reasons"] == ["throughput below offered rate"]
+
+
+def test_latency_and_errors_apply_in_both_modes(integration_tester):
+    levels = [
+        level(5, 50.0, p95=5.0, target_rps=50.0),
+        level(20, 50.0, p95=40.0, error_rate=0.2, target_rps=50.0),
+    ]
+    saturation = integration_tester.find_saturation(levels)
+    assert saturation["reasons"] == ["p95 latency growth", "error rate"]
@@ -0,0 +1,214 @@
+"""
+Tests for the MCP tool result cache
+Calls are coroutines counting how often the gateway would have been hit
+"""
+
+import asyncio
+
+import pytest
+
+from mcp_cache import ToolResultCache, cache_key
+
+
+class FakeTool:
+    """A gateway call that optionally blocks until released"""
+
+    def __init__(self, status=200, error=None):
+        self.status = status
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.blocking = False
+
+    async def __call__(self):
+        self.calls += 1
+        if self.blocking:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.status, {"call": self.calls}, {}
+
+
+def search(cache, tool, bypass=False, parameters=None):
+    return cache.get_or_call("exa", "search", parameters or {"query": "q"}, tool, bypass=bypass)
+
+
+def test_key_ignores_whitespace_none_and_order():
+    assert cache_key("exa", "Search ", {"q": " x ", "n": None, "a": 1}) == \
+        cache_key("exa", "search", {"a": 1, "q": "x"})
+
+
+def test_miss_then_hit_then_expiry():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool()
+
+    async def main():
+        first = await search(cache, tool)
+        second = await search(cache, tool)
+        key = next(iter(cache._entries))
+        cache._entries[key] = (0.0, cache._entries[key][1])
+        third = await search(cache, tool)
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert [first[1], second[1], third[1]] == ["miss", "hit", "miss"]
+    assert second[0] == first[0]
+    assert tool.calls == 2
+    assert cache.stats()["tools"]["exa"]["expirations"] == 1
+
+
+def test_writes_and_unlisted_tools_are_not_cached():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool()
+
+    async def main():
+        outcomes = []
+        for _ in range(2):
+            outcomes.append((await cache.get_or_call("exa", "create", {}, tool))[1])
+            outcomes.append((await cache.get_or_call("browserbase", "get", {}, tool))[1])
+        return outcomes
+
+    assert asyncio.run(main()) == ["uncacheable"] * 4
+    assert tool.calls == 4
+
+
+def test_error_status_is_not_cached():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool(status=502)
+
+    async def main():
+        return [(await search(cache, tool))[1] for _ in range(2)]
+
+    assert asyncio.run(main()) == ["miss", "miss"]
+    assert tool.calls == 2
+
+
+def test_bypass_skips_lookup_and_refreshes_entry():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool()
+
+    async def main():
+        await search(cache, tool)
+        refreshed = await search(cache, tool, bypass=True)
+        cached = await search(cache, tool)
+        return refreshed, cached
+
+    refreshed, cached = asyncio.run(main())
+    assert refreshed[1] == "bypass"
+    assert cached == (refreshed[0], "hit")
+    assert refreshed[0][1] == {"call": 2}
+
+
+def test_lru_eviction():
+    cache = ToolResultCache(ttls={"exa": 60}, max_entries=2)
+    tool = FakeTool()
+
+    async def main():
+        for query in ("a", "b"):
+            await search(cache, tool, parameters={"query": query})
+        await search(cache, tool, parameters={"query": "a"})
+        await search(cache, tool, parameters={"query": "c"})
+        return (await search(cache, tool, parameters={"query": "a"}))[1], \
+            (await search(cache, tool, parameters={"query": "b"}))[1]
+
+    assert asyncio.run(main()) == ("hit", "miss")
+
+
+def test_concurrent_identical_calls_share_one_request():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool()
+    tool.blocking = True
+
+    async def main():
+        waiters = [asyncio.create_task(search(cache, tool)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert cache.stats()["in_flight"] == 1
+        tool.release.set()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    assert tool.calls == 1
+    assert sorted(outcome for _, outcome in results) == ["coalesced"] * 4 + ["miss"]
+    assert len({id(result) for result, _ in results}) == 1
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_leader_cancellation_does_not_cancel_followers():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool()
+    tool.blocking = True
+
+    async def main():
+        leader = asyncio.create_task(search(cache, tool))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(search(cache, tool))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        tool.release.set()
+        result = await follower
+        cached = await search(cache, tool)
+        return result, cached
+
+    (result, outcome), cached = asyncio.run(main())
+    assert outcome == "coalesced"
+    assert result[0] == 200
+    assert cached == (result, "hit")
+    assert tool.calls == 1
+
+
+def test_call_completes_and_caches_after_every_waiter_leaves():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool()
+    tool.blocking = True
+
+    async def main():
+        waiter = asyncio.create_task(search(cache, tool))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        tool.release.set()
+        while cache.stats()["in_flight"]:
+            await asyncio.sleep(0)
+        return await search(cache, tool)
+
+    _, outcome = asyncio.run(main())
+    assert outcome == "hit"
+    assert tool.calls == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool(error=ConnectionError("gateway down"))
+    tool.blocking = True
+
+    async def main():
+        waiters = [asyncio.create_task(search(cache, tool)) for _ in range(3)]
+        await asyncio.sleep(0)
+        tool.release.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert tool.calls == 1
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_close_cancels_pending_calls():
+    cache = ToolResultCache(ttls={"exa": 60})
+    tool = FakeTool()
+    tool.blocking = True
+
+    async def main():
+        waiter = asyncio.create_task(search(cache, tool))
+        await asyncio.sleep(0)
+        await cache.close()
+        return await asyncio.gather(waiter, return_exceptions=True)
+
+    [result] = asyncio.run(main())
+    assert isinstance(result, asyncio.CancelledError)
+    assert cache.stats()["in_flight"] == 0
@@ -0,0 +1,218 @@
+"""
+Tests for the MCP tool client's circuit breakers and adaptive timeouts
+FaultyGateway is an httpx MockTransport whose failure mode is switched per test
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from mcp_client import CLOSED, HALF_OPEN, OPEN, AdaptiveTimeout, CircuitOpen, MCPToolClient
+
+
+class FaultyGateway:
+    """Tool endpoints that succeed, fail with 5xx/4xx or time out on demand"""
+
+    def __init__(self):
+        self.mode = "ok"
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        if self.mode == "timeout":
+            raise httpx.ReadTimeout("timed out", request=request)
+        if self.mode == "refused":
+            raise httpx.ConnectError("connection refused", request=request)
+        status = {"ok": 200, "error": 500, "bad_request": 400}[self.mode]
+        return httpx.Response(status, json={"mode": self.mode})
+
+
+def make_client(gateway, **breaker_options):
+    options = {"min_requests": 3, "error_rate": 0.5, "cooldown": 30.0, **breaker_options}
+    client = MCPToolClient("http://gateway", **options)
+    client.client = httpx.AsyncClient(
+        base_url="http://gateway", transport=httpx.MockTransport(gateway)
+    )
+    return client
+
+
+def run(client, *calls):
+    """Run ``calls`` (coroutine factories taking the client) in order; collect results or errors"""
+    async def main():
+        results = []
+        try:
+            for call in calls:
+                try:
+                    results.append(await call(client))
+                except Exception as e:
+                    results.append(e)
+        finally:
+            await client.aclose()
+        return results
+    return asyncio.run(main())
+
+
+def health(client):
+    return client.health("github")
+
+
+def expire_cooldown(client, tool="github"):
+    breaker = client.breaker(tool)
+    breaker.opened_at -= breaker.cooldown
+
+
+@pytest.mark.parametrize("mode", ["error", "timeout", "refused"])
+def test_failures_open_the_circuit_and_fail_fast(mode):
+    gateway = FaultyGateway()
+    gateway.mode = mode
+    client = make_client(gateway)
+
+    results = run(client, health, health, health, health)
+
+    assert client.breaker("github").state == OPEN
+    assert gateway.calls == 3
+    assert isinstance(results[3], CircuitOpen)
+    assert results[3].retry_after > 0
+
+
+def test_client_errors_do_not_open_the_circuit():
+    gateway = FaultyGateway()
+    gateway.mode = "bad_request"
+    client = make_client(gateway)
+
+    results = run(client, *[health] * 5)
+
+    assert [r.status_code for r in results] == [400] * 5
+    assert client.breaker("github").state == CLOSED
+
+
+def test_error_rate_below_threshold_stays_closed():
+    gateway = FaultyGateway()
+    client = make_client(gateway, error_rate=0.6)
+
+    async def fail_once(c):
+        gateway.mode = "error"
+        try:
+            return await c.health("github")
+        finally:
+            gateway.mode = "ok"
+
+    run(client, health, fail_once, health, fail_once, health)
+    assert client.breaker("github").state == CLOSED
+
+
+def test_half_open_success_closes_the_circuit():
+    gateway = FaultyGateway()
+    gateway.mode = "error"
+    client = make_client(gateway)
+
+    async def recover(c):
+        gateway.mode = "ok"
+        expire_cooldown(c)
+        return await c.health("github")
+
+    results = run(client, health, health, health, recover)
+
+    breaker = client.breaker("github")
+    assert results[-1].status_code == 200
+    assert breaker.state == CLOSED
+    assert breaker.stats()["calls_in_window"] == 0
+
+
+def test_half_open_failure_reopens_the_circuit():
+    gateway = FaultyGateway()
+    gateway.mode = "error"
+    client = make_client(gateway)
+
+    async def trial(c):
+        expire_cooldown(c)
+        return await c.health("github")
+
+    results = run(client, health, health, health, trial, health)
+
+    breaker = client.breaker("github")
+    assert results[3].status_code == 500
+    assert isinstance(results[4], CircuitOpen)
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+    assert gateway.calls == 4
+
+
+def test_half_open_admits_only_the_trial_budget():
+    client = make_client(FaultyGateway(), half_open_trials=1)
+    breaker = client.breaker("github")
+    for _ in range(3):
+        breaker.record(False)
+    expire_cooldown(client)
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    # A cancelled trial hands its slot back
+    breaker.abandon()
+    assert breaker.allow()
+    asyncio.run(client.aclose())
+
+
+def test_cancelled_trial_does_not_wedge_half_open():
+    started = asyncio.Event()
+
+    async def slow_gateway(request):
+        started.set()
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    client = MCPToolClient("http://gateway", min_requests=1, cooldown=30.0)
+    client.client = httpx.AsyncClient(
+        base_url="http://gateway", transport=httpx.MockTransport(slow_gateway)
+    )
+    breaker = client.breaker("github")
+    breaker.record(False)
+    expire_cooldown(client)
+
+    async def main():
+        try:
+            task = asyncio.create_task(client.health("github"))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_breakers_are_per_tool():
+    gateway = FaultyGateway()
+    gateway.mode = "error"
+    client = make_client(gateway)
+
+    async def exa(c):
+        gateway.mode = "ok"
+        return await c.health("exa")
+
+    results = run(client, health, health, health, exa)
+
+    assert client.breaker("github").state == OPEN
+    assert client.breaker("exa").state == CLOSED
+    assert results[-1].status_code == 200
+
+
+def test_adaptive_timeout_uses_ceiling_until_warm_then_clamps():
+    timeout = AdaptiveTimeout(floor=0.5, ceiling=10.0, multiplier=3.0, min_samples=5)
+    assert timeout.timeout() == 10.0
+
+    for _ in range(5):
+        timeout.observe(0.01)
+    assert timeout.timeout() == 0.5
+
+    for _ in range(5):
+        timeout.observe(1.0)
+    assert timeout.timeout() == 3.0
+
+    timeout.observe(20.0)
+    assert timeout.timeout() == 10.0
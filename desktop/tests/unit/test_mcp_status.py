@@ -0,0 +1,90 @@
+"""
+Tests for the MCP status aggregator
+The gateway is an httpx MockTransport, so probes run without a network
+"""
+
+import asyncio
+
+import httpx
+
+from mcp_client import MCPToolClient
+from mcp_status import MCPStatusAggregator
+
+
+def make_aggregator(handler, tools=("github",)):
+    client = MCPToolClient("http://gateway", min_requests=1, cooldown=60)
+    client.client = httpx.AsyncClient(
+        base_url="http://gateway", transport=httpx.MockTransport(handler)
+    )
+    return MCPStatusAggregator(client, tools=tools, gateway_timeout=1, tool_timeout=1)
+
+
+def gateway(health_response):
+    def handler(request):
+        if request.url.path == "/health":
+            return health_response()
+        return httpx.Response(200, json={"status": "ok"})
+    return handler
+
+
+def probe(aggregator):
+    async def run():
+        try:
+            return await aggregator._probe_gateway()
+        finally:
+            await aggregator.tool_client.aclose()
+    return asyncio.run(run())
+
+
+def test_gateway_json_object_is_passed_through():
+    aggregator = make_aggregator(gateway(lambda: httpx.Response(200, json={"status": "healthy"})))
+    assert probe(aggregator) == {"status": "healthy"}
+
+
+def test_gateway_non_object_json_is_unhealthy():
+    aggregator = make_aggregator(gateway(lambda: httpx.Response(200, json=["healthy"])))
+    result = probe(aggregator)
+    assert result["status"] == "unhealthy"
+    assert result["response_code"] == 200
+
+
+def test_gateway_html_error_page_is_unhealthy():
+    page = "<html>Bad Gateway</html>"
+    aggregator = make_aggregator(gateway(lambda: httpx.Response(502, text=page)))
+    result = probe(aggregator)
+    assert result["status"] == "unhealthy"
+    assert result["response_code"] == 502
+
+
+def test_gateway_connection_error_is_unreachable():
+    def refuse():
+        raise httpx.ConnectError("connection refused")
+
+    aggregator = make_aggregator(gateway(refuse))
+    assert probe(aggregator)["status"] == "unreachable"
+
+
+def test_refresh_survives_malformed_gateway_payload_and_versions_changes():
+    payloads = [["not", "a", "dict"], ["still", "not"], {"status": "healthy"}]
+
+    def health():
+        return httpx.Response(200, json=payloads.pop(0))
+
+    aggregator = make_aggregator(gateway(health))
+
+    async def run():
+        try:
+            first = await aggregator.refresh()
+            second = await aggregator.refresh()
+            third = await aggregator.refresh()
+        finally:
+            await aggregator.tool_client.aclose()
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first["mcp_gateway"]["status"] == "unhealthy"
+    assert first["tools"]["github"]["status"] == "healthy"
+    # An unchanged state keeps its version; a recovered gateway bumps it
+    assert second["version"] == first["version"]
+    assert third["mcp_gateway"]["status"] == "healthy"
+    assert third["version"] == first["version"] + 1